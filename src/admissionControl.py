@@ -0,0 +1,170 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+import time
+
+from influxDBMetrics import REGISTRY
+
+# The request fields a requester is identified by, in order of preference
+CLIENT_ID_FIELDS = ('clientId', 'replyTopic')
+# Requests that do not identify their requester, like those of clients written before the rate limits, are only
+# limited by the global rate limit, so that a fleet of such clients is not throttled as if it were one client
+ANONYMOUS_CLIENT = '<anonymous>'
+# Requesters beyond this many share one rate limit, so that made up client IDs cannot use unbounded memory
+MAX_CLIENTS = 1000
+OVERFLOW_CLIENT = '<other clients>'
+MAX_CLIENT_ID_LENGTH = 256
+# How often the rate limits of idle requesters are pruned, at most, once there are MAX_CLIENTS of them
+PRUNE_INTERVAL = 1.0
+
+
+def get_client_id(message) -> str:
+    """
+    Get the identity of the requester of a token request, without validating the rest of the request.
+
+    Parameters
+    ----------
+        message(dict): The received IPC message
+
+    Returns
+    -------
+        client_id(str): The clientId of the request, or its reply topic, or the anonymous client
+    """
+    if isinstance(message, dict):
+        for field in CLIENT_ID_FIELDS:
+            value = message.get(field)
+            if isinstance(value, str) and value:
+                return value[:MAX_CLIENT_ID_LENGTH]
+    return ANONYMOUS_CLIENT
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, and bursts of up to `burst` requests.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'throttled')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+        # Whether the last request was rejected, to only log when throttling starts
+        self.throttled = False
+
+    def refill(self, now) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, now) -> bool:
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def is_full(self, now) -> bool:
+        self.refill(now)
+        return self.tokens >= self.burst
+
+
+class AdmissionController:
+    """
+    Rate limits token requests per requester, and across all requesters.
+
+    A request is first checked against the rate limit of its requester, so that a requester sending too many requests
+    does not use up the global rate limit of everyone else. Anonymous requests are only checked against the global rate
+    limit. A rate of 0 disables that limit.
+    """
+
+    def __init__(self, client_rate=0, client_burst=1, global_rate=0, global_burst=1, max_clients=MAX_CLIENTS,
+                 clock=time.monotonic, metrics_registry=REGISTRY):
+        for name, rate, burst in (('client', client_rate, client_burst), ('global', global_rate, global_burst)):
+            if rate < 0:
+                raise ValueError('The {} token request rate must not be negative, got {}'.format(name, rate))
+            if rate > 0 and burst < 1:
+                raise ValueError('The {} token request burst must be at least 1, got {}'.format(name, burst))
+        if max_clients < 1:
+            raise ValueError('Max clients must be at least 1, got {}'.format(max_clients))
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.last_prune = None
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock()) if global_rate > 0 else None
+
+        self.admitted = metrics_registry.counter(
+            'influxdb_token_requests_admitted_total', 'Token requests admitted by the rate limits.')
+        self.throttled = metrics_registry.counter(
+            'influxdb_token_requests_throttled_total', 'Token requests dropped by the rate limits.', ['limit'])
+        metrics_registry.callback_gauge(
+            'influxdb_token_rate_limited_clients', 'Requesters with a token request rate limit.',
+            lambda: len(self.clients))
+
+    def get_client_bucket(self, client_id, now) -> TokenBucket:
+        bucket = self.clients.get(client_id)
+        if bucket is not None:
+            return bucket
+        if len(self.clients) >= self.max_clients:
+            self.prune(now)
+            if len(self.clients) >= self.max_clients:
+                client_id = OVERFLOW_CLIENT
+                bucket = self.clients.get(client_id)
+                if bucket is not None:
+                    return bucket
+        bucket = self.clients[client_id] = TokenBucket(self.client_rate, self.client_burst, now)
+        return bucket
+
+    def prune(self, now) -> None:
+        # Requesters whose rate limit has refilled are idle, and start again from a full bucket if they come back
+        if self.last_prune is not None and now - self.last_prune < PRUNE_INTERVAL:
+            return
+        self.last_prune = now
+        for client_id in [client_id for client_id, bucket in self.clients.items() if bucket.is_full(now)]:
+            del self.clients[client_id]
+
+    def admit(self, client_id) -> bool:
+        """
+        Check a token request against the rate limits, and count it as admitted or throttled.
+
+        Parameters
+        ----------
+            client_id(str): The identity of the requester, see get_client_id
+
+        Returns
+        -------
+            admitted(bool): True if the request may be answered, False if it must be dropped
+        """
+        with self.lock:
+            now = self.clock()
+            client_bucket = None
+            if self.client_rate > 0 and client_id != ANONYMOUS_CLIENT:
+                client_bucket = self.get_client_bucket(client_id, now)
+                if not client_bucket.try_acquire(now):
+                    self.throttle(client_bucket, 'client', 'Throttling token requests from client {}'.format(client_id))
+                    return False
+                client_bucket.throttled = False
+            if self.global_bucket is not None:
+                if not self.global_bucket.try_acquire(now):
+                    # The request does not count against the requester, which was within its own limit
+                    if client_bucket is not None:
+                        client_bucket.refund()
+                    self.throttle(self.global_bucket, 'global', 'Throttling token requests from all clients')
+                    return False
+                self.global_bucket.throttled = False
+        self.admitted.inc()
+        return True
+
+    def throttle(self, bucket, limit, message) -> None:
+        self.throttled.inc(limit=limit)
+        if not bucket.throttled:
+            bucket.throttled = True
+            logging.warning('{}, which exceeded the {} token request rate limit'.format(message, limit))
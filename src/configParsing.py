@@ -0,0 +1,27 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+TRUE_VALUES = ('y', 'yes', 't', 'true', 'on', '1')
+FALSE_VALUES = ('n', 'no', 'f', 'false', 'off', '0')
+
+
+def parse_bool(value) -> bool:
+    """
+    Parse a boolean configuration value, accepting the same values as distutils.util.strtobool.
+
+    distutils is deprecated, and importing it also imports setuptools, which slows down the start of every script.
+
+    Parameters
+    ----------
+        value(str): The value, for example "true" or "false"
+
+    Returns
+    -------
+        parsed(bool): The parsed value
+    """
+    normalized = value.strip().lower()
+    if normalized in TRUE_VALUES:
+        return True
+    if normalized in FALSE_VALUES:
+        return False
+    raise ValueError('Invalid boolean value {}'.format(value))
@@ -0,0 +1,258 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+import time
+
+from influxDBMetrics import REGISTRY
+from lineProtocol import NANOSECONDS_PER_UNIT, format_field_value, parse_line, time_ns
+
+AGGREGATE_FUNCTIONS = ['min', 'max', 'mean', 'count', 'last']
+DEFAULT_MAX_SERIES = 10000
+# Aggregated points are always written with nanosecond timestamps, whatever the precision of the raw points
+AGGREGATE_PRECISION = 'ns'
+
+
+def parse_functions(functions) -> list:
+    """
+    Parse a comma separated list of aggregate functions.
+
+    Parameters
+    ----------
+        functions(str): The aggregate functions, for example "min,max,mean"
+
+    Returns
+    -------
+        functions(list): The aggregate functions, in the order of AGGREGATE_FUNCTIONS
+    """
+    names = {name.strip() for name in functions.split(',') if name.strip()}
+    unknown = names - set(AGGREGATE_FUNCTIONS)
+    if unknown or not names:
+        raise ValueError('Unknown aggregate functions {}, expected some of {}'.format(
+            sorted(unknown), AGGREGATE_FUNCTIONS))
+    return [name for name in AGGREGATE_FUNCTIONS if name in names]
+
+
+class FieldAggregate:
+    """
+    The running aggregates of one field in one window, which take the same memory however many points are added.
+    """
+    __slots__ = ['min', 'max', 'sum', 'count', 'last', 'last_time', 'numeric']
+
+    def __init__(self, value, timestamp):
+        self.numeric = not isinstance(value, (bool, str))
+        self.min = self.max = self.last = value
+        self.sum = value if self.numeric else 0
+        self.count = 1
+        self.last_time = timestamp
+
+    def accepts(self, value) -> bool:
+        return self.numeric != isinstance(value, (bool, str))
+
+    def add(self, value, timestamp) -> None:
+        if self.numeric:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+            self.sum += value
+        self.count += 1
+        if timestamp >= self.last_time:
+            self.last = value
+            self.last_time = timestamp
+
+    def get(self, function):
+        if function == 'count':
+            return self.count
+        if function == 'last':
+            return self.last
+        if not self.numeric:
+            # Only the count and last value of strings and booleans are kept
+            return None
+        if function == 'mean':
+            return float(self.sum) / self.count
+        return getattr(self, function)
+
+
+class SeriesAggregate:
+    """
+    The open window of one series, and when it is written.
+    """
+    __slots__ = ['window_start', 'deadline', 'closed_window_start', 'fields']
+
+    def __init__(self):
+        self.window_start = None
+        self.deadline = None
+        self.closed_window_start = None
+        self.fields = {}
+
+
+class InfluxDBAggregator:
+    """
+    Aggregates points into tumbling windows per series, before they are written to InfluxDB.
+
+    The series index is a dict keyed by the org, bucket and series key of each point, so every point is aggregated with
+    a single lookup. A window is written once the wall clock has passed its end and it has been open for a whole
+    window, so that points with past timestamps are still collected into one aggregate. Points for a window that has
+    already been written are dropped, since a second aggregate with the same timestamp would overwrite the first.
+    """
+
+    def __init__(self, window, functions=AGGREGATE_FUNCTIONS, raw_bucket='', max_series=DEFAULT_MAX_SERIES,
+                 clock=time.monotonic, wall_clock=time_ns, metrics_registry=REGISTRY):
+        if window <= 0:
+            raise ValueError('Aggregation window must be positive, got {}'.format(window))
+        if max_series < 1:
+            raise ValueError('Aggregation series limit must be at least 1, got {}'.format(max_series))
+
+        self.window = window
+        self.window_ns = int(window * NANOSECONDS_PER_UNIT['s'])
+        self.functions = functions
+        self.raw_bucket = raw_bucket
+        self.max_series = max_series
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.lock = threading.Lock()
+        # (org, bucket, series key) -> SeriesAggregate
+        self.series = {}
+
+        self.points_aggregated = metrics_registry.counter(
+            'influxdb_aggregation_points_total', 'Points added to aggregation windows.')
+        self.points_skipped = metrics_registry.counter(
+            'influxdb_aggregation_points_skipped_total', 'Points that were not aggregated.', ['reason'])
+        self.windows_written = metrics_registry.counter(
+            'influxdb_aggregation_windows_total', 'Aggregation windows written.')
+        metrics_registry.callback_gauge(
+            'influxdb_aggregation_series', 'Series in the aggregation index.', lambda: len(self.series))
+
+    def add_lines(self, org, bucket, lines, precision) -> list:
+        """
+        Add lines of line protocol to the windows of their series.
+
+        Parameters
+        ----------
+            org(str): The org of the bucket
+            bucket(str): The bucket the points are written to
+            lines(list): The lines of line protocol
+            precision(str): The precision of the timestamps
+
+        Returns
+        -------
+            writes(list): The (org, bucket, lines, precision) to write now: the lines that could not be aggregated,
+            the raw lines if a raw bucket is configured, and any windows that were closed by newer points
+        """
+        now = self.clock()
+        arrival_time = self.wall_clock()
+        passthrough = []
+        aggregates = []
+        with self.lock:
+            for line in lines:
+                self.add_line(org, bucket, line, precision, now, arrival_time, passthrough, aggregates)
+
+        writes = []
+        if passthrough:
+            writes.append((org, bucket, passthrough, precision))
+        if self.raw_bucket:
+            writes.append((org, self.raw_bucket, lines, precision))
+        writes.extend(self.group_aggregates(aggregates))
+        return writes
+
+    def add_line(self, org, bucket, line, precision, now, arrival_time, passthrough, aggregates) -> None:
+        try:
+            series_key, fields, timestamp = parse_line(line)
+        except ValueError:
+            self.points_skipped.inc(reason='unparsed')
+            passthrough.append(line)
+            return
+        timestamp = arrival_time if timestamp is None else timestamp * NANOSECONDS_PER_UNIT[precision]
+        window_start = timestamp - timestamp % self.window_ns
+
+        key = (org, bucket, series_key)
+        series = self.series.get(key)
+        if series is None:
+            if len(self.series) >= self.max_series:
+                self.points_skipped.inc(reason='series_limit')
+                passthrough.append(line)
+                return
+            series = self.series[key] = SeriesAggregate()
+        if (series.closed_window_start is not None and window_start <= series.closed_window_start) or \
+                (series.window_start is not None and window_start < series.window_start):
+            self.points_skipped.inc(reason='late')
+            return
+        if series.window_start is not None and window_start > series.window_start:
+            aggregates.append(self.close_window(key, series))
+        if not all(series.fields[field_key].accepts(value) for field_key, value in fields.items()
+                   if field_key in series.fields):
+            self.points_skipped.inc(reason='type_conflict')
+            return
+        if series.window_start is None:
+            series.window_start = window_start
+            series.deadline = now + self.window
+        for field_key, value in fields.items():
+            field = series.fields.get(field_key)
+            if field is None:
+                series.fields[field_key] = FieldAggregate(value, timestamp)
+            else:
+                field.add(value, timestamp)
+        self.points_aggregated.inc()
+
+    def close_window(self, key, series) -> tuple:
+        org, bucket, series_key = key
+        line = '{} {} {}'.format(series_key, ','.join(
+            '{}_{}={}'.format(field_key, function, format_field_value(field.get(function)))
+            for field_key, field in series.fields.items()
+            for function in self.functions if field.get(function) is not None
+        ), series.window_start)
+        series.closed_window_start = series.window_start
+        series.window_start = None
+        series.fields = {}
+        self.windows_written.inc()
+        return org, bucket, line
+
+    @staticmethod
+    def group_aggregates(aggregates) -> list:
+        lines_by_bucket = {}
+        for org, bucket, line in aggregates:
+            lines_by_bucket.setdefault((org, bucket), []).append(line)
+        return [(org, bucket, lines, AGGREGATE_PRECISION) for (org, bucket), lines in lines_by_bucket.items()]
+
+    def flush_expired(self) -> list:
+        """
+        Close the windows that have ended, and forget the series that have had no points for a whole window since.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            writes(list): The (org, bucket, lines, precision) of the closed windows
+        """
+        now = self.clock()
+        now_ns = self.wall_clock()
+        aggregates = []
+        with self.lock:
+            for key, series in list(self.series.items()):
+                if series.window_start is None:
+                    if now - series.deadline >= self.window:
+                        del self.series[key]
+                elif now >= series.deadline and now_ns >= series.window_start + self.window_ns:
+                    aggregates.append(self.close_window(key, series))
+        if aggregates:
+            logging.debug('Closed {} aggregation windows'.format(len(aggregates)))
+        return self.group_aggregates(aggregates)
+
+    def flush_all(self) -> list:
+        """
+        Close every open window.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            writes(list): The (org, bucket, lines, precision) of the closed windows
+        """
+        with self.lock:
+            aggregates = [self.close_window(key, series) for key, series in self.series.items()
+                          if series.window_start is not None]
+        return self.group_aggregates(aggregates)
@@ -0,0 +1,563 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import base64
+import gzip
+import http.client
+import json
+import ssl
+import threading
+from urllib.parse import urlencode
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_CONNECTIONS = 4
+# Line protocol compresses well even at a low level, which keeps the CPU cost of writes small
+GZIP_LEVEL = 1
+# Cookie set by InfluxDB OSS on a successful sign in
+SESSION_COOKIE_NAME = 'influxdb-oss-session'
+# Errors raised when a kept-alive connection was closed by the server while idle
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError
+)
+
+# Client error statuses of requests that may succeed later: rejected credentials, and throttling
+RETRYABLE_STATUSES = (401, 429)
+
+
+class InfluxDBAPIError(Exception):
+    """
+    Raised when the InfluxDB API responds with an unexpected HTTP status.
+    """
+
+    def __init__(self, method, path, status, body):
+        super().__init__('{} {} failed with HTTP status {}: {}'.format(method, path, status, body))
+        self.status = status
+        self.body = body
+
+
+def is_retryable_error(error) -> bool:
+    """
+    Tell whether a failed request may succeed if it is sent again later.
+
+    Parameters
+    ----------
+        error(Exception): The error raised by the request
+
+    Returns
+    -------
+        retryable(bool): True for connection errors, server errors, throttling and rejected credentials, and False for
+        requests that InfluxDB will always reject, such as invalid line protocol or an unknown bucket
+    """
+    if isinstance(error, InfluxDBAPIError):
+        return error.status >= 500 or error.status in RETRYABLE_STATUSES
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+def get_client_host(influxdb_interface) -> str:
+    """
+    Get the host to connect to for the interface the InfluxDB container port is bound on.
+
+    Parameters
+    ----------
+        influxdb_interface(str): The IP the InfluxDB container binds on
+
+    Returns
+    -------
+        host(str): The host to connect to
+    """
+    if influxdb_interface in ('0.0.0.0', '::', ''):
+        return '127.0.0.1'
+    return influxdb_interface
+
+
+def get_retention_rules(retention_seconds) -> list:
+    # A bucket without retention rules keeps its data forever
+    if not retention_seconds:
+        return []
+    return [{'type': 'expire', 'everySeconds': retention_seconds}]
+
+
+class ServerNameHTTPSConnection(http.client.HTTPSConnection):
+    """
+    An HTTPS connection that verifies the certificate of the server against a name other than the host it connects to,
+    such as the name of the InfluxDB container, while connecting to the port published on the host.
+    """
+
+    def __init__(self, host, port, server_hostname, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.server_hostname = server_hostname
+
+    def connect(self) -> None:
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.server_hostname)
+
+
+class InfluxDBClient:
+    """
+    A small client for the InfluxDB v2 HTTP API that keeps its connections alive between requests.
+
+    Connections are pooled, so the client can be shared between threads; each request checks out an idle
+    connection, or opens a new one if none are idle.
+    """
+
+    def __init__(self, host, port, server_protocol='https', skip_tls_verify=False, token=None,
+                 timeout=DEFAULT_TIMEOUT, max_connections=DEFAULT_MAX_CONNECTIONS, server_hostname=None):
+        if server_protocol not in ('http', 'https'):
+            raise ValueError('Unsupported server protocol: {}'.format(server_protocol))
+        self.host = host
+        self.port = int(port)
+        self.server_protocol = server_protocol
+        self.skip_tls_verify = skip_tls_verify
+        # The name the TLS certificate of InfluxDB is verified against, if it is not the host
+        self.server_hostname = server_hostname
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.token = token
+        self.session_cookie = None
+        self.ssl_context = None
+        if server_protocol == 'https':
+            self.ssl_context = ssl.create_default_context()
+            if skip_tls_verify:
+                # Equivalent to the --skip-verify flag of the influx CLI
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.idle_connections = []
+        self.pool_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return '{}://{}:{}'.format(self.server_protocol, self.host, self.port)
+
+    def new_connection(self) -> http.client.HTTPConnection:
+        if self.ssl_context is not None and self.server_hostname:
+            return ServerNameHTTPSConnection(self.host, self.port, self.server_hostname, timeout=self.timeout,
+                                             context=self.ssl_context)
+        if self.ssl_context is not None:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def checkout_connection(self):
+        with self.pool_lock:
+            if self.idle_connections:
+                return self.idle_connections.pop(), True
+        return self.new_connection(), False
+
+    def checkin_connection(self, connection) -> None:
+        with self.pool_lock:
+            if len(self.idle_connections) < self.max_connections:
+                self.idle_connections.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        """
+        Close all idle connections.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        with self.pool_lock:
+            connections = self.idle_connections
+            self.idle_connections = []
+        for connection in connections:
+            connection.close()
+
+    def get_auth_headers(self) -> dict:
+        if self.token:
+            return {'Authorization': 'Token {}'.format(self.token)}
+        if self.session_cookie:
+            return {'Cookie': '{}={}'.format(SESSION_COOKIE_NAME, self.session_cookie)}
+        return {}
+
+    def request(self, method, path, params=None, body=None, headers=None, expected_status=(200,)):
+        """
+        Send a request over a pooled keep-alive connection.
+
+        Parameters
+        ----------
+            method(str): The HTTP method
+            path(str): The API path, e.g. /api/v2/buckets
+            params(dict): Optional query parameters
+            body(dict|bytes|str): Optional request body; dicts are sent as JSON
+            headers(dict): Optional extra request headers
+            expected_status(tuple): The HTTP statuses that indicate success
+
+        Returns
+        -------
+            response(tuple): The HTTP status, the response headers and the response body bytes
+        """
+        if params:
+            path = '{}?{}'.format(path, urlencode(params))
+        request_headers = self.get_auth_headers()
+        if isinstance(body, dict) or isinstance(body, list):
+            body = json.dumps(body).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        if headers:
+            request_headers.update(headers)
+
+        connection, reused = self.checkout_connection()
+        try:
+            try:
+                response = self.send(connection, method, path, body, request_headers)
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server closed the idle connection; retry once on a fresh one
+                connection.close()
+                connection = self.new_connection()
+                response = self.send(connection, method, path, body, request_headers)
+            status, response_headers, data = response
+        except Exception:
+            connection.close()
+            raise
+
+        if response_headers.get('connection', '').lower() == 'close':
+            connection.close()
+        else:
+            self.checkin_connection(connection)
+
+        if status not in expected_status:
+            raise InfluxDBAPIError(method, path, status, data.decode('utf-8', errors='replace'))
+        return status, response_headers, data
+
+    def send(self, connection, method, path, body, headers):
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        response_headers = {key.lower(): value for key, value in response.getheaders()}
+        return response.status, response_headers, data
+
+    def request_json(self, method, path, params=None, body=None, expected_status=(200,)):
+        """
+        Send a request and decode the JSON response.
+
+        Parameters
+        ----------
+            method(str): The HTTP method
+            path(str): The API path
+            params(dict): Optional query parameters
+            body(dict): Optional JSON request body
+            expected_status(tuple): The HTTP statuses that indicate success
+
+        Returns
+        -------
+            response_json(dict): The decoded response body, or None if it was empty
+        """
+        _, _, data = self.request(method, path, params=params, body=body,
+                                  headers={'Accept': 'application/json'}, expected_status=expected_status)
+        if not data:
+            return None
+        return json.loads(data)
+
+    def signin(self, username, password) -> None:
+        """
+        Sign in with a username and password, and use the session for all further requests.
+
+        Parameters
+        ----------
+            username(str): The InfluxDB username
+            password(str): The InfluxDB password
+
+        Returns
+        -------
+            None
+        """
+        credentials = base64.b64encode('{}:{}'.format(username, password).encode('utf-8')).decode('ascii')
+        _, headers, _ = self.request('POST', '/api/v2/signin', headers={'Authorization': 'Basic {}'.format(credentials)},
+                                     expected_status=(200, 204))
+        cookie = headers.get('set-cookie', '')
+        for part in cookie.split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE_NAME:
+                self.session_cookie = value
+                return
+        raise InfluxDBAPIError('POST', '/api/v2/signin', 204, 'No session cookie was returned')
+
+    def health(self) -> dict:
+        """
+        Get the health of the InfluxDB instance.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            health(dict): The health check response, whose status is "pass" when InfluxDB is ready
+        """
+        # /health answers 503 with a JSON body while InfluxDB is not ready
+        return self.request_json('GET', '/health', expected_status=(200, 503))
+
+    def metrics(self) -> str:
+        """
+        Get the internal metrics of the InfluxDB instance.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            metrics(str): The metrics in the Prometheus text format
+        """
+        _, _, data = self.request('GET', '/metrics', headers={'Accept': 'text/plain'})
+        return data.decode('utf-8')
+
+    def get_authorizations(self) -> list:
+        """
+        Get all authorizations the signed in user can read.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            authorizations(list): The authorizations, including their descriptions and tokens
+        """
+        return self.request_json('GET', '/api/v2/authorizations')['authorizations']
+
+    def get_buckets(self, name=None, org=None) -> list:
+        """
+        Get the buckets, optionally filtered by name and org.
+
+        Parameters
+        ----------
+            name(str): Only return the bucket with this name
+            org(str): Only return buckets in this org
+
+        Returns
+        -------
+            buckets(list): The matching buckets
+        """
+        params = {'limit': 100}
+        if name:
+            params['name'] = name
+        if org:
+            params['org'] = org
+        # Filtering by the name of a bucket that does not exist answers 404
+        response = self.request_json('GET', '/api/v2/buckets', params=params, expected_status=(200, 404))
+        return response.get('buckets', [])
+
+    def get_orgs(self, name=None) -> list:
+        """
+        Get the orgs, optionally filtered by name.
+
+        Parameters
+        ----------
+            name(str): Only return the org with this name
+
+        Returns
+        -------
+            orgs(list): The matching orgs
+        """
+        params = {'limit': 100}
+        if name:
+            params['org'] = name
+        # Filtering by the name of an org that does not exist answers 404
+        response = self.request_json('GET', '/api/v2/orgs', params=params, expected_status=(200, 404))
+        return response.get('orgs', [])
+
+    def create_org(self, name) -> dict:
+        """
+        Create a new org.
+
+        Parameters
+        ----------
+            name(str): The org name
+
+        Returns
+        -------
+            org(dict): The created org
+        """
+        return self.request_json('POST', '/api/v2/orgs', body={'name': name}, expected_status=(201,))
+
+    def create_bucket(self, org_id, name, retention_seconds=0) -> dict:
+        """
+        Create a new bucket.
+
+        Parameters
+        ----------
+            org_id(str): The ID of the org the bucket belongs to
+            name(str): The bucket name
+            retention_seconds(int): How long data is kept in the bucket, or 0 to keep it forever
+
+        Returns
+        -------
+            bucket(dict): The created bucket
+        """
+        body = {'orgID': org_id, 'name': name, 'retentionRules': get_retention_rules(retention_seconds)}
+        return self.request_json('POST', '/api/v2/buckets', body=body, expected_status=(201,))
+
+    def update_bucket_retention(self, bucket_id, retention_seconds) -> dict:
+        """
+        Change how long data is kept in a bucket.
+
+        Parameters
+        ----------
+            bucket_id(str): The ID of the bucket
+            retention_seconds(int): How long data is kept in the bucket, or 0 to keep it forever
+
+        Returns
+        -------
+            bucket(dict): The updated bucket
+        """
+        body = {'retentionRules': get_retention_rules(retention_seconds)}
+        return self.request_json('PATCH', '/api/v2/buckets/{}'.format(bucket_id), body=body)
+
+    def get_tasks(self, name=None, org_id=None) -> list:
+        """
+        Get the tasks, optionally filtered by name and org.
+
+        Parameters
+        ----------
+            name(str): Only return the tasks with this name
+            org_id(str): Only return the tasks of the org with this ID
+
+        Returns
+        -------
+            tasks(list): The matching tasks, including their Flux scripts
+        """
+        params = {'limit': 500}
+        if name:
+            params['name'] = name
+        if org_id:
+            params['orgID'] = org_id
+        return self.request_json('GET', '/api/v2/tasks', params=params)['tasks']
+
+    def create_task(self, org_id, flux, description='') -> dict:
+        """
+        Create a new active task. The name and schedule of the task are set by the task option of its Flux script.
+
+        Parameters
+        ----------
+            org_id(str): The ID of the org the task runs in
+            flux(str): The Flux script of the task
+            description(str): The task description
+
+        Returns
+        -------
+            task(dict): The created task
+        """
+        body = {'orgID': org_id, 'flux': flux, 'description': description, 'status': 'active'}
+        return self.request_json('POST', '/api/v2/tasks', body=body, expected_status=(201,))
+
+    def update_task(self, task_id, flux) -> dict:
+        """
+        Replace the Flux script of a task.
+
+        Parameters
+        ----------
+            task_id(str): The ID of the task
+            flux(str): The new Flux script of the task
+
+        Returns
+        -------
+            task(dict): The updated task
+        """
+        return self.request_json('PATCH', '/api/v2/tasks/{}'.format(task_id), body={'flux': flux})
+
+    def write(self, org, bucket, data, precision='ns', compress=True, token=None) -> None:
+        """
+        Write line protocol to a bucket.
+
+        Parameters
+        ----------
+            org(str): The org of the bucket
+            bucket(str): The bucket name
+            data(bytes): The line protocol to write
+            precision(str): The precision of the timestamps: ns, us, ms or s
+            compress(bool): Whether to gzip the request body
+            token(str): The token to write with, instead of the token or session of the client
+
+        Returns
+        -------
+            None
+        """
+        headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        if token:
+            headers['Authorization'] = 'Token {}'.format(token)
+        if compress:
+            data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+            headers['Content-Encoding'] = 'gzip'
+        params = {'org': org, 'bucket': bucket, 'precision': precision}
+        self.request('POST', '/api/v2/write', params=params, body=data, headers=headers, expected_status=(204,))
+
+    def query(self, org, flux) -> str:
+        """
+        Run a Flux query.
+
+        Parameters
+        ----------
+            org(str): The org to run the query in
+            flux(str): The Flux query
+
+        Returns
+        -------
+            result(str): The result as annotated CSV
+        """
+        body = {'query': flux, 'type': 'flux', 'dialect': {'header': True, 'annotations': ['datatype', 'group', 'default']}}
+        _, _, data = self.request('POST', '/api/v2/query', params={'org': org}, body=body,
+                                  headers={'Accept': 'application/csv'})
+        return data.decode('utf-8')
+
+    def is_setup_allowed(self) -> bool:
+        """
+        Check whether the InfluxDB instance still needs its initial setup.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            allowed(bool): True if no initial user, org and bucket have been set up yet
+        """
+        return self.request_json('GET', '/api/v2/setup')['allowed']
+
+    def setup(self, username, password, org, bucket, retention_seconds=0) -> dict:
+        """
+        Run the initial setup of the InfluxDB instance.
+
+        Parameters
+        ----------
+            username(str): The initial admin username
+            password(str): The initial admin password
+            org(str): The initial org name
+            bucket(str): The initial bucket name
+            retention_seconds(int): How long data is kept in the initial bucket, or 0 to keep it forever
+
+        Returns
+        -------
+            setup(dict): The created user, org, bucket and admin authorization
+        """
+        body = {'username': username, 'password': password, 'org': org, 'bucket': bucket,
+                'retentionPeriodSeconds': retention_seconds}
+        return self.request_json('POST', '/api/v2/setup', body=body, expected_status=(201,))
+
+    def create_authorization(self, org_id, description, permissions) -> dict:
+        """
+        Create a new token.
+
+        Parameters
+        ----------
+            org_id(str): The ID of the org the token belongs to
+            description(str): The token description
+            permissions(list): The permissions granted to the token
+
+        Returns
+        -------
+            authorization(dict): The created authorization, including its token
+        """
+        body = {'orgID': org_id, 'description': description, 'permissions': permissions}
+        return self.request_json('POST', '/api/v2/authorizations', body=body, expected_status=(201,))
@@ -0,0 +1,303 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+from argparse import Namespace
+
+from configParsing import parse_bool
+
+logging.basicConfig(level=logging.INFO)
+IMAGE = 'influxdb:2.0.9'
+# The label holding the hash of the configuration the container was created with
+CONFIG_HASH_LABEL = 'aws.greengrass.labs.database.influxdb.config-hash'
+CERTS_PATH = '/etc/ssl/greengrass'
+DOCKER_TIMEOUT = 120
+MB = 1024 * 1024
+# InfluxDB storage engine and query settings for devices with different amounts of memory and write loads.
+# The default profile keeps the InfluxDB defaults.
+TUNING_PROFILES = {
+    'default': {},
+    'low-memory': {
+        'INFLUXD_STORAGE_CACHE_MAX_MEMORY_SIZE': 64 * MB,
+        'INFLUXD_STORAGE_CACHE_SNAPSHOT_MEMORY_SIZE': 8 * MB,
+        'INFLUXD_STORAGE_WAL_FSYNC_DELAY': '100ms',
+        'INFLUXD_STORAGE_COMPACT_THROUGHPUT_BURST': 8 * MB,
+        'INFLUXD_STORAGE_MAX_CONCURRENT_COMPACTIONS': 1,
+        'INFLUXD_QUERY_CONCURRENCY': 2,
+        'INFLUXD_QUERY_QUEUE_SIZE': 4,
+        'INFLUXD_QUERY_MEMORY_BYTES': 32 * MB,
+    },
+    'balanced': {
+        'INFLUXD_STORAGE_CACHE_MAX_MEMORY_SIZE': 256 * MB,
+        'INFLUXD_STORAGE_CACHE_SNAPSHOT_MEMORY_SIZE': 25 * MB,
+        'INFLUXD_STORAGE_WAL_FSYNC_DELAY': '50ms',
+        'INFLUXD_STORAGE_COMPACT_THROUGHPUT_BURST': 16 * MB,
+        'INFLUXD_STORAGE_MAX_CONCURRENT_COMPACTIONS': 2,
+        'INFLUXD_QUERY_CONCURRENCY': 4,
+        'INFLUXD_QUERY_QUEUE_SIZE': 8,
+        'INFLUXD_QUERY_MEMORY_BYTES': 64 * MB,
+    },
+    'high-ingest': {
+        'INFLUXD_STORAGE_CACHE_MAX_MEMORY_SIZE': 512 * MB,
+        'INFLUXD_STORAGE_CACHE_SNAPSHOT_MEMORY_SIZE': 50 * MB,
+        'INFLUXD_STORAGE_WAL_FSYNC_DELAY': '200ms',
+        'INFLUXD_STORAGE_COMPACT_THROUGHPUT_BURST': 48 * MB,
+        'INFLUXD_STORAGE_MAX_CONCURRENT_COMPACTIONS': 2,
+        'INFLUXD_QUERY_CONCURRENCY': 4,
+        'INFLUXD_QUERY_QUEUE_SIZE': 8,
+        'INFLUXD_QUERY_MEMORY_BYTES': 64 * MB,
+    },
+}
+DEFAULT_TUNING_PROFILE = 'default'
+MEMORY_UNITS = {'': 1, 'b': 1, 'k': 1024, 'm': MB, 'g': 1024 * MB}
+# The smallest memory limit Docker accepts
+MIN_MEMORY_LIMIT = 6 * MB
+
+
+def parse_arguments() -> Namespace:
+    """
+    Parse arguments.
+
+    Parameters
+    ----------
+        None
+
+    Returns
+    -------
+        args(Namespace): Parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--container_name", type=str, required=True)
+    parser.add_argument("--influxdb_port", type=str, required=True)
+    parser.add_argument("--influxdb_interface", type=str, required=True)
+    parser.add_argument("--bridge_network_name", type=str, required=True)
+    parser.add_argument("--influxdb_mount_path", type=str, required=True)
+    parser.add_argument("--server_protocol", type=str, required=True)
+    parser.add_argument("--warm_restart", type=str, default="false")
+    parser.add_argument("--tuning_profile", type=str, default=DEFAULT_TUNING_PROFILE)
+    parser.add_argument("--memory_limit", type=str, default="")
+    parser.add_argument("--cpu_limit", type=str, default="")
+    return parser.parse_args()
+
+
+def run_docker(arguments) -> str:
+    """
+    Run a Docker CLI command.
+
+    Parameters
+    ----------
+        arguments(list): The arguments of the docker command
+
+    Returns
+    -------
+        output(str): The standard output of the command
+    """
+    result = subprocess.run(['docker'] + arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, timeout=DOCKER_TIMEOUT)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, ['docker'] + arguments, result.stdout, result.stderr)
+    return result.stdout
+
+
+def parse_memory_limit(memory_limit) -> int:
+    """
+    Parse a Docker memory limit.
+
+    Parameters
+    ----------
+        memory_limit(str): The memory limit, for example 512m or 1g
+
+    Returns
+    -------
+        limit_bytes(int): The memory limit in bytes
+    """
+    match = re.fullmatch('([0-9]+)([bkmg]?)', memory_limit.strip().lower())
+    if match is None:
+        raise ValueError('Invalid container memory limit {}, expected a number of bytes with an optional unit of b, k, '
+                         'm or g'.format(memory_limit))
+    limit_bytes = int(match.group(1)) * MEMORY_UNITS[match.group(2)]
+    if limit_bytes < MIN_MEMORY_LIMIT:
+        raise ValueError('Container memory limit {} is below the minimum of 6m'.format(memory_limit))
+    return limit_bytes
+
+
+def parse_cpu_limit(cpu_limit, cpu_count=None) -> float:
+    """
+    Parse a Docker CPU limit.
+
+    Parameters
+    ----------
+        cpu_limit(str): The number of CPUs, for example 1.5
+        cpu_count(int): The number of CPUs of the device, or None to not check the limit against it
+
+    Returns
+    -------
+        cpus(float): The number of CPUs
+    """
+    try:
+        cpus = float(cpu_limit)
+    except ValueError:
+        raise ValueError('Invalid container CPU limit {}, expected a number of CPUs'.format(cpu_limit))
+    if not 0 < cpus < float('inf'):
+        raise ValueError('Container CPU limit must be positive, got {}'.format(cpu_limit))
+    if cpu_count is not None and cpus > cpu_count:
+        raise ValueError('Container CPU limit {} is more than the {} CPUs of the device'.format(cpu_limit, cpu_count))
+    return cpus
+
+
+def get_tuning_settings(args) -> dict:
+    """
+    Get the InfluxDB settings of the tuning profile, and check that they fit within the container memory limit.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+
+    Returns
+    -------
+        settings(dict): The INFLUXD_* environment variables of the profile
+    """
+    if args.tuning_profile not in TUNING_PROFILES:
+        raise ValueError('Unknown tuning profile {}, expected one of {}'.format(
+            args.tuning_profile, list(TUNING_PROFILES)))
+    settings = TUNING_PROFILES[args.tuning_profile]
+    if args.memory_limit:
+        limit_bytes = parse_memory_limit(args.memory_limit)
+        # The write cache and the memory of running queries have to fit, with room left for the index and compactions
+        reserved = settings.get('INFLUXD_STORAGE_CACHE_MAX_MEMORY_SIZE', 0) + \
+            settings.get('INFLUXD_QUERY_CONCURRENCY', 0) * settings.get('INFLUXD_QUERY_MEMORY_BYTES', 0)
+        if reserved * 2 > limit_bytes:
+            raise ValueError('The {} tuning profile needs a container memory limit of at least {}m, got {}'.format(
+                args.tuning_profile, reserved * 2 // MB, args.memory_limit))
+    return settings
+
+
+def get_run_options(args) -> list:
+    """
+    Get the options the InfluxDB container is run with, which make up its effective configuration.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+
+    Returns
+    -------
+        options(list): The options of docker run, without the container name and labels
+    """
+    options = [
+        '-p', '{}:{}:8086'.format(args.influxdb_interface, args.influxdb_port),
+        '--network={}'.format(args.bridge_network_name),
+        '--read-only',
+        '-v', '{}/influxdb2/data:/var/lib/influxdb2'.format(args.influxdb_mount_path),
+        '-v', '{}/influxdb2/config:/etc/influxdb2'.format(args.influxdb_mount_path),
+    ]
+    if args.server_protocol == 'https':
+        options += [
+            '-v', '{}/influxdb2_certs/:{}:ro'.format(args.influxdb_mount_path, CERTS_PATH),
+            '-e', 'INFLUXD_TLS_CERT={}/influxdb.crt'.format(CERTS_PATH),
+            '-e', 'INFLUXD_TLS_KEY={}/influxdb.key'.format(CERTS_PATH),
+        ]
+    settings = get_tuning_settings(args)
+    for name in sorted(settings):
+        options += ['-e', '{}={}'.format(name, settings[name])]
+    if args.memory_limit:
+        options += ['--memory', args.memory_limit.strip().lower()]
+    if args.cpu_limit:
+        options += ['--cpus', '{:g}'.format(parse_cpu_limit(args.cpu_limit, os.cpu_count()))]
+    return options
+
+
+def get_config_hash(options, image=IMAGE) -> str:
+    """
+    Hash the effective configuration of the container.
+
+    Parameters
+    ----------
+        options(list): The options of docker run
+        image(str): The InfluxDB image
+
+    Returns
+    -------
+        config_hash(str): The SHA-256 of the image and options, in hex
+    """
+    return hashlib.sha256(json.dumps([image] + options).encode()).hexdigest()
+
+
+def inspect_container(name, docker=run_docker):
+    """
+    Get the state of a container.
+
+    Parameters
+    ----------
+        name(str): The container name
+        docker(function): Runs a Docker CLI command
+
+    Returns
+    -------
+        container(dict): The output of docker inspect, or None if there is no such container
+    """
+    try:
+        containers = json.loads(docker(['container', 'inspect', name]))
+    except subprocess.CalledProcessError as e:
+        if 'no such' in (e.stderr or '').lower():
+            return None
+        raise
+    return containers[0] if containers else None
+
+
+def start_container(args, docker=run_docker) -> str:
+    """
+    Start the InfluxDB container, reusing the existing container on a warm restart if its configuration is unchanged.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        docker(function): Runs a Docker CLI command
+
+    Returns
+    -------
+        action(str): 'running' if the existing container was left running, 'restarted' if it was started again,
+        or 'created' if a new container was created
+    """
+    options = get_run_options(args)
+    config_hash = get_config_hash(options)
+    logging.info('Using the {} tuning profile: {}, memory limit: {}, CPU limit: {}'.format(
+        args.tuning_profile, ', '.join('{}={}'.format(name, value) for name, value in
+                                       sorted(TUNING_PROFILES[args.tuning_profile].items())) or 'InfluxDB defaults',
+        args.memory_limit or 'none', args.cpu_limit or 'none'))
+    container = inspect_container(args.container_name, docker)
+
+    if container is not None:
+        labels = container.get('Config', {}).get('Labels') or {}
+        if parse_bool(args.warm_restart) and labels.get(CONFIG_HASH_LABEL) == config_hash:
+            if container.get('State', {}).get('Running'):
+                logging.info('Reusing the running InfluxDB container {}.'.format(args.container_name))
+                return 'running'
+            logging.info('Restarting the existing InfluxDB container {}.'.format(args.container_name))
+            docker(['start', args.container_name])
+            return 'restarted'
+        logging.info('Removing the InfluxDB container {}, since it was created with a different configuration or '
+                     'warm restart is disabled.'.format(args.container_name))
+        docker(['rm', '--force', args.container_name])
+
+    logging.info('Creating the InfluxDB container {}.'.format(args.container_name))
+    docker(['run', '-d', '--name', args.container_name, '--label', '{}={}'.format(CONFIG_HASH_LABEL, config_hash)]
+           + options + [IMAGE])
+    return 'created'
+
+
+if __name__ == "__main__":
+    try:
+        start_container(parse_arguments())
+    except subprocess.CalledProcessError as e:
+        logging.error('Failed to start the InfluxDB container: {}'.format(e.stderr), exc_info=True)
+        exit(1)
+    except Exception:
+        logging.error('Failed to start the InfluxDB container.', exc_info=True)
+        exit(1)
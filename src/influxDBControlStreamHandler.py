@@ -0,0 +1,54 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import awsiot.greengrasscoreipc.client as client
+from awsiot.greengrasscoreipc.model import SubscriptionResponseMessage
+
+REFRESH_TOKENS_ACTION = 'RefreshTokens'
+
+
+class InfluxDBControlStreamHandler(client.SubscribeToTopicStreamHandler):
+    def __init__(self, token_refresher):
+        super().__init__()
+        self.token_refresher = token_refresher
+        logging.info("Initialized InfluxDBControlStreamHandler")
+
+    def on_stream_event(self, event: SubscriptionResponseMessage) -> None:
+        """
+        When we receive a message over IPC on the control topic, run the requested action.
+
+        Parameters
+        ----------
+            event(SubscriptionResponseMessage): The received IPC message
+
+        Returns
+        -------
+            None
+        """
+        try:
+            message = event.json_message.message
+            if message['action'] == REFRESH_TOKENS_ACTION:
+                self.token_refresher.request_refresh()
+            else:
+                logging.warning('Unknown control request type received over pub/sub')
+        except Exception:
+            logging.error('Received an error', exc_info=True)
+
+    def on_stream_error(self, error: Exception) -> bool:
+        """
+        Log stream errors but keep the stream open.
+
+        Parameters
+        ----------
+            error(Exception): The exception we see as a result of the stream error.
+
+        Returns
+        -------
+            False(bool): Return False to keep the stream open.
+        """
+        logging.error('Received an error with the InfluxDB control stream', exc_info=True)
+        return False
+
+    def on_stream_closed(self) -> None:
+        logging.info('Subscribe to control topic stream closed.')
@@ -0,0 +1,365 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import queue
+import threading
+import time
+
+import awsiot.greengrasscoreipc.client as client
+from awsiot.greengrasscoreipc.model import SubscriptionResponseMessage
+
+from influxDBClient import is_retryable_error
+from influxDBMetrics import REGISTRY
+from lineProtocol import DEFAULT_PRECISION, NANOSECONDS_PER_UNIT, PRECISIONS, point_to_line, split_lines, time_ns
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_FLUSH_INTERVAL = 1
+DEFAULT_MAX_PENDING_BATCHES = 100
+BATCH_POINTS_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000)
+BATCH_BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class InfluxDBIngestGateway:
+    """
+    Collects points into batches per bucket, and writes each batch once it is full or the flush interval has passed.
+
+    Batches are written in order by a single writer thread, so that all writes share one pooled connection.
+    If a write buffer is given, batches that fail to be written are stored in it for a later replay instead of dropped.
+    If an aggregator is given, points are aggregated into windows per series, and only the aggregates are written.
+    If is_writable is given, messages for buckets it returns False for are rejected.
+    Points without a time are given the time they arrive, so that buffering or aggregating them does not change it.
+    """
+
+    def __init__(self, write_fn, default_org, default_bucket, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, precision=DEFAULT_PRECISION,
+                 max_pending_batches=DEFAULT_MAX_PENDING_BATCHES, write_buffer=None, aggregator=None,
+                 is_writable=None, wall_clock=time_ns, metrics_registry=REGISTRY):
+        if batch_size < 1:
+            raise ValueError('Ingest batch size must be at least 1, got {}'.format(batch_size))
+        if flush_interval <= 0:
+            raise ValueError('Ingest flush interval must be positive, got {}'.format(flush_interval))
+        if precision not in PRECISIONS:
+            raise ValueError('Unknown precision {}, expected one of {}'.format(precision, PRECISIONS))
+
+        self.write_fn = write_fn
+        self.default_org = default_org
+        self.default_bucket = default_bucket
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.precision = precision
+        self.write_buffer = write_buffer
+        self.aggregator = aggregator
+        self.is_writable = is_writable
+        self.wall_clock = wall_clock
+        self.lock = threading.Lock()
+        # (org, bucket, precision) -> (lines, time the first line was added)
+        self.batches = {}
+        self.pending = queue.Queue(maxsize=max_pending_batches)
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self.run_flusher, name='InfluxDBIngestFlusher', daemon=True)
+        self.writer = threading.Thread(target=self.run_writer, name='InfluxDBIngestWriter', daemon=True)
+
+        self.messages = metrics_registry.counter(
+            'influxdb_ingest_messages_total', 'Messages received by the ingest gateway.')
+        self.invalid_messages = metrics_registry.counter(
+            'influxdb_ingest_invalid_messages_total', 'Messages rejected by the ingest gateway.')
+        self.points_received = metrics_registry.counter(
+            'influxdb_ingest_points_received_total', 'Points accepted by the ingest gateway.')
+        self.points_written = metrics_registry.counter(
+            'influxdb_ingest_points_written_total', 'Points written to InfluxDB by the ingest gateway.')
+        self.points_dropped = metrics_registry.counter(
+            'influxdb_ingest_points_dropped_total', 'Points dropped by the ingest gateway.', ['reason'])
+        self.batch_points = metrics_registry.histogram(
+            'influxdb_ingest_batch_points', 'Points per batch written to InfluxDB.', buckets=BATCH_POINTS_BUCKETS)
+        self.batch_bytes = metrics_registry.histogram(
+            'influxdb_ingest_batch_bytes', 'Uncompressed bytes per batch written to InfluxDB.',
+            buckets=BATCH_BYTES_BUCKETS)
+        self.write_latency = metrics_registry.histogram(
+            'influxdb_ingest_write_latency_seconds', 'Time taken to write a batch to InfluxDB.')
+        metrics_registry.callback_gauge(
+            'influxdb_ingest_pending_batches', 'Batches waiting to be written to InfluxDB.', self.pending.qsize)
+
+    def start(self) -> None:
+        self.flusher.start()
+        self.writer.start()
+        logging.info('Started ingest gateway with batch size {}, flush interval {}s and precision {}'.format(
+            self.batch_size, self.flush_interval, self.precision))
+
+    def stop(self) -> None:
+        """
+        Write the points collected so far, then stop.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        self.stopped.set()
+        self.flusher.join()
+        self.flush_all()
+        self.pending.put(None)
+        self.writer.join()
+
+    def add_message(self, message) -> int:
+        """
+        Add the points of an ingest message.
+
+        Parameters
+        ----------
+            message(dict): An ingest message with optional "org", "bucket" and "precision", and the points as
+            "lines" of line protocol and/or JSON "points". A single JSON point is also accepted on its own.
+
+        Returns
+        -------
+            count(int): The number of points added
+        """
+        self.messages.inc()
+        try:
+            if 'measurement' in message:
+                message = {'points': [message]}
+            precision = message.get('precision', self.precision)
+            if precision not in PRECISIONS:
+                raise ValueError('Unknown precision {}'.format(precision))
+            arrival_time = self.arrival_time(precision)
+            lines = []
+            raw_lines = message.get('lines', [])
+            for text in [raw_lines] if isinstance(raw_lines, str) else raw_lines:
+                lines.extend(split_lines(text, arrival_time))
+            lines.extend(point_to_line(point, arrival_time) for point in message.get('points', []))
+        except Exception:
+            self.invalid_messages.inc()
+            logging.warning('Rejected an invalid ingest message', exc_info=True)
+            return 0
+        return self.add_lines(message.get('org', self.default_org), message.get('bucket', self.default_bucket),
+                              lines, precision)
+
+    def add_text(self, text) -> int:
+        """
+        Add a line protocol payload for the default bucket.
+
+        Parameters
+        ----------
+            text(str): The line protocol payload
+
+        Returns
+        -------
+            count(int): The number of points added
+        """
+        self.messages.inc()
+        try:
+            lines = split_lines(text, self.arrival_time(self.precision))
+        except Exception:
+            self.invalid_messages.inc()
+            logging.warning('Rejected an invalid ingest message', exc_info=True)
+            return 0
+        return self.add_lines(self.default_org, self.default_bucket, lines, self.precision)
+
+    def arrival_time(self, precision) -> int:
+        return self.wall_clock() // NANOSECONDS_PER_UNIT[precision]
+
+    def add_lines(self, org, bucket, lines, precision) -> int:
+        """
+        Add lines of line protocol to the batch of a bucket, or to their aggregation windows if the gateway aggregates,
+        and queue the batch for writing once it is full.
+
+        Parameters
+        ----------
+            org(str): The org of the bucket
+            bucket(str): The bucket to write to
+            lines(list): The lines of line protocol
+            precision(str): The precision of the timestamps
+
+        Returns
+        -------
+            count(int): The number of points added
+        """
+        if not lines:
+            return 0
+        if self.is_writable is not None and not self.is_writable(org, bucket):
+            self.invalid_messages.inc()
+            self.points_dropped.inc(len(lines), reason='unknown_bucket')
+            logging.warning('Rejected {} points for bucket {}/{}, which the ingest gateway may not write to'.format(
+                len(lines), org, bucket))
+            return 0
+        self.points_received.inc(len(lines))
+        if self.aggregator is None:
+            self.batch_lines(org, bucket, lines, precision)
+        else:
+            for write in self.aggregator.add_lines(org, bucket, lines, precision):
+                self.batch_lines(*write)
+        return len(lines)
+
+    def batch_lines(self, org, bucket, lines, precision) -> None:
+        key = (org, bucket, precision)
+        full_batches = []
+        with self.lock:
+            for line in lines:
+                batch = self.batches.get(key)
+                if batch is None:
+                    batch = self.batches[key] = ([], time.monotonic())
+                batch[0].append(line)
+                if len(batch[0]) >= self.batch_size:
+                    full_batches.append(batch[0])
+                    del self.batches[key]
+        for batch_lines in full_batches:
+            self.queue_batch(key, batch_lines)
+
+    def queue_batch(self, key, lines) -> None:
+        while True:
+            try:
+                self.pending.put_nowait((key, lines))
+                return
+            except queue.Full:
+                pass
+            # Writes are falling behind, so give up on the oldest batch rather than block the IPC callback thread
+            try:
+                _, dropped_lines = self.pending.get_nowait()
+                self.pending.task_done()
+                self.points_dropped.inc(len(dropped_lines), reason='queue_full')
+                logging.warning('Ingest write queue is full, dropped {} points'.format(len(dropped_lines)))
+            except queue.Empty:
+                pass
+
+    def flush_expired(self) -> None:
+        if self.aggregator is not None:
+            for write in self.aggregator.flush_expired():
+                self.batch_lines(*write)
+        now = time.monotonic()
+        with self.lock:
+            expired = [key for key, (_, created) in self.batches.items() if now - created >= self.flush_interval]
+            batches = [(key, self.batches.pop(key)[0]) for key in expired]
+        for key, lines in batches:
+            self.queue_batch(key, lines)
+
+    def flush_all(self) -> None:
+        if self.aggregator is not None:
+            for write in self.aggregator.flush_all():
+                self.batch_lines(*write)
+        with self.lock:
+            batches = [(key, lines) for key, (lines, _) in self.batches.items()]
+            self.batches = {}
+        for key, lines in batches:
+            self.queue_batch(key, lines)
+
+    def join(self) -> None:
+        """
+        Block until every queued batch has been written.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        self.pending.join()
+
+    def run_flusher(self) -> None:
+        # Checking several times per interval bounds how long a point can wait beyond the interval
+        while not self.stopped.wait(self.flush_interval / 4):
+            self.flush_expired()
+
+    def run_writer(self) -> None:
+        while True:
+            batch = self.pending.get()
+            try:
+                if batch is None:
+                    return
+                self.write_batch(*batch)
+            finally:
+                self.pending.task_done()
+
+    def write_batch(self, key, lines) -> bool:
+        """
+        Write one batch to InfluxDB.
+
+        Parameters
+        ----------
+            key(tuple): The org, bucket and precision of the batch
+            lines(list): The lines of line protocol
+
+        Returns
+        -------
+            written(bool): True if the batch was written
+        """
+        org, bucket, precision = key
+        data = '\n'.join(lines).encode('utf-8')
+        start = time.monotonic()
+        try:
+            self.write_fn(org, bucket, data, precision)
+        except Exception as e:
+            if not is_retryable_error(e):
+                # Writing the batch again would fail the same way, and hold up the batches buffered after it
+                self.points_dropped.inc(len(lines), reason='rejected')
+                logging.error('InfluxDB rejected {} points for bucket {}/{}, dropping them'.format(
+                    len(lines), org, bucket), exc_info=True)
+                return False
+            logging.error('Failed to write {} points to InfluxDB bucket {}/{}'.format(len(lines), org, bucket),
+                          exc_info=True)
+            self.buffer_batch(key, lines)
+            return False
+        self.write_latency.observe(time.monotonic() - start)
+        self.batch_points.observe(len(lines))
+        self.batch_bytes.observe(len(data))
+        self.points_written.inc(len(lines))
+        return True
+
+    def buffer_batch(self, key, lines) -> None:
+        if self.write_buffer is None:
+            self.points_dropped.inc(len(lines), reason='write_error')
+            return
+        try:
+            self.write_buffer.append(key, lines)
+        except Exception:
+            self.points_dropped.inc(len(lines), reason='buffer_error')
+            logging.error('Failed to buffer {} points'.format(len(lines)), exc_info=True)
+
+
+class InfluxDBIngestStreamHandler(client.SubscribeToTopicStreamHandler):
+    def __init__(self, gateway):
+        super().__init__()
+        self.gateway = gateway
+        logging.info("Initialized InfluxDBIngestStreamHandler")
+
+    def on_stream_event(self, event: SubscriptionResponseMessage) -> None:
+        """
+        When we receive a message over IPC on the ingest topic, add its points to the ingest gateway.
+
+        Parameters
+        ----------
+            event(SubscriptionResponseMessage): The received IPC message
+
+        Returns
+        -------
+            None
+        """
+        try:
+            if event.json_message is not None:
+                self.gateway.add_message(event.json_message.message)
+            else:
+                self.gateway.add_text(event.binary_message.message.decode('utf-8'))
+        except Exception:
+            logging.error('Received an error', exc_info=True)
+
+    def on_stream_error(self, error: Exception) -> bool:
+        """
+        Log stream errors but keep the stream open.
+
+        Parameters
+        ----------
+            error(Exception): The exception we see as a result of the stream error.
+
+        Returns
+        -------
+            False(bool): Return False to keep the stream open.
+        """
+        logging.error('Received an error with the InfluxDB ingest stream', exc_info=True)
+        return False
+
+    def on_stream_closed(self) -> None:
+        logging.info('Subscribe to ingest topic stream closed.')
@@ -0,0 +1,195 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import logging
+import re
+import sys
+import threading
+import time
+from argparse import Namespace
+
+LEVELS = ['debug', 'info', 'warn', 'error']
+# Other spellings used by InfluxDB and its dependencies
+LEVEL_ALIASES = {'warning': 'warn', 'fatal': 'error', 'panic': 'error', 'trace': 'debug'}
+DEFAULT_LEVEL = 'info'
+LOGFMT_PAIR = re.compile('([^\\s=]+)=("(?:[^"\\\\]|\\\\.)*"|\\S*)')
+# Lines beyond this many distinct messages per interval share one rate limit
+MAX_KEYS = 1000
+OVERFLOW_KEY = ('', '<other messages>')
+
+
+def parse_arguments() -> Namespace:
+    """
+    Parse arguments.
+
+    Parameters
+    ----------
+        None
+
+    Returns
+    -------
+        args(Namespace): Parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--min_level", type=str, choices=LEVELS, default=DEFAULT_LEVEL)
+    parser.add_argument("--exclude_pattern", type=str, default="")
+    parser.add_argument("--rate_limit", type=int, default=20)
+    parser.add_argument("--rate_interval", type=float, default=60)
+    parser.add_argument("--sample_every", type=int, default=0)
+    return parser.parse_args()
+
+
+def parse_logfmt(line) -> dict:
+    """
+    Parse a logfmt line, such as those logged by InfluxDB.
+
+    Parameters
+    ----------
+        line(str): The log line, e.g. ts=2021-10-01T00:00:00.000000Z lvl=info msg="Listening" service=tcp-listener
+
+    Returns
+    -------
+        fields(dict): The fields of the line, with quoted values unquoted
+    """
+    fields = {}
+    for key, value in LOGFMT_PAIR.findall(line):
+        if value.startswith('"') and len(value) > 1:
+            value = value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+        fields[key] = value
+    return fields
+
+
+def get_level(fields) -> str:
+    level = fields.get('lvl', fields.get('level', DEFAULT_LEVEL)).lower()
+    level = LEVEL_ALIASES.get(level, level)
+    return level if level in LEVELS else DEFAULT_LEVEL
+
+
+class LogForwarder:
+    """
+    Filters log lines by level and pattern, and rate limits each message separately.
+
+    Each message, identified by its level and msg field, may be forwarded rate_limit times per interval. Beyond that,
+    only every sample_every-th line is forwarded, and a summary of the suppressed lines is written once per interval.
+    """
+
+    def __init__(self, output, min_level=DEFAULT_LEVEL, exclude_pattern='', rate_limit=20, rate_interval=60,
+                 sample_every=0, clock=time.monotonic):
+        if min_level not in LEVELS:
+            raise ValueError('Unknown log level {}, expected one of {}'.format(min_level, LEVELS))
+        if rate_interval <= 0:
+            raise ValueError('Log rate interval must be positive, got {}'.format(rate_interval))
+        self.output = output
+        self.min_level = LEVELS.index(min_level)
+        self.exclude_pattern = re.compile(exclude_pattern) if exclude_pattern else None
+        self.rate_limit = rate_limit
+        self.rate_interval = rate_interval
+        self.sample_every = sample_every
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.interval_start = clock()
+        # (level, msg) -> [lines seen this interval, lines suppressed this interval]
+        self.counts = {}
+        self.stopped = threading.Event()
+
+    def forward(self, line) -> bool:
+        """
+        Write a log line to the output, unless it is filtered out or rate limited.
+
+        Parameters
+        ----------
+            line(str): The log line, without its line ending
+
+        Returns
+        -------
+            forwarded(bool): True if the line was written
+        """
+        if self.exclude_pattern is not None and self.exclude_pattern.search(line):
+            return False
+        fields = parse_logfmt(line)
+        level = get_level(fields)
+        if LEVELS.index(level) < self.min_level:
+            return False
+        # Lines that are not logfmt are rate limited on their whole text
+        key = (level, fields.get('msg', line))
+
+        with self.lock:
+            if self.clock() - self.interval_start >= self.rate_interval:
+                self.write_summaries()
+            counts = self.counts.get(key)
+            if counts is None:
+                if len(self.counts) >= MAX_KEYS:
+                    key = OVERFLOW_KEY
+                counts = self.counts.setdefault(key, [0, 0])
+            counts[0] += 1
+            if self.rate_limit > 0 and counts[0] > self.rate_limit:
+                suppressed = counts[0] - self.rate_limit
+                if self.sample_every <= 0 or suppressed % self.sample_every != 0:
+                    counts[1] += 1
+                    return False
+            self.write(line)
+        return True
+
+    def write_summaries(self) -> None:
+        # Must be called with the lock held
+        for (level, msg), (_, suppressed) in self.counts.items():
+            if suppressed:
+                self.write('lvl={} msg="Suppressed {} InfluxDB log lines in the last {:g}s" suppressed_msg="{}"'.format(
+                    level, suppressed, self.rate_interval, msg.replace('\\', '\\\\').replace('"', '\\"')[:200]))
+        self.counts = {}
+        self.interval_start = self.clock()
+
+    def write(self, line) -> None:
+        self.output.write(line + '\n')
+        self.output.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self.write_summaries()
+
+    def run_summaries(self) -> None:
+        # Write the summaries even when InfluxDB goes quiet after a burst
+        while not self.stopped.wait(self.rate_interval):
+            with self.lock:
+                if self.clock() - self.interval_start >= self.rate_interval:
+                    self.write_summaries()
+
+    def run(self, stream) -> None:
+        """
+        Forward every line of a stream until it ends.
+
+        Parameters
+        ----------
+            stream(TextIO): The stream to read the log lines from
+
+        Returns
+        -------
+            None
+        """
+        summaries = threading.Thread(target=self.run_summaries, name='InfluxDBLogSummaries', daemon=True)
+        summaries.start()
+        try:
+            for line in stream:
+                self.forward(line.rstrip('\r\n'))
+        finally:
+            self.stopped.set()
+            self.flush()
+
+
+if __name__ == "__main__":
+    # Reads the output of docker logs on stdin, and writes the lines to keep to the component log on stdout
+    try:
+        args = parse_arguments()
+        forwarder = LogForwarder(
+            sys.stdout,
+            min_level=args.min_level,
+            exclude_pattern=args.exclude_pattern,
+            rate_limit=args.rate_limit,
+            rate_interval=args.rate_interval,
+            sample_every=args.sample_every
+        )
+        forwarder.run(sys.stdin)
+    except Exception:
+        logging.error('Failed to forward the InfluxDB logs.', exc_info=True)
+        exit(1)
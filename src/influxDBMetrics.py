@@ -0,0 +1,305 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import bisect
+import logging
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join('{}="{}"'.format(name, value) for name, value in escaped) + '}'
+
+
+def format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Metric:
+    """
+    Base class for metrics with an optional set of labels.
+    """
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def get_key(self, labels) -> tuple:
+        if set(labels.keys()) != set(self.labelnames):
+            raise ValueError('Metric {} expects labels {}, got {}'.format(self.name, self.labelnames, sorted(labels.keys())))
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} {}'.format(self.name, self.metric_type)]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append('{}{} {}'.format(self.name, format_labels(self.labelnames, key), format_value(value)))
+        return lines
+
+    def summarize(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        if not self.labelnames:
+            return items[0][1] if items else 0
+        return {'/'.join(str(value) for value in key): value for key, value in items}
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self.get_key(labels), 0)
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self.get_key(labels), 0)
+
+
+class CallbackGauge(Metric):
+    """
+    A gauge whose value is read from a function whenever the metrics are collected.
+    """
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, help_text, value_fn):
+        super().__init__(name, help_text)
+        self.value_fn = value_fn
+
+    def render(self) -> list:
+        with self.lock:
+            self.values = {(): self.value_fn()}
+        return super().render()
+
+    def summarize(self):
+        return self.value_fn()
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels) -> None:
+        key = self.get_key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['buckets'][bisect.bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def get_count(self, **labels) -> int:
+        with self.lock:
+            state = self.values.get(self.get_key(labels))
+            return state['count'] if state else 0
+
+    def render(self) -> list:
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} histogram'.format(self.name)]
+        with self.lock:
+            items = sorted((key, {'buckets': list(state['buckets']), 'sum': state['sum'], 'count': state['count']})
+                           for key, state in self.values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state['buckets']):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, format_labels(self.labelnames, key, ('le', format_value(float(bound)))), cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, format_labels(self.labelnames, key), format_value(state['sum'])))
+            lines.append('{}_count{} {}'.format(self.name, format_labels(self.labelnames, key), state['count']))
+        return lines
+
+    def summarize(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        summary = {'/'.join(str(value) for value in key): {'count': state['count'], 'sum': round(state['sum'], 6)}
+                   for key, state in items}
+        if not self.labelnames:
+            return summary.get('', {'count': 0, 'sum': 0})
+        return summary
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the process and renders them in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric_class, name, *args, **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError('Metric {} is already registered as a {}'.format(name, metric.metric_type))
+            return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self.register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self.register(Gauge, name, help_text, labelnames)
+
+    def callback_gauge(self, name, help_text, value_fn) -> CallbackGauge:
+        metric = self.register(CallbackGauge, name, help_text, value_fn)
+        metric.value_fn = value_fn
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram, name, help_text, labelnames, buckets)
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            text(str): The rendered metrics
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summarize(self) -> dict:
+        """
+        Summarize all metrics in a compact form suitable for publishing as JSON.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            summary(dict): The value of each metric, keyed by metric name and then by label values
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return {metric.name: metric.summarize() for metric in metrics}
+
+
+# The registry shared by all modules of the component process
+REGISTRY = MetricsRegistry()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        data = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MetricsHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Serves the metrics of a registry on /metrics in a background thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, interface, port, registry=REGISTRY):
+        super().__init__((interface, port), MetricsRequestHandler)
+        self.registry = registry
+        self.thread = threading.Thread(target=self.serve_forever, name='InfluxDBMetricsServer', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        logging.info('Serving metrics on http://{}:{}/metrics'.format(*self.server_address[:2]))
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class MetricsSummaryPublisher:
+    """
+    Periodically publish a summary of the metrics using the given publish function.
+    """
+
+    def __init__(self, publish_fn, interval, registry=REGISTRY):
+        if interval <= 0:
+            raise ValueError('Metrics publish interval must be positive, got {}'.format(interval))
+        self.publish_fn = publish_fn
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='InfluxDBMetricsPublisher', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def publish(self) -> None:
+        summary = {'timestamp': int(time.time()), 'metrics': self.registry.summarize()}
+        try:
+            self.publish_fn(summary)
+        except Exception:
+            logging.error('Failed to publish the metrics summary', exc_info=True)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.publish()
@@ -0,0 +1,263 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import re
+import shutil
+import threading
+import time
+
+from influxDBMetrics import REGISTRY
+
+SAMPLE_LINE = re.compile('([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\\{(.*)\\})?\\s+(\\S+)')
+LABEL_PAIR = re.compile('([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\\\]|\\\\.)*)"')
+# How much each figure must change by since the last published status before a new status is published
+DEFAULT_DELTAS = {
+    'writeRate': 10,
+    'queryRate': 5,
+    'cacheBytes': 32 * 1024 * 1024,
+    'compactionsQueued': 2,
+    'series': 1000,
+    'diskUsedPercent': 5,
+}
+HEALTH_PASS = 'pass'
+HEALTH_UNREACHABLE = 'unreachable'
+
+
+def parse_deltas(deltas) -> dict:
+    """
+    Parse a comma separated list of figure=delta pairs, and merge them with the default deltas.
+
+    Parameters
+    ----------
+        deltas(str): The deltas, for example "writeRate=20,diskUsedPercent=2"
+
+    Returns
+    -------
+        deltas(dict): The delta of every figure
+    """
+    parsed = dict(DEFAULT_DELTAS)
+    for pair in deltas.split(','):
+        if not pair.strip():
+            continue
+        name, _, value = pair.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_DELTAS:
+            raise ValueError('Unknown monitor figure {}, expected one of {}'.format(name, list(DEFAULT_DELTAS)))
+        try:
+            parsed[name] = float(value)
+        except ValueError:
+            raise ValueError('Invalid delta for monitor figure {}: {}'.format(name, value))
+        if parsed[name] < 0:
+            raise ValueError('Delta for monitor figure {} must not be negative, got {}'.format(name, value))
+    return parsed
+
+
+def parse_metrics(text) -> list:
+    """
+    Parse metrics in the Prometheus text format.
+
+    Parameters
+    ----------
+        text(str): The metrics, as served by InfluxDB on /metrics
+
+    Returns
+    -------
+        samples(list): The (name, labels, value) of every sample
+    """
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        try:
+            samples.append((name, dict(LABEL_PAIR.findall(labels or '')), float(value)))
+        except ValueError:
+            continue
+    return samples
+
+
+def sum_samples(samples, name, **labels):
+    """
+    Sum the samples of a metric across the labels that are not given.
+
+    Parameters
+    ----------
+        samples(list): The parsed samples
+        name(str): The metric name
+        labels(dict): The label values the samples must have
+
+    Returns
+    -------
+        total(float): The sum, or None if the metric has no matching samples
+    """
+    values = [value for sample_name, sample_labels, value in samples if sample_name == name and
+              all(sample_labels.get(key) == label_value for key, label_value in labels.items())]
+    return sum(values) if values else None
+
+
+class InfluxDBMonitor:
+    """
+    Periodically checks the health and internal metrics of InfluxDB, and publishes a status when it changes.
+
+    A status is published when the health changes, or when a figure has changed by at least its delta since the last
+    published status, so that slowly drifting values are still reported once they add up.
+    """
+
+    def __init__(self, influxdb_client, publish_fn, interval, mount_path='', deltas=DEFAULT_DELTAS,
+                 clock=time.monotonic, disk_usage=shutil.disk_usage, metrics_registry=REGISTRY):
+        if interval < 0:
+            raise ValueError('Monitor interval must not be negative, got {}'.format(interval))
+        self.influxdb_client = influxdb_client
+        self.publish_fn = publish_fn
+        self.interval = interval
+        self.mount_path = mount_path
+        self.deltas = deltas
+        self.clock = clock
+        self.disk_usage = disk_usage
+        self.stopped = threading.Event()
+        # Counter name -> (value, time) of the previous scrape, to compute rates
+        self.previous = {}
+        self.last_published = None
+        self.health = None
+
+        self.scrape_errors = metrics_registry.counter(
+            'influxdb_monitor_scrape_errors_total', 'Failed scrapes of the InfluxDB health, metrics or disk usage.',
+            ['source'])
+        self.statuses_published = metrics_registry.counter(
+            'influxdb_monitor_statuses_published_total', 'InfluxDB status changes published.')
+        metrics_registry.callback_gauge(
+            'influxdb_monitor_healthy', 'Whether InfluxDB passed its last health check.',
+            lambda: 1 if self.health == HEALTH_PASS else 0)
+
+    def get_rate(self, name, value, now):
+        previous = self.previous.get(name)
+        if value is None:
+            self.previous.pop(name, None)
+            return None
+        self.previous[name] = (value, now)
+        # There is no rate before the second scrape, or after InfluxDB restarted and reset its counters
+        if previous is None or value < previous[0] or now <= previous[1]:
+            return None
+        return round((value - previous[0]) / (now - previous[1]), 2)
+
+    def scrape(self) -> dict:
+        """
+        Check the health, metrics and disk usage of InfluxDB once.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            status(dict): The health and figures of InfluxDB, where figures that could not be read are None
+        """
+        status = {'timestamp': int(time.time()), 'health': HEALTH_UNREACHABLE}
+        try:
+            health = self.influxdb_client.health()
+            status['health'] = health.get('status') if health else HEALTH_UNREACHABLE
+        except Exception as e:
+            logging.debug('InfluxDB health check failed: {}'.format(e))
+            self.scrape_errors.inc(source='health')
+
+        samples = []
+        if status['health'] != HEALTH_UNREACHABLE:
+            try:
+                samples = parse_metrics(self.influxdb_client.metrics())
+            except Exception as e:
+                logging.debug('Failed to scrape the InfluxDB metrics: {}'.format(e))
+                self.scrape_errors.inc(source='metrics')
+        now = self.clock()
+        status['writeRate'] = self.get_rate(
+            'writes', sum_samples(samples, 'http_api_requests_total', path='/api/v2/write'), now)
+        status['queryRate'] = self.get_rate(
+            'queries', sum_samples(samples, 'http_api_requests_total', path='/api/v2/query'), now)
+        status['cacheBytes'] = sum_samples(samples, 'storage_cache_inuse_bytes')
+        status['compactionsQueued'] = sum_samples(samples, 'storage_compactions_queued')
+        status['series'] = sum_samples(samples, 'storage_bucket_series_num')
+
+        status['diskUsedPercent'] = status['diskFreeBytes'] = None
+        if self.mount_path:
+            try:
+                usage = self.disk_usage(self.mount_path)
+                status['diskUsedPercent'] = round(100.0 * usage.used / usage.total, 1) if usage.total else None
+                status['diskFreeBytes'] = usage.free
+            except OSError as e:
+                logging.debug('Failed to get the disk usage of {}: {}'.format(self.mount_path, e))
+                self.scrape_errors.inc(source='disk')
+        return status
+
+    def is_changed(self, status) -> bool:
+        """
+        Check whether a status differs enough from the last published status to be published.
+
+        Parameters
+        ----------
+            status(dict): The scraped status
+
+        Returns
+        -------
+            changed(bool): True if the health changed, a figure appeared or disappeared, or a figure changed by at
+            least its delta
+        """
+        last = self.last_published
+        if last is None or last['health'] != status['health']:
+            return True
+        for name, delta in self.deltas.items():
+            old, new = last.get(name), status.get(name)
+            if (old is None) != (new is None):
+                return True
+            if old is not None and old != new and abs(new - old) >= delta:
+                return True
+        return False
+
+    def check(self) -> None:
+        status = self.scrape()
+        if status['health'] != self.health:
+            if status['health'] == HEALTH_PASS:
+                logging.info('InfluxDB health check passed.')
+            else:
+                logging.warning('InfluxDB health check status: {}'.format(status['health']))
+            self.health = status['health']
+        if not self.is_changed(status):
+            return
+        logging.debug('InfluxDB status changed: {}'.format(status))
+        if self.publish_fn is not None:
+            try:
+                self.publish_fn(status)
+                self.statuses_published.inc()
+            except Exception:
+                # The status is published again at the next check, so that a change is not lost
+                logging.error('Failed to publish the InfluxDB status', exc_info=True)
+                return
+        self.last_published = status
+
+    def run(self) -> None:
+        """
+        Check InfluxDB every interval until stopped, or only wait to be stopped if the interval is 0.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        if self.interval == 0:
+            self.stopped.wait()
+            return
+        while True:
+            try:
+                self.check()
+            except Exception:
+                logging.error('Failed to check InfluxDB', exc_info=True)
+            if self.stopped.wait(self.interval):
+                return
+
+    def stop(self) -> None:
+        self.stopped.set()
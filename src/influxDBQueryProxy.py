@@ -0,0 +1,372 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import collections
+import concurrent.futures
+import fnmatch
+import logging
+import re
+import threading
+import time
+
+import awsiot.greengrasscoreipc.client as client
+from awsiot.greengrasscoreipc.model import SubscriptionResponseMessage
+
+from influxDBMetrics import REGISTRY
+
+DEFAULT_CACHE_BYTES = 16 * 1024 * 1024
+DEFAULT_QUERY_WORKERS = 2
+MAX_QUERY_LENGTH = 16 * 1024
+# Keep results well below the size of a local pub/sub message
+MAX_RESULT_BYTES = 128 * 1024
+# Results of a relative range are refreshed this many times per range, within the TTL bounds below
+TTL_RESOLUTION = 60
+MIN_TTL = 1
+MAX_TTL = 60
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60}
+RELATIVE_TIME = re.compile('-?(?:[0-9]+(?:ms|s|m|h|d|w))+')
+DURATION_PART = re.compile('([0-9]+)(ms|s|m|h|d|w)')
+ABSOLUTE_TIME = re.compile('[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(?:\\.[0-9]+)?(?:Z|[+-][0-9]{2}:[0-9]{2})')
+NOW = 'now()'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def parse_time(value):
+    """
+    Parse a bound of a query time range.
+
+    Parameters
+    ----------
+        value(str): A relative duration such as -15m or -1h30m, now(), or an RFC3339 timestamp
+
+    Returns
+    -------
+        offset(float): The offset from now in seconds, or None if the bound is an absolute timestamp
+    """
+    if not isinstance(value, str):
+        raise ValueError('Time range bounds must be strings')
+    if value == NOW:
+        return 0
+    if RELATIVE_TIME.fullmatch(value):
+        seconds = sum(int(count) * DURATION_UNITS[unit] for count, unit in DURATION_PART.findall(value))
+        return -seconds if value.startswith('-') else seconds
+    if ABSOLUTE_TIME.fullmatch(value):
+        return None
+    raise ValueError('Invalid time {}, expected a duration such as -15m, now() or an RFC3339 time'.format(value[:100]))
+
+
+def normalize_query(flux) -> str:
+    """
+    Normalize a Flux query, so that queries differing only in whitespace and comments share a cache entry.
+
+    Parameters
+    ----------
+        flux(str): The Flux query
+
+    Returns
+    -------
+        normalized_query(str): The query with comments removed, and whitespace outside of strings collapsed
+    """
+    parts = []
+    i = 0
+    while i < len(flux):
+        char = flux[i]
+        if char == '"':
+            # Copy string literals unchanged
+            end = i + 1
+            while end < len(flux) and flux[end] != '"':
+                end += 2 if flux[end] == '\\' else 1
+            parts.append(flux[i:end + 1])
+            i = end + 1
+        elif flux.startswith('//', i) or char.isspace():
+            # Comments and runs of whitespace separate tokens like a single space
+            while i < len(flux) and (flux[i].isspace() or flux.startswith('//', i)):
+                if flux[i].isspace():
+                    i += 1
+                else:
+                    end = flux.find('\n', i)
+                    i = len(flux) if end < 0 else end
+            parts.append(' ')
+        else:
+            parts.append(char)
+            i += 1
+    return ''.join(parts).strip()
+
+
+def get_ttl(start_offset, stop_offset) -> float:
+    """
+    Get how long the result of a query over a time range may be cached.
+
+    Parameters
+    ----------
+        start_offset(float): The offset of the start from now in seconds, or None if it is absolute
+        stop_offset(float): The offset of the stop from now in seconds, or None if it is absolute
+
+    Returns
+    -------
+        ttl(float): The TTL in seconds, which grows with the length of a relative range
+    """
+    if stop_offset is None:
+        # The data of a range that has ended does not change any more
+        return MAX_TTL
+    if start_offset is None:
+        return MIN_TTL
+    return min(MAX_TTL, max(MIN_TTL, (stop_offset - start_offset) / TTL_RESOLUTION))
+
+
+class QueryCache:
+    """
+    A least recently used cache of query results, bounded by the total size of the results.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, clock=time.time, metrics_registry=REGISTRY):
+        if max_bytes < 0:
+            raise ValueError('Query cache size must not be negative, got {}'.format(max_bytes))
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.lock = threading.Lock()
+        # key -> (result, size, expiry), least recently used first
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+        self.evictions = metrics_registry.counter(
+            'influxdb_query_cache_evictions_total', 'Query results evicted from the cache to make room.')
+        metrics_registry.callback_gauge(
+            'influxdb_query_cache_bytes', 'Bytes of query results held in the cache.', lambda: self.size)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.clock() >= entry[2]:
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, result, ttl) -> None:
+        """
+        Cache a result until the next multiple of its TTL, so that every client sees it refreshed at the same time.
+
+        Parameters
+        ----------
+            key(tuple): The cache key
+            result(str): The query result
+            ttl(float): The TTL in seconds
+
+        Returns
+        -------
+            None
+        """
+        size = len(result) + len(key[1])
+        if size > self.max_bytes:
+            return
+        now = self.clock()
+        expiry = (now // ttl + 1) * ttl
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (result, size, expiry)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions.inc()
+
+    def remove(self, key) -> None:
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+
+class InfluxDBQueryProxy:
+    """
+    Runs Flux queries requested over local pub/sub, and publishes their results on the requested reply topics.
+
+    Results are cached, and concurrent requests for the same query share a single query to InfluxDB.
+    """
+
+    def __init__(self, query_fn, publish_fn, org, reply_topic_pattern, cache,
+                 workers=DEFAULT_QUERY_WORKERS, metrics_registry=REGISTRY):
+        if workers < 1:
+            raise ValueError('Query workers must be at least 1, got {}'.format(workers))
+        self.query_fn = query_fn
+        self.publish_fn = publish_fn
+        self.org = org
+        self.reply_topic_patterns = [pattern.strip() for pattern in reply_topic_pattern.split(',') if pattern.strip()]
+        self.cache = cache
+        self.lock = threading.Lock()
+        # cache key -> Future of the query in progress
+        self.in_flight = {}
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='InfluxDBQuery')
+
+        self.requests = metrics_registry.counter(
+            'influxdb_query_requests_total', 'Query requests received.')
+        self.invalid_requests = metrics_registry.counter(
+            'influxdb_query_invalid_requests_total', 'Query requests rejected.', ['reason'])
+        self.hits = metrics_registry.counter(
+            'influxdb_query_cache_hits_total', 'Query requests answered from the cache.')
+        self.misses = metrics_registry.counter(
+            'influxdb_query_cache_misses_total', 'Query requests sent to InfluxDB.')
+        self.errors = metrics_registry.counter(
+            'influxdb_query_errors_total', 'Queries that failed.')
+        self.latency = metrics_registry.histogram(
+            'influxdb_query_latency_seconds', 'Time taken by InfluxDB to answer a query.', buckets=LATENCY_BUCKETS)
+
+    def is_reply_topic_allowed(self, reply_topic) -> bool:
+        return isinstance(reply_topic, str) and any(
+            fnmatch.fnmatchcase(reply_topic, pattern) for pattern in self.reply_topic_patterns)
+
+    def submit(self, message) -> None:
+        """
+        Validate a query request, and answer it in the background.
+
+        Parameters
+        ----------
+            message(dict): The request, with the Flux "query", its time "range" as "start" and optional "stop", the
+            "replyTopic", and an optional "correlationId"
+
+        Returns
+        -------
+            None
+        """
+        self.requests.inc()
+        reply_topic = message.get('replyTopic')
+        if not self.is_reply_topic_allowed(reply_topic):
+            self.invalid_requests.inc(reason='reply_topic_not_allowed')
+            logging.warning('Rejected a query with the reply topic {}'.format(reply_topic))
+            return
+        try:
+            key, flux, ttl = self.parse_request(message)
+        except ValueError as e:
+            self.invalid_requests.inc(reason='invalid_query')
+            self.reply(reply_topic, message, {'status': 'error', 'error': str(e)})
+            return
+        self.executor.submit(self.answer, key, flux, ttl, reply_topic, message)
+
+    def parse_request(self, message) -> tuple:
+        flux = message.get('query')
+        if not isinstance(flux, str) or not flux.strip():
+            raise ValueError('The request has no query')
+        if len(flux) > MAX_QUERY_LENGTH:
+            raise ValueError('The query is longer than {} characters'.format(MAX_QUERY_LENGTH))
+        time_range = message.get('range')
+        if not isinstance(time_range, dict) or 'start' not in time_range:
+            raise ValueError('The request has no range start')
+        start = time_range['start']
+        stop = time_range.get('stop', NOW)
+        start_offset = parse_time(start)
+        stop_offset = parse_time(stop)
+
+        # The range is passed like the InfluxDB UI does, as v.timeRangeStart and v.timeRangeStop
+        flux = 'option v = {{timeRangeStart: {}, timeRangeStop: {}}}\n{}'.format(start, stop, flux)
+        key = (self.org, normalize_query(message['query']), start, stop)
+        return key, flux, get_ttl(start_offset, stop_offset)
+
+    def answer(self, key, flux, ttl, reply_topic, message) -> None:
+        try:
+            result, cached = self.get_result(key, flux, ttl)
+            if len(result) > MAX_RESULT_BYTES:
+                response = {'status': 'error', 'error': 'The result is larger than {} bytes'.format(MAX_RESULT_BYTES)}
+            else:
+                response = {'status': 'ok', 'cached': cached, 'result': result}
+        except Exception as e:
+            logging.error('Failed to run a query', exc_info=True)
+            response = {'status': 'error', 'error': str(e)}
+        self.reply(reply_topic, message, response)
+
+    def get_result(self, key, flux, ttl) -> tuple:
+        """
+        Get the result of a query, from the cache if possible.
+
+        Parameters
+        ----------
+            key(tuple): The org, normalized query and time range
+            flux(str): The Flux query to run, including its time range
+            ttl(float): How long the result may be cached
+
+        Returns
+        -------
+            result(tuple): The annotated CSV result, and whether it was answered without querying InfluxDB
+        """
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.hits.inc()
+                return result, True
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = concurrent.futures.Future()
+        if not leader:
+            self.hits.inc()
+            return future.result(), True
+
+        self.misses.inc()
+        start = time.monotonic()
+        try:
+            result = self.query_fn(key[0], flux)
+        except Exception as e:
+            self.errors.inc()
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise e
+        self.latency.observe(time.monotonic() - start)
+        with self.lock:
+            self.cache.put(key, result, ttl)
+            del self.in_flight[key]
+        future.set_result(result)
+        return result, False
+
+    def reply(self, reply_topic, message, response) -> None:
+        if 'correlationId' in message:
+            response['correlationId'] = message['correlationId']
+        try:
+            self.publish_fn(reply_topic, response)
+        except Exception:
+            logging.error('Failed to publish a query result to {}'.format(reply_topic), exc_info=True)
+
+    def stop(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+class InfluxDBQueryStreamHandler(client.SubscribeToTopicStreamHandler):
+    def __init__(self, proxy):
+        super().__init__()
+        self.proxy = proxy
+        logging.info("Initialized InfluxDBQueryStreamHandler")
+
+    def on_stream_event(self, event: SubscriptionResponseMessage) -> None:
+        """
+        When we receive a query request over IPC, hand it to the query proxy.
+
+        Parameters
+        ----------
+            event(SubscriptionResponseMessage): The received IPC message
+
+        Returns
+        -------
+            None
+        """
+        try:
+            self.proxy.submit(event.json_message.message)
+        except Exception:
+            logging.error('Received an error', exc_info=True)
+
+    def on_stream_error(self, error: Exception) -> bool:
+        """
+        Log stream errors but keep the stream open.
+
+        Parameters
+        ----------
+            error(Exception): The exception we see as a result of the stream error.
+
+        Returns
+        -------
+            False(bool): Return False to keep the stream open.
+        """
+        logging.error('Received an error with the InfluxDB query stream', exc_info=True)
+        return False
+
+    def on_stream_closed(self) -> None:
+        logging.info('Subscribe to query topic stream closed.')
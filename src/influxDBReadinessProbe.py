@@ -0,0 +1,118 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import logging
+import time
+from argparse import Namespace
+
+from configParsing import parse_bool
+from influxDBClient import InfluxDBClient, get_client_host
+
+logging.basicConfig(level=logging.INFO)
+# Timeout for a single health check, so that a hung connection cannot use up the whole deadline
+PROBE_TIMEOUT = 2
+# Upper bound of the interval between two health checks
+MAX_INTERVAL = 5
+
+
+def parse_arguments() -> Namespace:
+    """
+    Parse arguments.
+
+    Parameters
+    ----------
+        None
+
+    Returns
+    -------
+        args(Namespace): Parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--influxdb_port", type=str, required=True)
+    parser.add_argument("--influxdb_interface", type=str, required=True)
+    parser.add_argument("--server_protocol", type=str, required=True)
+    parser.add_argument("--skip_tls_verify", type=str, required=True)
+    parser.add_argument("--tls_server_name", type=str, default="")
+    parser.add_argument("--initial_interval", type=float, default=0.5)
+    parser.add_argument("--backoff_factor", type=float, default=1.5)
+    parser.add_argument("--deadline", type=float, default=120)
+    return parser.parse_args()
+
+
+def is_ready(influxdb_client) -> bool:
+    """
+    Check once whether InfluxDB reports that it is ready.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client
+
+    Returns
+    -------
+        ready(bool): True if the health check passed
+    """
+    try:
+        health = influxdb_client.health()
+    except Exception as e:
+        # Connections are refused or reset until the InfluxDB HTTP listener is up
+        logging.info('InfluxDB is not reachable yet: {}'.format(e))
+        return False
+    logging.info('InfluxDB health status: {}'.format(health.get('status') if health else None))
+    return health is not None and health.get('status') == 'pass'
+
+
+def wait_for_ready(influxdb_client, initial_interval, backoff_factor, deadline,
+                   sleep=time.sleep, clock=time.monotonic) -> float:
+    """
+    Poll the InfluxDB health check quickly at first, then back off exponentially until it passes or the deadline expires.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client
+        initial_interval(float): Seconds to wait after the first failed health check
+        backoff_factor(float): Factor the interval grows by after each failed health check, up to MAX_INTERVAL
+        deadline(float): Seconds after which to give up
+
+    Returns
+    -------
+        time_to_ready(float): Seconds it took until InfluxDB was ready
+    """
+    if initial_interval <= 0 or backoff_factor < 1 or deadline <= 0:
+        raise ValueError('Invalid readiness probe settings: initial interval {}, backoff factor {}, deadline {}'.format(
+            initial_interval, backoff_factor, deadline))
+
+    start = clock()
+    interval = initial_interval
+    attempt = 0
+    while True:
+        logging.info('Attempt {}: Waiting until InfluxDB reports a status of OK...'.format(attempt))
+        if is_ready(influxdb_client):
+            time_to_ready = clock() - start
+            logging.info('InfluxDB was ready after {:.3f}s and {} attempts'.format(time_to_ready, attempt + 1))
+            return time_to_ready
+
+        remaining = deadline - (clock() - start)
+        if remaining <= 0:
+            raise TimeoutError('InfluxDB was not ready after {}s and {} attempts'.format(deadline, attempt + 1))
+        sleep(min(interval, remaining))
+        interval = min(interval * backoff_factor, MAX_INTERVAL)
+        attempt += 1
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_arguments()
+        influxdb_client = InfluxDBClient(
+            get_client_host(args.influxdb_interface),
+            args.influxdb_port,
+            server_protocol=args.server_protocol,
+            skip_tls_verify=parse_bool(args.skip_tls_verify),
+            server_hostname=args.tls_server_name,
+            timeout=PROBE_TIMEOUT
+        )
+        wait_for_ready(influxdb_client, args.initial_interval, args.backoff_factor, args.deadline)
+        influxdb_client.close()
+    except Exception:
+        logging.error('Failed while waiting for InfluxDB to start.', exc_info=True)
+        exit(1)
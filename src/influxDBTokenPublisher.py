@@ -2,26 +2,26 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import concurrent.futures
-import time
 import json
-import subprocess
 import logging
 import argparse
 from argparse import Namespace
-from distutils.util import strtobool
 
-import awsiot.greengrasscoreipc
-from awsiot.greengrasscoreipc.model import (
-    SubscribeToTopicRequest,
-    UnauthorizedError
-)
-from influxDBTokenStreamHandler import InfluxDBTokenStreamHandler
+# Imported first, so that the startup trace times the other imports
+from startupTrace import STARTUP_TRACE
+from awsiot.greengrasscoreipc.model import UnauthorizedError
+from admissionControl import AdmissionController
+from configParsing import parse_bool
+from influxDBClient import DEFAULT_MAX_CONNECTIONS, InfluxDBAPIError, InfluxDBClient, get_client_host
+from influxDBMetrics import REGISTRY, MetricsHTTPServer, MetricsSummaryPublisher
+from influxDBTokenStreamHandler import TOKEN_DESCRIPTIONS, InfluxDBTokenStreamHandler, publish_to_topic
+from ipcConnectionManager import IPC_CONNECTIONS, PUBLISH_CHANNEL
+from retrieveInfluxDBSecrets import SECRET_PROVIDER
+from tokenRefresher import TokenRefresher
+from publishPipeline import OVERFLOW_POLICIES, OVERFLOW_DROP_OLDEST
 
 logging.basicConfig(level=logging.INFO)
 TIMEOUT = 10
-# Influx commands need to be given the port of InfluxDB inside the container, which is always 8086 unless
-# overridden inside the InfluxDB config
-INFLUX_CONTAINER_PORT = 8086
 
 
 def parse_arguments() -> Namespace:
@@ -40,6 +40,7 @@ def parse_arguments() -> Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--subscribe_topic", type=str, required=True)
     parser.add_argument("--publish_topic", type=str, required=True)
+    parser.add_argument("--reply_topic_pattern", type=str, default="")
     parser.add_argument("--influxdb_container_name", type=str, required=True)
     parser.add_argument("--influxdb_org", type=str, required=True)
     parser.add_argument("--influxdb_bucket", type=str, required=True)
@@ -47,57 +48,164 @@ def parse_arguments() -> Namespace:
     parser.add_argument("--influxdb_interface", type=str, required=True)
     parser.add_argument("--server_protocol", type=str, required=True)
     parser.add_argument("--skip_tls_verify", type=str, required=True)
+    parser.add_argument("--tls_server_name", type=str, default="")
+    parser.add_argument("--secret_arn", type=str, required=True)
+    parser.add_argument("--publish_workers", type=int, default=0)
+    parser.add_argument("--publish_queue_size", type=int, default=100)
+    parser.add_argument("--publish_overflow_policy", type=str, choices=OVERFLOW_POLICIES, default=OVERFLOW_DROP_OLDEST)
+    parser.add_argument("--coalescing_window_ms", type=int, default=0)
+    parser.add_argument("--request_client_rate", type=float, default=0)
+    parser.add_argument("--request_client_burst", type=int, default=1)
+    parser.add_argument("--request_global_rate", type=float, default=0)
+    parser.add_argument("--request_global_burst", type=int, default=1)
+    parser.add_argument("--token_refresh_interval", type=float, default=0)
+    parser.add_argument("--control_topic", type=str, default="")
+    parser.add_argument("--ingest_topic", type=str, default="")
+    parser.add_argument("--ingest_batch_size", type=int, default=5000)
+    parser.add_argument("--ingest_flush_interval_ms", type=int, default=1000)
+    # The defaults of the optional features are inlined, so that their modules are only imported when enabled
+    parser.add_argument("--ingest_precision", type=str, choices=['ns', 'us', 'ms', 's'], default='ns')
+    parser.add_argument("--aggregation_window", type=float, default=0)
+    parser.add_argument("--aggregation_functions", type=str, default='min,max,mean,count,last')
+    parser.add_argument("--aggregation_raw_bucket", type=str, default="")
+    parser.add_argument("--aggregation_max_series", type=int, default=10000)
+    parser.add_argument("--write_buffer_path", type=str, default="")
+    parser.add_argument("--write_buffer_max_size_mb", type=int, default=64)
+    parser.add_argument("--write_buffer_replay_rate", type=int, default=5000)
+    parser.add_argument("--query_topic", type=str, default="")
+    parser.add_argument("--query_reply_topic_pattern", type=str, default="")
+    parser.add_argument("--query_cache_size_mb", type=int, default=16)
+    parser.add_argument("--query_workers", type=int, default=2)
+    parser.add_argument("--metrics_port", type=int, default=0)
+    parser.add_argument("--metrics_interface", type=str, default="127.0.0.1")
+    parser.add_argument("--metrics_topic", type=str, default="")
+    parser.add_argument("--metrics_publish_interval", type=float, default=60)
+    parser.add_argument("--monitor_interval", type=float, default=30)
+    parser.add_argument("--monitor_topic", type=str, default="")
+    parser.add_argument("--monitor_deltas", type=str, default="")
+    parser.add_argument("--influxdb_mount_path", type=str, default="")
     return parser.parse_args()
 
 
-def retrieve_influxDB_token_json(args) -> str:
+def create_influxdb_client(args, max_connections=DEFAULT_MAX_CONNECTIONS) -> InfluxDBClient:
     """
-    Retrieve the created RW token from InfluxDB.
+    Create an InfluxDB API client signed in with the credentials from Secret Manager.
 
     Parameters
     ----------
         args(Namespace): Parsed arguments
+        max_connections(int): The maximum number of idle connections kept open
 
     Returns
     -------
-        influxdb_rw_token(str): Parsed InfluxDB RW token.
+        influxdb_client(InfluxDBClient): Signed in InfluxDB API client
     """
 
-    token_json = ""
-    authListCommand = ['docker', 'exec', '-t', args.influxdb_container_name, 'influx', 'auth', 'list', '--json']
-    if args.server_protocol == "https":
-        authListCommand.append('--host')
-        authListCommand.append('https://{}:{}'.format(args.influxdb_container_name, INFLUX_CONTAINER_PORT))
+    influxdb_client = InfluxDBClient(
+        get_client_host(args.influxdb_interface),
+        args.influxdb_port,
+        server_protocol=args.server_protocol,
+        skip_tls_verify=parse_bool(args.skip_tls_verify),
+        server_hostname=args.tls_server_name,
+        timeout=TIMEOUT,
+        max_connections=max_connections
+    )
+    signin_influxdb_client(args, influxdb_client)
+    return influxdb_client
 
-    if bool(strtobool(args.skip_tls_verify)):
-        authListCommand.append('--skip-verify')
 
-    logging.info("Running the following docker exec command to retrieve the InfluxDB token: " + str(authListCommand))
+def signin_influxdb_client(args, influxdb_client) -> None:
+    """
+    Sign in to InfluxDB with the credentials from Secret Manager, retrieving them again if the cached ones are rejected.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        influxdb_client(InfluxDBClient): InfluxDB API client
 
-    dockerExecProcess = subprocess.run(authListCommand, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    token_json = dockerExecProcess.stdout
+    Returns
+    -------
+        None
+    """
+
+    username, password = SECRET_PROVIDER.get_credentials(args.secret_arn)
+    try:
+        influxdb_client.signin(username, password)
+    except InfluxDBAPIError as e:
+        if e.status != 401:
+            raise e
+        # The secret may have been rotated since it was cached
+        SECRET_PROVIDER.invalidate(args.secret_arn)
+        username, password = SECRET_PROVIDER.get_credentials(args.secret_arn)
+        influxdb_client.signin(username, password)
 
-    if dockerExecProcess.stderr:
-        logging.error(dockerExecProcess.stderr)
-    if(len(token_json) == 0):
-        logging.error('Failed to retrieve InfluxDB RW token data from Docker! Retrieved data was: {}'.format(token_json))
+
+def retrieve_influxDB_token_json(args, influxdb_client) -> str:
+    """
+    Retrieve the created tokens from InfluxDB.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        influxdb_client(InfluxDBClient): Signed in InfluxDB API client
+
+    Returns
+    -------
+        token_json(str): InfluxDB token JSON string.
+    """
+
+    logging.info("Retrieving the InfluxDB tokens from {}".format(influxdb_client.url))
+    try:
+        authorizations = influxdb_client.get_authorizations()
+    except Exception:
+        logging.error('Failed to retrieve InfluxDB token data from the InfluxDB API!', exc_info=True)
+        exit(1)
+
+    if len(authorizations) == 0:
+        logging.error('Failed to retrieve InfluxDB token data! Retrieved data was: {}'.format(authorizations))
         exit(1)
-    influxdb_token = json.loads(token_json)[0]['token']
+    influxdb_token = authorizations[0]['token']
     if(len(influxdb_token) == 0):
         logging.error('Retrieved InfluxDB tokens was empty!')
         exit(1)
 
-    return token_json
+    return json.dumps(authorizations)
 
 
-def listen_to_token_requests(args, influxdb_token_json) -> None:
+def fetch_influxDB_token_json(args, influxdb_client) -> str:
     """
-    Setup a new IPC subscription over local pub/sub to listen to token requests and vend tokens.
+    Re-read the tokens from InfluxDB, signing in again if the session has expired.
 
     Parameters
     ----------
         args(Namespace): Parsed arguments
-        influxdb_token_json(str): InfluxDB token JSON string
+        influxdb_client(InfluxDBClient): InfluxDB API client
+
+    Returns
+    -------
+        token_json(str): InfluxDB token JSON string.
+    """
+
+    try:
+        authorizations = influxdb_client.get_authorizations()
+    except InfluxDBAPIError as e:
+        if e.status != 401:
+            raise e
+        logging.info('InfluxDB session expired, signing in again...')
+        signin_influxdb_client(args, influxdb_client)
+        authorizations = influxdb_client.get_authorizations()
+    return json.dumps(authorizations)
+
+
+def subscribe_topic(connection_manager, topic, handler) -> None:
+    """
+    Subscribe a handler to a topic, logging and counting the reason if the subscription fails.
+
+    Parameters
+    ----------
+        connection_manager(IPCConnectionManager): Provides the IPC connections and keeps the subscription alive
+        topic(str): The topic to subscribe to
+        handler(SubscribeToTopicStreamHandler): The handler receiving the messages
 
     Returns
     -------
@@ -105,45 +213,384 @@ def listen_to_token_requests(args, influxdb_token_json) -> None:
     """
 
     try:
-        influxdb_metadata = {}
-        influxdb_metadata['InfluxDBContainerName'] = args.influxdb_container_name
-        influxdb_metadata['InfluxDBOrg'] = args.influxdb_org
-        influxdb_metadata['InfluxDBBucket'] = args.influxdb_bucket
-        influxdb_metadata['InfluxDBPort'] = args.influxdb_port
-        influxdb_metadata['InfluxDBInterface'] = args.influxdb_interface
-        influxdb_metadata['InfluxDBServerProtocol'] = args.server_protocol
-        influxdb_metadata['InfluxDBSkipTLSVerify'] = args.skip_tls_verify
-        influxdb_metadata_json = json.dumps(influxdb_metadata)
-
-        logging.info('Successfully retrieved InfluxDB parameters!')
-
-        ipc_client = awsiot.greengrasscoreipc.connect()
-        request = SubscribeToTopicRequest()
-        request.topic = args.subscribe_topic
-        handler = InfluxDBTokenStreamHandler(influxdb_metadata_json, influxdb_token_json, args.publish_topic)
-        operation = ipc_client.new_subscribe_to_topic(handler)
-        operation.activate(request)
-        logging.info('Successfully subscribed to topic: {}'.format(args.subscribe_topic))
-        logging.info("InfluxDB has been successfully set up; now listening to token requests...")
+        connection_manager.subscribe(topic, handler)
+        logging.info('Successfully subscribed to topic: {}'.format(topic))
     except concurrent.futures.TimeoutError as e:
-        logging.error('Timeout occurred while subscribing to topic: {}'.format(args.subscribe_topic), exc_info=True)
+        logging.error('Timeout occurred while subscribing to topic: {}'.format(topic), exc_info=True)
         raise e
     except UnauthorizedError as e:
-        logging.error('Unauthorized error while subscribing to topic: {}'.format(args.subscribe_topic), exc_info=True)
+        REGISTRY.counter('influxdb_subscribe_unauthorized_total', 'Subscriptions rejected with an UnauthorizedError.',
+                         ['topic']).inc(topic=topic)
+        logging.error('Unauthorized error while subscribing to topic: {}'.format(topic), exc_info=True)
         raise e
     except Exception as e:
-        logging.error('Exception while subscribing to topic: {}'.format(args.subscribe_topic), exc_info=True)
+        logging.error('Exception while subscribing to topic: {}'.format(topic), exc_info=True)
         raise e
 
 
+def listen_to_token_requests(args, influxdb_token_json, connection_manager) -> InfluxDBTokenStreamHandler:
+    """
+    Setup a new IPC subscription over local pub/sub to listen to token requests and vend tokens.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        influxdb_token_json(str): InfluxDB token JSON string
+        connection_manager(IPCConnectionManager): Provides the IPC connections and keeps the subscription alive
+
+    Returns
+    -------
+        handler(InfluxDBTokenStreamHandler): The handler vending the tokens
+    """
+
+    influxdb_metadata = {}
+    influxdb_metadata['InfluxDBContainerName'] = args.influxdb_container_name
+    influxdb_metadata['InfluxDBOrg'] = args.influxdb_org
+    influxdb_metadata['InfluxDBBucket'] = args.influxdb_bucket
+    influxdb_metadata['InfluxDBPort'] = args.influxdb_port
+    influxdb_metadata['InfluxDBInterface'] = args.influxdb_interface
+    influxdb_metadata['InfluxDBServerProtocol'] = args.server_protocol
+    influxdb_metadata['InfluxDBSkipTLSVerify'] = args.skip_tls_verify
+    influxdb_metadata_json = json.dumps(influxdb_metadata)
+
+    logging.info('Successfully retrieved InfluxDB parameters!')
+
+    connection_manager.get_client()
+    admission_controller = None
+    if args.request_client_rate > 0 or args.request_global_rate > 0:
+        admission_controller = AdmissionController(
+            args.request_client_rate, args.request_client_burst, args.request_global_rate,
+            args.request_global_burst)
+    handler = InfluxDBTokenStreamHandler(
+        influxdb_metadata_json,
+        influxdb_token_json,
+        args.publish_topic,
+        publish_workers=args.publish_workers,
+        publish_queue_size=args.publish_queue_size,
+        publish_overflow_policy=args.publish_overflow_policy,
+        coalescing_window=args.coalescing_window_ms / 1000,
+        ipc_connection_manager=connection_manager,
+        reply_topic_pattern=args.reply_topic_pattern,
+        admission_controller=admission_controller
+    )
+    subscribe_topic(connection_manager, args.subscribe_topic, handler)
+    logging.info("InfluxDB has been successfully set up; now listening to token requests...")
+    return handler
+
+
+def listen_to_control_requests(args, token_refresher, connection_manager) -> None:
+    """
+    Setup a new IPC subscription over local pub/sub to listen to control requests, such as token refreshes.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        token_refresher(TokenRefresher): Refreshes the vended tokens on request
+        connection_manager(IPCConnectionManager): Provides the IPC connections and keeps the subscription alive
+
+    Returns
+    -------
+        None
+    """
+
+    # The optional features are imported when they are started, so that they do not delay listening to token requests
+    from influxDBControlStreamHandler import InfluxDBControlStreamHandler
+
+    subscribe_topic(connection_manager, args.control_topic, InfluxDBControlStreamHandler(token_refresher))
+
+
+def write_to_influxdb(influxdb_client, token_handler, token_refresher, org, bucket, data, precision) -> None:
+    """
+    Write line protocol to InfluxDB with the read-write token of the bucket, refreshing the tokens if it was rotated.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client
+        token_handler(InfluxDBTokenStreamHandler): The handler vending the tokens
+        token_refresher(TokenRefresher): Refreshes the vended tokens
+        org(str): The org of the bucket
+        bucket(str): The bucket name
+        data(bytes): The line protocol to write
+        precision(str): The precision of the timestamps
+
+    Returns
+    -------
+        None
+    """
+
+    # Writes only ever use the token of their bucket, so they are limited to the buckets provisioned for Greengrass
+    token = token_handler.get_token(org, bucket, 'RW')
+    if token is None:
+        raise ValueError('No InfluxDB {} token for bucket {}/{}'.format(TOKEN_DESCRIPTIONS['RW'], org, bucket))
+    try:
+        influxdb_client.write(org, bucket, data, precision, token=token)
+    except InfluxDBAPIError as e:
+        if e.status != 401:
+            raise e
+        logging.info('InfluxDB read-write token was rejected, refreshing the tokens...')
+        token_refresher.refresh()
+        token = token_handler.get_token(org, bucket, 'RW')
+        if token is None:
+            raise e
+        influxdb_client.write(org, bucket, data, precision, token=token)
+
+
+def start_ingest_gateway(args, token_handler, token_refresher, connection_manager):
+    """
+    Start the ingest gateway and subscribe it to the ingest topic.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        token_handler(InfluxDBTokenStreamHandler): The handler vending the tokens the gateway writes with
+        token_refresher(TokenRefresher): Refreshes the vended tokens
+        connection_manager(IPCConnectionManager): Provides the IPC connections and keeps the subscription alive
+
+    Returns
+    -------
+        gateway(InfluxDBIngestGateway): The started ingest gateway
+    """
+
+    from influxDBAggregator import InfluxDBAggregator, parse_functions
+    from influxDBIngestGateway import InfluxDBIngestGateway, InfluxDBIngestStreamHandler
+    from influxDBReadinessProbe import is_ready
+    from influxDBWriteBuffer import DEFAULT_SEGMENT_BYTES, InfluxDBWriteBuffer
+
+    def create_write_client():
+        # Writes are authorized with the token of their bucket, so the client does not sign in
+        return InfluxDBClient(
+            get_client_host(args.influxdb_interface),
+            args.influxdb_port,
+            server_protocol=args.server_protocol,
+            skip_tls_verify=parse_bool(args.skip_tls_verify),
+            server_hostname=args.tls_server_name,
+            timeout=TIMEOUT,
+            max_connections=1
+        )
+
+    def get_write_fn(influxdb_client):
+        return lambda org, bucket, data, precision: write_to_influxdb(
+            influxdb_client, token_handler, token_refresher, org, bucket, data, precision)
+
+    # The gateway has a single writer thread, so one connection is all it needs
+    influxdb_client = create_write_client()
+
+    write_buffer = None
+    if args.write_buffer_path and args.write_buffer_max_size_mb > 0:
+        # The replay has its own connection, so that it does not hold up the live writes
+        replay_client = create_write_client()
+        write_buffer = InfluxDBWriteBuffer(
+            args.write_buffer_path,
+            get_write_fn(replay_client),
+            lambda: is_ready(replay_client),
+            max_bytes=args.write_buffer_max_size_mb * 1024 * 1024,
+            segment_bytes=min(DEFAULT_SEGMENT_BYTES, args.write_buffer_max_size_mb * 1024 * 1024),
+            replay_rate=args.write_buffer_replay_rate
+        )
+        write_buffer.start()
+        logging.info('Buffering failed writes in {}'.format(args.write_buffer_path))
+
+    aggregator = None
+    if args.aggregation_window > 0:
+        aggregator = InfluxDBAggregator(
+            args.aggregation_window,
+            functions=parse_functions(args.aggregation_functions),
+            raw_bucket=args.aggregation_raw_bucket,
+            max_series=args.aggregation_max_series
+        )
+        logging.info('Aggregating points into windows of {} seconds'.format(args.aggregation_window))
+
+    gateway = InfluxDBIngestGateway(
+        get_write_fn(influxdb_client),
+        args.influxdb_org,
+        args.influxdb_bucket,
+        batch_size=args.ingest_batch_size,
+        flush_interval=args.ingest_flush_interval_ms / 1000,
+        precision=args.ingest_precision,
+        write_buffer=write_buffer,
+        aggregator=aggregator,
+        is_writable=lambda org, bucket: token_handler.get_token(org, bucket, 'RW') is not None
+    )
+    gateway.start()
+    subscribe_topic(connection_manager, args.ingest_topic, InfluxDBIngestStreamHandler(gateway))
+    return gateway
+
+
+def get_readonly_token(token_json) -> str:
+    """
+    Get the read-only token of the main bucket.
+
+    Parameters
+    ----------
+        token_json(str): InfluxDB token JSON string
+
+    Returns
+    -------
+        token(str): The read-only token
+    """
+    for authorization in json.loads(token_json):
+        if authorization['description'] == TOKEN_DESCRIPTIONS['RO'] and authorization.get('status', 'active') == 'active':
+            return authorization['token']
+    raise ValueError('No active {} token was found'.format(TOKEN_DESCRIPTIONS['RO']))
+
+
+def run_query(args, query_client, influxdb_client, flux) -> str:
+    """
+    Run a Flux query with the read-only token, retrieving the token again if it has been rotated.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        query_client(InfluxDBClient): InfluxDB API client using the read-only token
+        influxdb_client(InfluxDBClient): Signed in InfluxDB API client, used to retrieve the tokens
+        flux(str): The Flux query
+
+    Returns
+    -------
+        result(str): The result as annotated CSV
+    """
+
+    try:
+        return query_client.query(args.influxdb_org, flux)
+    except InfluxDBAPIError as e:
+        if e.status != 401:
+            raise e
+        logging.info('InfluxDB read-only token was rejected, retrieving it again...')
+        query_client.token = get_readonly_token(fetch_influxDB_token_json(args, influxdb_client))
+        return query_client.query(args.influxdb_org, flux)
+
+
+def start_query_proxy(args, influxdb_token_json, influxdb_client, connection_manager):
+    """
+    Start the query proxy and subscribe it to the query topic.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        influxdb_token_json(str): InfluxDB token JSON string
+        influxdb_client(InfluxDBClient): Signed in InfluxDB API client, used to retrieve the tokens
+        connection_manager(IPCConnectionManager): Provides the IPC connections and keeps the subscription alive
+
+    Returns
+    -------
+        proxy(InfluxDBQueryProxy): The started query proxy
+    """
+
+    from influxDBQueryProxy import InfluxDBQueryProxy, InfluxDBQueryStreamHandler, QueryCache
+
+    # Queries can only read the main bucket, whatever the client asks for
+    query_client = InfluxDBClient(
+        get_client_host(args.influxdb_interface),
+        args.influxdb_port,
+        server_protocol=args.server_protocol,
+        skip_tls_verify=parse_bool(args.skip_tls_verify),
+        server_hostname=args.tls_server_name,
+        token=get_readonly_token(influxdb_token_json),
+        timeout=TIMEOUT,
+        max_connections=args.query_workers
+    )
+    proxy = InfluxDBQueryProxy(
+        lambda org, flux: run_query(args, query_client, influxdb_client, flux),
+        lambda topic, response: publish_to_topic(connection_manager.get_client(PUBLISH_CHANNEL), topic, response),
+        args.influxdb_org,
+        args.query_reply_topic_pattern,
+        QueryCache(args.query_cache_size_mb * 1024 * 1024),
+        workers=args.query_workers
+    )
+    subscribe_topic(connection_manager, args.query_topic, InfluxDBQueryStreamHandler(proxy))
+    return proxy
+
+
+def start_metrics_reporting(args, connection_manager) -> None:
+    """
+    Serve the process metrics over HTTP and publish periodic summaries over IPC, if configured.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        connection_manager(IPCConnectionManager): Provides the IPC connection to publish on
+
+    Returns
+    -------
+        None
+    """
+
+    if args.metrics_port > 0:
+        MetricsHTTPServer(args.metrics_interface, args.metrics_port).start()
+    if args.metrics_topic:
+        MetricsSummaryPublisher(
+            lambda summary: publish_to_topic(connection_manager.get_client(PUBLISH_CHANNEL), args.metrics_topic, summary),
+            args.metrics_publish_interval
+        ).start()
+        logging.info('Publishing metrics summaries to topic {} every {} seconds'.format(
+            args.metrics_topic, args.metrics_publish_interval))
+
+
+def create_monitor(args, connection_manager):
+    """
+    Create the monitor of the InfluxDB health and internal metrics.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        connection_manager(IPCConnectionManager): Provides the IPC connection to publish on
+
+    Returns
+    -------
+        monitor(InfluxDBMonitor): The monitor, which publishes status changes if a monitor topic is configured
+    """
+
+    from influxDBMonitor import InfluxDBMonitor, parse_deltas
+
+    # The health check and metrics endpoints do not need a token
+    monitor_client = InfluxDBClient(
+        get_client_host(args.influxdb_interface),
+        args.influxdb_port,
+        server_protocol=args.server_protocol,
+        skip_tls_verify=parse_bool(args.skip_tls_verify),
+        server_hostname=args.tls_server_name,
+        timeout=TIMEOUT,
+        max_connections=1
+    )
+    if args.monitor_topic:
+        logging.info('Publishing InfluxDB status changes to topic {}'.format(args.monitor_topic))
+    return InfluxDBMonitor(
+        monitor_client,
+        (lambda status: publish_to_topic(connection_manager.get_client(PUBLISH_CHANNEL), args.monitor_topic, status))
+        if args.monitor_topic else None,
+        args.monitor_interval,
+        args.influxdb_mount_path,
+        parse_deltas(args.monitor_deltas)
+    )
+
+
 if __name__ == "__main__":
     try:
+        STARTUP_TRACE.record_process_start()
         args = parse_arguments()
-        influxdb_token_json = retrieve_influxDB_token_json(args)
-        listen_to_token_requests(args, influxdb_token_json)
-        # Keep the main thread alive, or the process will exit.
-        while True:
-            time.sleep(10)
+        with STARTUP_TRACE.span('retrieve_tokens'):
+            influxdb_client = create_influxdb_client(args)
+            influxdb_token_json = retrieve_influxDB_token_json(args, influxdb_client)
+        with STARTUP_TRACE.span('subscribe_token_requests'):
+            handler = listen_to_token_requests(args, influxdb_token_json, IPC_CONNECTIONS)
+        STARTUP_TRACE.mark('listening')
+        token_refresher = TokenRefresher(
+            lambda: fetch_influxDB_token_json(args, influxdb_client), handler, args.token_refresh_interval)
+        token_refresher.start()
+        if args.control_topic:
+            with STARTUP_TRACE.span('subscribe_control_requests'):
+                listen_to_control_requests(args, token_refresher, IPC_CONNECTIONS)
+        if args.ingest_topic:
+            with STARTUP_TRACE.span('start_ingest_gateway'):
+                start_ingest_gateway(args, handler, token_refresher, IPC_CONNECTIONS)
+        if args.query_topic:
+            with STARTUP_TRACE.span('start_query_proxy'):
+                start_query_proxy(args, influxdb_token_json, influxdb_client, IPC_CONNECTIONS)
+        start_metrics_reporting(args, IPC_CONNECTIONS)
+        monitor = create_monitor(args, IPC_CONNECTIONS)
+        STARTUP_TRACE.finish()
+        # The monitor keeps the main thread alive, or the process will exit.
+        monitor.run()
     except InterruptedError:
         logging.error('Subscribe interrupted.', exc_info=True)
         exit(1)
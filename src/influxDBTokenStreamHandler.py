@@ -2,8 +2,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import concurrent.futures
+import fnmatch
 import logging
 import json
+import time
 import awsiot.greengrasscoreipc
 import awsiot.greengrasscoreipc.client as client
 from awsiot.greengrasscoreipc.model import (
@@ -13,20 +15,114 @@ from awsiot.greengrasscoreipc.model import (
     SubscriptionResponseMessage,
     UnauthorizedError
 )
+from admissionControl import get_client_id
+from influxDBMetrics import REGISTRY
+from ipcConnectionManager import PUBLISH_CHANNEL
+from publishPipeline import PublishPipeline, OVERFLOW_DROP_OLDEST
+from requestCoalescer import RequestCoalescer
 
 TIMEOUT = 10
 # Admin token description is in the format "USERNAME's Token"
 ADMIN_TOKEN_IDENTIFIER = "'s Token"
+# Descriptions of the scoped tokens created during provisioning, keyed by the requested access level
+TOKEN_DESCRIPTIONS = {
+    'RW': 'greengrass_readwrite',
+    'RO': 'greengrass_read'
+}
+ADMIN_ACCESS_LEVEL = 'Admin'
+ACCESS_LEVELS = list(TOKEN_DESCRIPTIONS) + [ADMIN_ACCESS_LEVEL]
+# Tokens for additional buckets are described as "greengrass_read:ORG/BUCKET", see provisionInfluxDB.py
+BUCKET_SEPARATOR = ':'
+ORG_SEPARATOR = '/'
+ACCESS_LEVELS_BY_DESCRIPTION = {description: access_level for access_level, description in TOKEN_DESCRIPTIONS.items()}
+RETRIEVE_TOKEN_ACTION = 'RetrieveToken'
+# Label value for request fields outside the known set, so that bad requests cannot create unbounded label values
+UNKNOWN_LABEL = 'unknown'
+COALESCED_REQUESTS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+
+def publish_to_topic(publish_client, topic, message) -> None:
+    """
+    Publish a JSON message over IPC and wait for the publish to be acknowledged.
+
+    Parameters
+    ----------
+        publish_client(GreengrassCoreIPCClient): The IPC client to publish with
+        topic(str): The topic to publish to
+        message(dict): The JSON message to publish
+
+    Returns
+    -------
+        None
+    """
+    request = PublishToTopicRequest()
+    request.topic = topic
+    publish_message = PublishMessage()
+    publish_message.json_message = JsonMessage()
+    publish_message.json_message.message = message
+    request.publish_message = publish_message
+    operation = publish_client.new_publish_to_topic()
+    operation.activate(request)
+    futureResponse = operation.get_response()
+    futureResponse.result(TIMEOUT)
+
+
+class TokenVendingMetrics:
+    """
+    The metrics recorded while vending tokens.
+    """
+
+    def __init__(self, registry):
+        self.requests = registry.counter(
+            'influxdb_token_requests_total', 'Token requests received.', ['action', 'access_level'])
+        self.invalid_requests = registry.counter(
+            'influxdb_token_invalid_requests_total', 'Token requests that could not be answered.', ['reason'])
+        self.publish_latency = registry.histogram(
+            'influxdb_token_publish_latency_seconds', 'Time taken to publish a token response.')
+        self.publish_timeouts = registry.counter(
+            'influxdb_token_publish_timeouts_total', 'Token responses that timed out while publishing.')
+        self.publish_unauthorized = registry.counter(
+            'influxdb_token_publish_unauthorized_total', 'Token responses rejected with an UnauthorizedError.')
+        self.publish_errors = registry.counter(
+            'influxdb_token_publish_errors_total', 'Token responses that failed to publish for any other reason.')
+        self.stream_errors = registry.counter(
+            'influxdb_token_stream_errors_total', 'Errors received on the token request stream.')
+        self.coalesced_requests = registry.histogram(
+            'influxdb_token_coalesced_requests', 'Token requests answered by each coalesced response.',
+            buckets=COALESCED_REQUESTS_BUCKETS)
 
 
 class InfluxDBTokenStreamHandler(client.SubscribeToTopicStreamHandler):
-    def __init__(self, influxdb_metadata_json, influxdb_token_json, publish_topic):
+    def __init__(self, influxdb_metadata_json, influxdb_token_json, publish_topic,
+                 publish_workers=0, publish_queue_size=100, publish_overflow_policy=OVERFLOW_DROP_OLDEST,
+                 coalescing_window=0, metrics_registry=REGISTRY, ipc_connection_manager=None, reply_topic_pattern='',
+                 admission_controller=None):
         super().__init__()
         # We need a separate IPC client for publishing
         self.influxDB_metadata_json = influxdb_metadata_json
         self.influxDB_token_json = influxdb_token_json
         self.publish_topic = publish_topic
-        self.publish_client = awsiot.greengrasscoreipc.connect()
+        # Requests may only ask for a response on their own reply topic if it matches one of these patterns
+        self.reply_topic_patterns = [pattern.strip() for pattern in reply_topic_pattern.split(',') if pattern.strip()]
+        metadata = json.loads(influxdb_metadata_json)
+        self.default_org = metadata.get('InfluxDBOrg')
+        self.default_bucket = metadata.get('InfluxDBBucket')
+        self.token_index = self.build_token_index(influxdb_metadata_json, influxdb_token_json)
+        self.metrics = TokenVendingMetrics(metrics_registry)
+        self.ipc_connection_manager = ipc_connection_manager
+        # Requests beyond the rate limits of the admission controller are dropped without a response
+        self.admission_controller = admission_controller
+        # Without a connection manager the handler publishes on a connection of its own, which is never restored
+        self.publish_client = awsiot.greengrasscoreipc.connect() if ipc_connection_manager is None else None
+        # Without publish workers, responses are published synchronously on the IPC callback thread
+        self.publish_pipeline = None
+        if publish_workers > 0:
+            self.publish_pipeline = PublishPipeline(
+                self.publish_response, publish_queue_size, publish_workers, publish_overflow_policy, metrics_registry)
+        # Duplicate requests for the same access level within the coalescing window are answered by one publish
+        self.request_coalescer = None
+        if coalescing_window > 0:
+            self.request_coalescer = RequestCoalescer(coalescing_window, self.publish_coalesced_response)
         logging.info("Initialized InfluxDBTokenStreamHandler")
 
     def handle_stream_event(self, event: SubscriptionResponseMessage) -> None:
@@ -43,14 +139,110 @@ class InfluxDBTokenStreamHandler(client.SubscribeToTopicStreamHandler):
         """
         try:
             message = event.json_message.message
+            # Checked first, so that a requester flooding the request topic costs as little as possible
+            if self.admission_controller is not None and not self.admission_controller.admit(get_client_id(message)):
+                return
+            self.record_request(message)
             publish_json = self.get_publish_json(message)
             if not publish_json:
                 logging.error("Failed to construct requested response for access")
                 return
-            self.publish_response(publish_json)
+
+            reply_topic = message.get('replyTopic')
+            if reply_topic is not None and not self.is_reply_topic_allowed(reply_topic):
+                self.metrics.invalid_requests.inc(reason='reply_topic_not_allowed')
+                logging.warning('Reply topic {} is not allowed by the reply topic pattern'.format(reply_topic))
+                return
+            # The response is only sent to the requester's reply topic, instead of being broadcast on the response topic
+            publish_args = (publish_json,) if reply_topic is None else (publish_json, reply_topic)
+
+            correlation_id = message.get('correlationId')
+            if correlation_id is not None:
+                publish_json = dict(publish_json)
+                publish_json['correlationId'] = correlation_id
+                publish_args = (publish_json,) + publish_args[1:]
+
+            # Responses that echo a correlation ID are specific to one request, so they cannot be shared
+            if self.request_coalescer is None or correlation_id is not None:
+                self.dispatch_response(*publish_args)
+            else:
+                self.request_coalescer.submit(
+                    (publish_json.get('InfluxDBOrg'), publish_json.get('InfluxDBBucket'),
+                     publish_json['InfluxDBTokenAccessType'], reply_topic),
+                    publish_args)
         except Exception:
+            self.metrics.invalid_requests.inc(reason='error')
             logging.error('Received an error', exc_info=True)
 
+    def record_request(self, message) -> None:
+        """
+        Count a received request by its action and access level.
+
+        Parameters
+        ----------
+            message(dict): the received IPC message
+
+        Returns
+        -------
+            None
+        """
+        action = message.get('action')
+        access_level = message.get('accessLevel')
+        self.metrics.requests.inc(
+            action=action if action == RETRIEVE_TOKEN_ACTION else UNKNOWN_LABEL,
+            access_level=access_level if access_level in ACCESS_LEVELS else UNKNOWN_LABEL)
+
+    def is_reply_topic_allowed(self, reply_topic) -> bool:
+        """
+        Check a requested reply topic against the reply topic patterns.
+
+        Parameters
+        ----------
+            reply_topic(str): the requested reply topic
+
+        Returns
+        -------
+            allowed(bool): True if the topic matches one of the patterns
+        """
+        return isinstance(reply_topic, str) and any(
+            fnmatch.fnmatchcase(reply_topic, pattern) for pattern in self.reply_topic_patterns)
+
+    def dispatch_response(self, *publish_args) -> None:
+        """
+        Publish the response directly, or hand it to the publish pipeline if one is configured.
+
+        Parameters
+        ----------
+            publish_args: the message to send including InfluxDB metadata and token, and optionally the reply topic
+
+        Returns
+        -------
+            None
+        """
+        if self.publish_pipeline is None:
+            self.publish_response(*publish_args)
+            return
+        if not self.publish_pipeline.submit(*publish_args):
+            logging.error('Dropped InfluxDB token response because the publish queue is full')
+
+    def publish_coalesced_response(self, publish_args, served) -> None:
+        """
+        Publish a response once for all of the duplicate requests collected in a coalescing window.
+
+        Parameters
+        ----------
+            publish_args(tuple): the message to send including InfluxDB metadata and token, and optionally the reply topic
+            served(int): the number of requests answered by this response
+
+        Returns
+        -------
+            None
+        """
+        self.metrics.coalesced_requests.observe(served)
+        logging.info('Publishing one InfluxDB {} token response for {} coalesced requests'.format(
+            publish_args[0]['InfluxDBTokenAccessType'], served))
+        self.dispatch_response(*publish_args)
+
     def on_stream_event(self, event: SubscriptionResponseMessage) -> None:
         self.handle_stream_event(event)
 
@@ -66,6 +258,7 @@ class InfluxDBTokenStreamHandler(client.SubscribeToTopicStreamHandler):
         -------
             False(bool): Return False to keep the stream open.
         """
+        self.metrics.stream_errors.inc()
         logging.error('Received an error with the InfluxDB token publish stream', exc_info=True)
         return False
 
@@ -83,72 +276,192 @@ class InfluxDBTokenStreamHandler(client.SubscribeToTopicStreamHandler):
         """
         logging.info('Subscribe to topic stream closed.')
 
+    def build_token_index(self, influxdb_metadata_json, influxdb_token_json) -> dict:
+        """
+        Parse the token and metadata JSON once, and build the response to publish for each active token.
+
+        Parameters
+        ----------
+            influxdb_metadata_json(str): InfluxDB metadata JSON string
+            influxdb_token_json(str): InfluxDB token JSON string
+
+        Returns
+        -------
+            token_index(dict): The complete response to publish keyed by (org, bucket, access level), or None if a
+            token of the main bucket is missing. The admin token is keyed by (None, None, 'Admin').
+        """
+        # Tokens that have been deactivated can no longer be used, so they are never vended
+        loaded_token_json = [d for d in json.loads(influxdb_token_json) if d.get('status', 'active') == 'active']
+        metadata = json.loads(influxdb_metadata_json)
+        org = metadata.get('InfluxDBOrg')
+        bucket = metadata.get('InfluxDBBucket')
+
+        tokens = {(org, bucket, access_level): None for access_level in TOKEN_DESCRIPTIONS}
+        tokens[(None, None, ADMIN_ACCESS_LEVEL)] = None
+        for d in loaded_token_json:
+            key = self.get_token_key(d['description'], org, bucket)
+            if key is not None and tokens.get(key) is None:
+                tokens[key] = d['token']
+        if len(loaded_token_json) > 0 and ADMIN_TOKEN_IDENTIFIER in loaded_token_json[0]['description']:
+            tokens[(None, None, ADMIN_ACCESS_LEVEL)] = loaded_token_json[0]['token']
+
+        token_index = {}
+        for (token_org, token_bucket, access_level), token in tokens.items():
+            if token is None:
+                token_index[(token_org, token_bucket, access_level)] = None
+                continue
+            publish_json = dict(metadata)
+            if (token_org, token_bucket) != (org, bucket) and access_level != ADMIN_ACCESS_LEVEL:
+                publish_json['InfluxDBOrg'] = token_org
+                publish_json['InfluxDBBucket'] = token_bucket
+            publish_json['InfluxDBTokenAccessType'] = access_level
+            publish_json['InfluxDBToken'] = token
+            token_index[(token_org, token_bucket, access_level)] = publish_json
+        return token_index
+
+    @staticmethod
+    def get_token_key(description, org, bucket):
+        """
+        Get the index key of a scoped token from its description.
+
+        Parameters
+        ----------
+            description(str): The token description
+            org(str): The org of the main bucket
+            bucket(str): The main bucket
+
+        Returns
+        -------
+            key(tuple): The (org, bucket, access level) of the token, or None if it is not a scoped token
+        """
+        access_description, separator, scope = description.partition(BUCKET_SEPARATOR)
+        access_level = ACCESS_LEVELS_BY_DESCRIPTION.get(access_description)
+        if access_level is None:
+            return None
+        if not separator:
+            return (org, bucket, access_level)
+        token_org, _, token_bucket = scope.rpartition(ORG_SEPARATOR)
+        if not token_org or not token_bucket:
+            return None
+        return (token_org, token_bucket, access_level)
+
+    def update_tokens(self, influxdb_token_json) -> bool:
+        """
+        Rebuild the token index from a fresh token list, and swap it in if any vended token changed.
+
+        Parameters
+        ----------
+            influxdb_token_json(str): InfluxDB token JSON string
+
+        Returns
+        -------
+            changed(bool): True if the token index was replaced
+        """
+        token_index = self.build_token_index(self.influxDB_metadata_json, influxdb_token_json)
+        if token_index == self.token_index:
+            return False
+        # Replacing the reference is atomic, so requests see either the old or the new index
+        self.token_index = token_index
+        self.influxDB_token_json = influxdb_token_json
+        logging.info('Updated the InfluxDB tokens vended for: {}'.format(
+            [key for key, publish_json in token_index.items() if publish_json is not None]))
+        return True
+
+    def get_token(self, org, bucket, access_level):
+        """
+        Look up the current token of a bucket.
+
+        Parameters
+        ----------
+            org(str): The org of the bucket
+            bucket(str): The bucket name
+            access_level(str): RW or RO
+
+        Returns
+        -------
+            token(str): The token, or None if there is no active token for the bucket
+        """
+        publish_json = self.token_index.get((org, bucket, access_level))
+        if publish_json is None:
+            return None
+        return publish_json['InfluxDBToken'] or None
+
     def get_publish_json(self, message):
         """
-        Parse the correct token based on the IPC message received, and construct the final JSON to publish.
+        Look up the pre-built response for the token requested in the IPC message.
 
         :param message: the received IPC messsage
         :return: the complete JSON, including token, to publish
         """
 
-        loaded_token_json = json.loads(self.influxDB_token_json)
-        publish_json = json.loads(self.influxDB_metadata_json)
-
-        if not message['action'] == 'RetrieveToken':
+        if not message['action'] == RETRIEVE_TOKEN_ACTION:
+            self.metrics.invalid_requests.inc(reason='unknown_action')
             logging.warning('Unknown request type received over pub/sub')
             return None
 
-        token = ''
-        if message['accessLevel'] == 'RW':
-            token = next(d for d in loaded_token_json if d['description'] == 'greengrass_readwrite')['token']
-        elif message['accessLevel'] == 'RO':
-            token = next(d for d in loaded_token_json if d['description'] == 'greengrass_read')['token']
-        elif message['accessLevel'] == 'Admin':
-            if not ADMIN_TOKEN_IDENTIFIER in loaded_token_json[0]['description']:
-                logging.warning("InfluxDB admin token is missing or in an incorrect format")
-                return None
-            token = loaded_token_json[0]['token']
-        else:
+        access_level = message['accessLevel']
+        if access_level not in ACCESS_LEVELS:
+            self.metrics.invalid_requests.inc(reason='unknown_access_level')
             logging.warning('Unknown token request type specified over pub/sub')
             return None
 
-        if len(token) == 0:
-            raise ValueError('Failed to parse InfluxDB {} token!'.format(message['accessLevel']))
-        publish_json['InfluxDBTokenAccessType'] = message['accessLevel']
-        publish_json['InfluxDBToken'] = token
-        logging.info('Sending InfluxDB {} Token on the response topic'.format(message['accessLevel']))
+        if access_level == ADMIN_ACCESS_LEVEL:
+            key = (None, None, ADMIN_ACCESS_LEVEL)
+        else:
+            key = (message.get('org', self.default_org), message.get('bucket', self.default_bucket), access_level)
+        token_index = self.token_index
+        if key not in token_index:
+            self.metrics.invalid_requests.inc(reason='unknown_bucket')
+            logging.warning('No InfluxDB {} token for bucket {}/{}'.format(access_level, key[0], key[1]))
+            return None
+
+        publish_json = token_index[key]
+        if publish_json is None:
+            self.metrics.invalid_requests.inc(reason='missing_token')
+            if access_level == ADMIN_ACCESS_LEVEL:
+                logging.warning("InfluxDB admin token is missing or in an incorrect format")
+            else:
+                logging.warning("InfluxDB {} token is missing".format(access_level))
+            return None
+
+        if len(publish_json['InfluxDBToken']) == 0:
+            raise ValueError('Failed to parse InfluxDB {} token!'.format(access_level))
+        logging.info('Sending InfluxDB {} Token on the response topic'.format(access_level))
         return publish_json
 
-    def publish_response(self, publishMessage) -> None:
+    def get_publish_client(self):
+        if self.ipc_connection_manager is None:
+            return self.publish_client
+        return self.ipc_connection_manager.get_client(PUBLISH_CHANNEL)
+
+    def publish_response(self, publishMessage, topic=None) -> None:
         """
-        Publish the InfluxDB token on the token response topic.
+        Publish the InfluxDB token on the token response topic, or on the requester's reply topic.
 
         Parameters
         ----------
             publishMessage(str): the message to send including InfluxDB metadata and token
+            topic(str): the reply topic to publish to instead of the token response topic
 
         Returns
         -------
             None
         """
+        topic = topic or self.publish_topic
+        start = time.monotonic()
         try:
-            request = PublishToTopicRequest()
-            request.topic = self.publish_topic
-            publish_message = PublishMessage()
-            publish_message.json_message = JsonMessage()
-            publish_message.json_message.message = publishMessage
-            request.publish_message = publish_message
-            operation = self.publish_client.new_publish_to_topic()
-            operation.activate(request)
-            futureResponse = operation.get_response()
-            futureResponse.result(TIMEOUT)
-            logging.info('Successfully published InfluxDB token response to topic: {}'.format(self.publish_topic))
+            publish_to_topic(self.get_publish_client(), topic, publishMessage)
+            self.metrics.publish_latency.observe(time.monotonic() - start)
+            logging.info('Successfully published InfluxDB token response to topic: {}'.format(topic))
         except concurrent.futures.TimeoutError as e:
-            logging.error('Timeout occurred while publishing to topic: {}'.format(self.publish_topic), exc_info=True)
+            self.metrics.publish_timeouts.inc()
+            logging.error('Timeout occurred while publishing to topic: {}'.format(topic), exc_info=True)
             raise e
         except UnauthorizedError as e:
-            logging.error('Unauthorized error while publishing to topic: {}'.format(self.publish_topic), exc_info=True)
+            self.metrics.publish_unauthorized.inc()
+            logging.error('Unauthorized error while publishing to topic: {}'.format(topic), exc_info=True)
             raise e
         except Exception as e:
-            logging.error('Exception while publishing to topic: {}'.format(self.publish_topic), exc_info=True)
+            self.metrics.publish_errors.inc()
+            logging.error('Exception while publishing to topic: {}'.format(topic), exc_info=True)
             raise e
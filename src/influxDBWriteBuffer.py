@@ -0,0 +1,319 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from influxDBClient import is_retryable_error
+from influxDBMetrics import REGISTRY
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+# Each record is its payload length and CRC32, followed by the JSON payload
+RECORD_HEADER = struct.Struct('>II')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_REPLAY_RATE = 5000
+DEFAULT_REPLAY_BATCH_SIZE = 5000
+# How long to wait before checking the health of InfluxDB again while it is unavailable
+HEALTH_CHECK_INTERVAL = 5
+
+
+def read_records(path) -> tuple:
+    """
+    Read the valid records of a segment file, stopping at the first torn or corrupt record.
+
+    Parameters
+    ----------
+        path(str): The segment file
+
+    Returns
+    -------
+        records(tuple): The decoded records, and the length of the valid part of the file
+    """
+    records = []
+    valid_length = 0
+    with open(path, 'rb') as segment:
+        data = segment.read()
+    while valid_length + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, valid_length)
+        start = valid_length + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(json.loads(payload.decode('utf-8')))
+        valid_length = start + length
+    return records, valid_length
+
+
+class InfluxDBWriteBuffer:
+    """
+    A disk-backed, append-only buffer of the batches that could not be written to InfluxDB.
+
+    Batches are appended to segment files of a bounded size. Once InfluxDB is healthy again, a background thread
+    replays the oldest segment in large batches at a bounded rate, and deletes it once it has been written.
+    When the buffer grows beyond its maximum size, the oldest segments are evicted.
+    """
+
+    def __init__(self, directory, write_fn, health_fn, max_bytes=DEFAULT_MAX_BYTES, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 replay_rate=DEFAULT_REPLAY_RATE, replay_batch_size=DEFAULT_REPLAY_BATCH_SIZE,
+                 metrics_registry=REGISTRY):
+        if segment_bytes < 1 or max_bytes < segment_bytes:
+            raise ValueError('Write buffer size {} must be at least the segment size {}'.format(max_bytes, segment_bytes))
+        if replay_rate <= 0:
+            raise ValueError('Replay rate must be positive, got {}'.format(replay_rate))
+
+        self.directory = directory
+        self.write_fn = write_fn
+        self.health_fn = health_fn
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.replay_rate = replay_rate
+        self.replay_batch_size = replay_batch_size
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.data_available = threading.Event()
+        self.replay_thread = threading.Thread(target=self.run_replay, name='InfluxDBBufferReplay', daemon=True)
+
+        self.points_buffered = metrics_registry.counter(
+            'influxdb_buffer_points_buffered_total', 'Points stored in the write buffer.')
+        self.points_replayed = metrics_registry.counter(
+            'influxdb_buffer_points_replayed_total', 'Points replayed from the write buffer.')
+        self.points_rejected = metrics_registry.counter(
+            'influxdb_buffer_points_rejected_total', 'Points dropped from the write buffer because InfluxDB rejected them.')
+        self.points_evicted = metrics_registry.counter(
+            'influxdb_buffer_points_evicted_total', 'Points evicted from the write buffer because it was full.')
+        self.corrupt_segments = metrics_registry.counter(
+            'influxdb_buffer_corrupt_segments_total', 'Segments with a torn or corrupt tail found on recovery.')
+        metrics_registry.callback_gauge(
+            'influxdb_buffer_bytes', 'Bytes held by the write buffer.', lambda: self.total_bytes)
+
+        os.makedirs(directory, exist_ok=True)
+        # Sequence number -> size in bytes, oldest first
+        self.segments = {}
+        self.segment_points = {}
+        self.active_file = None
+        self.active_sequence = None
+        self.recover()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.segments.values())
+
+    def segment_path(self, sequence) -> str:
+        return os.path.join(self.directory, '{}{:016d}{}'.format(SEGMENT_PREFIX, sequence, SEGMENT_SUFFIX))
+
+    def recover(self) -> None:
+        """
+        Load the segments left by a previous run, truncating any record that was only partly written.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            sequence = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            path = self.segment_path(sequence)
+            records, valid_length = read_records(path)
+            if valid_length < os.path.getsize(path):
+                self.corrupt_segments.inc()
+                logging.warning('Truncating the torn tail of write buffer segment {}'.format(path))
+                with open(path, 'r+b') as segment:
+                    segment.truncate(valid_length)
+            if not records:
+                os.remove(path)
+                continue
+            self.segments[sequence] = valid_length
+            self.segment_points[sequence] = sum(len(record['lines']) for record in records)
+        if self.segments:
+            logging.info('Recovered {} points in {} write buffer segments'.format(
+                sum(self.segment_points.values()), len(self.segments)))
+            self.data_available.set()
+
+    def start(self) -> None:
+        self.replay_thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.data_available.set()
+        if self.replay_thread.is_alive():
+            self.replay_thread.join()
+        with self.lock:
+            self.close_active()
+
+    def close_active(self) -> None:
+        if self.active_file is not None:
+            self.active_file.flush()
+            os.fsync(self.active_file.fileno())
+            self.active_file.close()
+            self.active_file = None
+
+    def append(self, key, lines) -> None:
+        """
+        Append a batch that could not be written to the buffer.
+
+        Parameters
+        ----------
+            key(tuple): The org, bucket and precision of the batch
+            lines(list): The lines of line protocol
+
+        Returns
+        -------
+            None
+        """
+        org, bucket, precision = key
+        payload = json.dumps({'org': org, 'bucket': bucket, 'precision': precision, 'lines': lines}).encode('utf-8')
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            if self.active_file is None or self.segments[self.active_sequence] + len(record) > self.segment_bytes:
+                self.rotate()
+            self.active_file.write(record)
+            self.active_file.flush()
+            self.segments[self.active_sequence] += len(record)
+            self.segment_points[self.active_sequence] += len(lines)
+            self.evict()
+        self.points_buffered.inc(len(lines))
+        self.data_available.set()
+
+    def rotate(self) -> None:
+        # The finished segment is synced to disk once, instead of on every append
+        self.close_active()
+        self.active_sequence = max(self.segments, default=0) + 1
+        self.segments[self.active_sequence] = 0
+        self.segment_points[self.active_sequence] = 0
+        self.active_file = open(self.segment_path(self.active_sequence), 'ab')
+
+    def evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self.segments) > 1:
+            sequence = min(self.segments)
+            os.remove(self.segment_path(sequence))
+            del self.segments[sequence]
+            evicted = self.segment_points.pop(sequence)
+            self.points_evicted.inc(evicted)
+            logging.warning('Write buffer is full, evicted {} of the oldest points'.format(evicted))
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return not self.segments
+
+    def take_oldest_segment(self):
+        with self.lock:
+            if not self.segments:
+                return None
+            sequence = min(self.segments)
+            # The active segment is closed so that it can be replayed, and new batches go to a new segment
+            if self.active_file is not None and sequence == self.active_sequence:
+                self.close_active()
+            return sequence
+
+    def replay_segment(self, sequence) -> bool:
+        """
+        Replay all records of a segment, merging consecutive records for the same bucket into large batches.
+
+        Parameters
+        ----------
+            sequence(int): The sequence number of the segment
+
+        Returns
+        -------
+            replayed(bool): True if the whole segment was written and deleted
+        """
+        path = self.segment_path(sequence)
+        try:
+            records, _ = read_records(path)
+        except FileNotFoundError:
+            # The segment was evicted before it could be replayed
+            return True
+        # Each batch keeps the lines of its records apart, so that they can be replayed one by one if it is rejected
+        batches = []
+        for record in records:
+            key = (record['org'], record['bucket'], record['precision'])
+            if batches and batches[-1][0] == key and \
+                    sum(len(lines) for lines in batches[-1][1]) + len(record['lines']) <= self.replay_batch_size:
+                batches[-1][1].append(record['lines'])
+            else:
+                batches.append((key, [record['lines']]))
+
+        try:
+            for key, record_lines in batches:
+                if self.stopped.is_set():
+                    return False
+                start = time.monotonic()
+                self.replay_batch(key, record_lines)
+                # Bound the replay rate, so that the replay does not starve live writes
+                points = sum(len(lines) for lines in record_lines)
+                self.stopped.wait(max(0, points / self.replay_rate - (time.monotonic() - start)))
+        except Exception:
+            logging.error('Failed to replay buffered points, retrying later', exc_info=True)
+            return False
+
+        with self.lock:
+            if sequence in self.segments:
+                os.remove(path)
+                del self.segments[sequence]
+                del self.segment_points[sequence]
+        logging.info('Replayed write buffer segment {}'.format(path))
+        return True
+
+    def replay_batch(self, key, record_lines) -> None:
+        """
+        Write a batch of buffered records to InfluxDB, dropping the records that InfluxDB rejects.
+
+        Parameters
+        ----------
+            key(tuple): The org, bucket and precision of the records
+            record_lines(list): The lines of line protocol of each record
+
+        Returns
+        -------
+            None. Errors after which the write may succeed later are raised, so that the segment is replayed again.
+        """
+        lines = [line for lines in record_lines for line in lines]
+        try:
+            self.write_fn(*key[:2], '\n'.join(lines).encode('utf-8'), key[2])
+        except Exception as e:
+            if is_retryable_error(e):
+                raise
+            if len(record_lines) == 1:
+                self.points_rejected.inc(len(lines))
+                logging.error('InfluxDB rejected {} buffered points for bucket {}/{}, dropping them'.format(
+                    len(lines), key[0], key[1]), exc_info=True)
+                return
+            # Replay the records one by one, so that only the records InfluxDB rejects on their own are dropped
+            logging.warning('InfluxDB rejected a batch of {} buffered points, replaying its records one by one'.format(
+                len(lines)))
+            for lines in record_lines:
+                self.replay_batch(key, [lines])
+            return
+        self.points_replayed.inc(len(lines))
+
+    def run_replay(self) -> None:
+        while not self.stopped.is_set():
+            self.data_available.wait()
+            if self.stopped.is_set():
+                return
+            sequence = self.take_oldest_segment()
+            if sequence is None:
+                self.data_available.clear()
+                # Appends may have happened between the check and the clear
+                if not self.is_empty():
+                    self.data_available.set()
+                continue
+            try:
+                healthy = self.health_fn()
+            except Exception:
+                logging.warning('Failed to check the health of InfluxDB', exc_info=True)
+                healthy = False
+            if not healthy or not self.replay_segment(sequence):
+                self.stopped.wait(HEALTH_CHECK_INTERVAL)
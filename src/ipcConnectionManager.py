@@ -0,0 +1,274 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+
+import awsiot.greengrasscoreipc
+import awsiot.greengrasscoreipc.client as client
+from awsiot.eventstreamrpc import LifecycleHandler
+from awsiot.greengrasscoreipc.model import SubscribeToTopicRequest
+
+from influxDBMetrics import REGISTRY
+
+# Subscriptions and secret retrieval share the default channel, while responses are published on their own
+# connection so that a burst of publishes cannot delay incoming requests
+DEFAULT_CHANNEL = 'default'
+PUBLISH_CHANNEL = 'publish'
+TIMEOUT = 10
+INITIAL_BACKOFF = 1
+MAX_BACKOFF = 60
+BACKOFF_FACTOR = 2
+
+
+class ChannelLifecycleHandler(LifecycleHandler):
+    """
+    Reports the disconnection of a channel's connection to the connection manager.
+    """
+
+    def __init__(self, manager, channel):
+        super().__init__()
+        self.manager = manager
+        self.channel = channel
+        self.ipc_client = None
+
+    def on_disconnect(self, reason) -> None:
+        self.manager.on_disconnect(self.channel, self.ipc_client, reason)
+
+    def on_error(self, error) -> bool:
+        logging.error('Received an error on IPC channel {}'.format(self.channel), exc_info=error)
+        return True
+
+
+class ManagedStreamHandler(client.SubscribeToTopicStreamHandler):
+    """
+    Forwards the events of one subscription attempt to the subscription's handler, and reports the stream closing
+    to the connection manager so that it can subscribe again.
+    """
+
+    def __init__(self, manager, subscription):
+        super().__init__()
+        self.manager = manager
+        self.subscription = subscription
+
+    def on_stream_event(self, event) -> None:
+        self.subscription.stream_handler.on_stream_event(event)
+
+    def on_stream_error(self, error) -> bool:
+        return self.subscription.stream_handler.on_stream_error(error)
+
+    def on_stream_closed(self) -> None:
+        self.subscription.stream_handler.on_stream_closed()
+        self.manager.on_stream_closed(self.subscription, self)
+
+
+class Subscription:
+    def __init__(self, topic, stream_handler, channel):
+        self.topic = topic
+        self.stream_handler = stream_handler
+        self.channel = channel
+        self.active_handler = None
+        self.operation = None
+
+
+class IPCConnectionManager:
+    """
+    Hands out IPC clients on a small set of shared, named connections, and restores them when they are lost.
+
+    When a connection disconnects or a subscription stream closes, a background thread reconnects with exponential
+    backoff and subscribes again to the affected topics with the same handlers.
+    """
+
+    def __init__(self, initial_backoff=INITIAL_BACKOFF, max_backoff=MAX_BACKOFF, backoff_factor=BACKOFF_FACTOR,
+                 metrics_registry=REGISTRY):
+        if initial_backoff <= 0:
+            raise ValueError('Initial reconnect backoff must be positive, got {}'.format(initial_backoff))
+        if backoff_factor < 1:
+            raise ValueError('Reconnect backoff factor must be at least 1, got {}'.format(backoff_factor))
+
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.backoff_factor = backoff_factor
+        self.lock = threading.RLock()
+        # channel -> connected client, or None while the channel is waiting to be reconnected
+        self.clients = {}
+        self.subscriptions = []
+        self.pending_subscriptions = []
+        self.closed = threading.Event()
+        self.restore_requested = threading.Event()
+        self.restore_thread = None
+        self.connected_gauge = metrics_registry.gauge(
+            'influxdb_ipc_connected', 'Whether the IPC channel is connected.', ['channel'])
+        self.reconnects = metrics_registry.counter(
+            'influxdb_ipc_reconnects_total', 'Successful IPC reconnections.', ['channel'])
+        self.reconnect_failures = metrics_registry.counter(
+            'influxdb_ipc_reconnect_failures_total', 'Failed attempts to restore IPC connections and subscriptions.')
+        self.resubscribes = metrics_registry.counter(
+            'influxdb_ipc_resubscribes_total', 'Subscriptions restored after their stream closed.', ['topic'])
+
+    def connect(self, channel):
+        lifecycle_handler = ChannelLifecycleHandler(self, channel)
+        ipc_client = awsiot.greengrasscoreipc.connect(lifecycle_handler=lifecycle_handler)
+        lifecycle_handler.ipc_client = ipc_client
+        with self.lock:
+            self.clients[channel] = ipc_client
+        self.connected_gauge.set(1, channel=channel)
+        logging.info('Connected IPC channel {}'.format(channel))
+        return ipc_client
+
+    def get_client(self, channel=DEFAULT_CHANNEL):
+        """
+        Get the IPC client of a channel, connecting it on first use.
+
+        Parameters
+        ----------
+            channel(str): The name of the channel
+
+        Returns
+        -------
+            ipc_client(GreengrassCoreIPCClient): The connected IPC client
+
+        Raises
+        ------
+            ConnectionError: The channel has disconnected and is being reconnected in the background
+        """
+        with self.lock:
+            if channel not in self.clients:
+                return self.connect(channel)
+            ipc_client = self.clients[channel]
+        if ipc_client is None:
+            self.restore_requested.set()
+            raise ConnectionError('IPC channel {} is disconnected, reconnecting...'.format(channel))
+        return ipc_client
+
+    def subscribe(self, topic, stream_handler, channel=DEFAULT_CHANNEL) -> Subscription:
+        """
+        Subscribe a handler to a topic, and keep it subscribed across stream closures and reconnections.
+
+        Parameters
+        ----------
+            topic(str): The topic to subscribe to
+            stream_handler(SubscribeToTopicStreamHandler): The handler receiving the messages
+            channel(str): The name of the channel to subscribe on
+
+        Returns
+        -------
+            subscription(Subscription): The managed subscription
+        """
+        subscription = Subscription(topic, stream_handler, channel)
+        self.activate(subscription)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        self.start()
+        return subscription
+
+    def activate(self, subscription) -> None:
+        active_handler = ManagedStreamHandler(self, subscription)
+        request = SubscribeToTopicRequest()
+        request.topic = subscription.topic
+        operation = self.get_client(subscription.channel).new_subscribe_to_topic(active_handler)
+        subscription.active_handler = active_handler
+        subscription.operation = operation
+        operation.activate(request).result(TIMEOUT)
+
+    def on_disconnect(self, channel, ipc_client, reason) -> None:
+        with self.lock:
+            if self.closed.is_set() or self.clients.get(channel) is not ipc_client:
+                return
+            logging.error('IPC channel {} disconnected: {}'.format(channel, reason))
+            self.clients[channel] = None
+            self.connected_gauge.set(0, channel=channel)
+            for subscription in self.subscriptions:
+                if subscription.channel == channel and subscription not in self.pending_subscriptions:
+                    self.pending_subscriptions.append(subscription)
+        self.restore_requested.set()
+
+    def on_stream_closed(self, subscription, active_handler) -> None:
+        with self.lock:
+            # Streams of earlier attempts may report their closure late, after the topic was subscribed again
+            if self.closed.is_set() or subscription.active_handler is not active_handler:
+                return
+            logging.warning('Subscription stream for topic {} closed, subscribing again...'.format(subscription.topic))
+            subscription.active_handler = None
+            if subscription not in self.pending_subscriptions:
+                self.pending_subscriptions.append(subscription)
+        self.restore_requested.set()
+
+    def restore(self) -> None:
+        """
+        Reconnect the disconnected channels, then subscribe again to the topics whose streams were closed.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        with self.lock:
+            channels = [channel for channel, ipc_client in self.clients.items() if ipc_client is None]
+        for channel in channels:
+            self.connect(channel)
+            self.reconnects.inc(channel=channel)
+
+        while True:
+            with self.lock:
+                if not self.pending_subscriptions:
+                    return
+                subscription = self.pending_subscriptions[0]
+            self.activate(subscription)
+            with self.lock:
+                self.pending_subscriptions.remove(subscription)
+            self.resubscribes.inc(topic=subscription.topic)
+            logging.info('Subscribed again to topic: {}'.format(subscription.topic))
+
+    def run_restore(self) -> None:
+        while not self.closed.is_set():
+            self.restore_requested.wait()
+            self.restore_requested.clear()
+            backoff = self.initial_backoff
+            while not self.closed.is_set():
+                try:
+                    self.restore()
+                    break
+                except Exception:
+                    self.reconnect_failures.inc()
+                    logging.error('Failed to restore IPC connections, retrying in {} seconds'.format(backoff),
+                                  exc_info=True)
+                    self.closed.wait(backoff)
+                    backoff = min(backoff * self.backoff_factor, self.max_backoff)
+
+    def start(self) -> None:
+        with self.lock:
+            if self.restore_thread is None:
+                self.restore_thread = threading.Thread(target=self.run_restore, name='IPCConnectionRestore',
+                                                       daemon=True)
+                self.restore_thread.start()
+
+    def close(self) -> None:
+        """
+        Stop restoring connections and close all channels.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        self.closed.set()
+        self.restore_requested.set()
+        if self.restore_thread is not None:
+            self.restore_thread.join()
+        with self.lock:
+            for channel, ipc_client in self.clients.items():
+                if ipc_client is not None:
+                    ipc_client.close()
+                self.connected_gauge.set(0, channel=channel)
+            self.clients.clear()
+
+
+# The connections shared by all modules of the component process
+IPC_CONNECTIONS = IPCConnectionManager()
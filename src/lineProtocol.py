@@ -0,0 +1,210 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Conversion of points to the InfluxDB line protocol.
+
+See https://docs.influxdata.com/influxdb/v2/reference/syntax/line-protocol/
+"""
+
+import time
+
+PRECISIONS = ['ns', 'us', 'ms', 's']
+DEFAULT_PRECISION = 'ns'
+NANOSECONDS_PER_UNIT = {'ns': 1, 'us': 10 ** 3, 'ms': 10 ** 6, 's': 10 ** 9}
+
+
+def time_ns() -> int:
+    # time.time_ns is not available before Python 3.7
+    return int(time.time() * NANOSECONDS_PER_UNIT['s'])
+
+
+def escape_measurement(name) -> str:
+    return str(name).replace('\\', '\\\\').replace(',', '\\,').replace(' ', '\\ ')
+
+
+def escape_key(key) -> str:
+    # Tag keys, tag values and field keys also need their equals signs escaped
+    return escape_measurement(key).replace('=', '\\=')
+
+
+def format_field_value(value) -> str:
+    """
+    Format a field value with its line protocol type.
+
+    Parameters
+    ----------
+        value(bool|int|float|str): The field value
+
+    Returns
+    -------
+        formatted_value(str): The field value as a line protocol float, integer, boolean or string
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return '{}i'.format(value)
+    if isinstance(value, float):
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError('Field values must be finite, got {}'.format(value))
+        return repr(value)
+    if isinstance(value, str):
+        return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+    raise ValueError('Unsupported field value type {}'.format(type(value).__name__))
+
+
+def point_to_line(point, default_time=None) -> str:
+    """
+    Convert a JSON point to a line of line protocol.
+
+    Parameters
+    ----------
+        point(dict): The point, with a "measurement", optional "tags", at least one of "fields" and an optional
+        integer "time" in the precision of the write
+        default_time(int): The time to give the point if it has none, or None to leave it without one
+
+    Returns
+    -------
+        line(str): The point in line protocol
+    """
+    measurement = point.get('measurement')
+    if not measurement or not isinstance(measurement, str):
+        raise ValueError('Point has no measurement')
+    fields = point.get('fields')
+    if not fields or not isinstance(fields, dict):
+        raise ValueError('Point {} has no fields'.format(measurement))
+
+    key = escape_measurement(measurement)
+    tags = point.get('tags') or {}
+    # Tags sorted by key are the fastest for InfluxDB to index
+    for tag_key in sorted(tags):
+        if tags[tag_key] is None or tags[tag_key] == '':
+            continue
+        key += ',{}={}'.format(escape_key(tag_key), escape_key(tags[tag_key]))
+    line = '{} {}'.format(key, ','.join(
+        '{}={}'.format(escape_key(field_key), format_field_value(value)) for field_key, value in fields.items()))
+
+    timestamp = point.get('time')
+    if timestamp is None:
+        timestamp = default_time
+    if timestamp is not None:
+        if isinstance(timestamp, bool) or not isinstance(timestamp, int):
+            raise ValueError('Point {} has a non-integer time'.format(measurement))
+        line += ' {}'.format(timestamp)
+    return line
+
+
+def split_lines(text, default_time=None) -> list:
+    """
+    Split a line protocol payload into its lines, skipping blank lines and comments.
+
+    Every line is parsed, so that an invalid line is rejected with its payload instead of failing the batch it would
+    be written in.
+
+    Parameters
+    ----------
+        text(str): The line protocol payload
+        default_time(int): The time to add to lines without one, or None to leave them without one
+
+    Returns
+    -------
+        lines(list): The lines of the payload
+    """
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if parse_line(line)[2] is None and default_time is not None:
+            line += ' {}'.format(default_time)
+        lines.append(line)
+    return lines
+
+
+def split_unescaped(text, separator) -> list:
+    """
+    Split text on a separator that is neither escaped with a backslash nor inside a double-quoted string.
+
+    Parameters
+    ----------
+        text(str): The text to split
+        separator(str): The single character separator
+
+    Returns
+    -------
+        parts(list): The parts of the text, with their escapes kept
+    """
+    parts = []
+    start = 0
+    quoted = False
+    escaped = False
+    for i, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == separator and not quoted:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def parse_field_value(value):
+    """
+    Parse a line protocol field value.
+
+    Parameters
+    ----------
+        value(str): The field value as written in line protocol
+
+    Returns
+    -------
+        parsed_value(bool|int|float|str): The field value
+    """
+    if value.startswith('"'):
+        if len(value) < 2 or not value.endswith('"'):
+            raise ValueError('Unterminated string field value {}'.format(value[:100]))
+        return value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    if value in ('t', 'T', 'true', 'True', 'TRUE'):
+        return True
+    if value in ('f', 'F', 'false', 'False', 'FALSE'):
+        return False
+    if value.endswith('i') or value.endswith('u'):
+        return int(value[:-1])
+    parsed_value = float(value)
+    if parsed_value != parsed_value or parsed_value in (float('inf'), float('-inf')):
+        raise ValueError('Field values must be finite, got {}'.format(value))
+    return parsed_value
+
+
+def parse_line(line) -> tuple:
+    """
+    Parse a line of line protocol.
+
+    Parameters
+    ----------
+        line(str): The line of line protocol
+
+    Returns
+    -------
+        point(tuple): The series key (the measurement and tags as written), the fields as a dict, and the
+        timestamp as an int, or None if the line has none
+    """
+    parts = [part for part in split_unescaped(line.strip(), ' ') if part]
+    if len(parts) not in (2, 3):
+        raise ValueError('Line has no field set: {}'.format(line[:100]))
+    fields = {}
+    for field in split_unescaped(parts[1], ','):
+        key, separator, value = field.partition('=')
+        while key.endswith('\\') and separator:
+            # The equals sign was escaped, so it is part of the key
+            next_key, separator, value = value.partition('=')
+            key += '=' + next_key
+        if not key or not separator or not value:
+            raise ValueError('Invalid field {} in line: {}'.format(field[:100], line[:100]))
+        fields[key] = parse_field_value(value)
+    timestamp = int(parts[2]) if len(parts) == 3 else None
+    return parts[0], fields, timestamp
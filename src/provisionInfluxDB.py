@@ -0,0 +1,501 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import concurrent.futures
+import json
+import logging
+import re
+import time
+from argparse import Namespace
+from contextlib import contextmanager
+
+from configParsing import parse_bool
+from influxDBClient import InfluxDBClient, get_client_host
+from retrieveInfluxDBSecrets import SECRET_PROVIDER
+from startupTrace import STARTUP_TRACE
+
+logging.basicConfig(level=logging.INFO)
+TIMEOUT = 10
+MIN_PASSWORD_LENGTH = 16
+PASSWORD_SPECIAL_CHARACTERS = '#$@%+*&!^'
+# Descriptions of the scoped tokens vended by the token publisher, keyed by access
+TOKEN_DESCRIPTIONS = {
+    'readonly': 'greengrass_read',
+    'readwrite': 'greengrass_readwrite'
+}
+TOKEN_ACTIONS = {
+    'readonly': ['read'],
+    'readwrite': ['read', 'write']
+}
+# Tokens for additional buckets are described as "greengrass_read:ORG/BUCKET", while the tokens for the main bucket
+# keep their plain descriptions so that existing clients and setups continue to work
+BUCKET_SEPARATOR = ':'
+ORG_SEPARATOR = '/'
+MAX_PROVISIONING_WORKERS = 8
+# Downsampled buckets are given as BUCKET:WINDOW:FUNCTION[:RETENTION]
+DOWNSAMPLE_SEPARATOR = ':'
+DOWNSAMPLE_FUNCTIONS = ['mean', 'median', 'min', 'max', 'sum', 'count', 'first', 'last']
+DOWNSAMPLE_TASK_PREFIX = 'greengrass_downsample_'
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60}
+# InfluxDB rejects retention periods shorter than an hour
+MIN_RETENTION_SECONDS = 60 * 60
+
+
+def parse_arguments() -> Namespace:
+    """
+    Parse arguments.
+
+    Parameters
+    ----------
+        None
+
+    Returns
+    -------
+        args(Namespace): Parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--influxdb_org", type=str, required=True)
+    parser.add_argument("--influxdb_bucket", type=str, required=True)
+    parser.add_argument("--influxdb_port", type=str, required=True)
+    parser.add_argument("--influxdb_interface", type=str, required=True)
+    parser.add_argument("--server_protocol", type=str, required=True)
+    parser.add_argument("--skip_tls_verify", type=str, required=True)
+    parser.add_argument("--tls_server_name", type=str, default="")
+    parser.add_argument("--secret_arn", type=str, required=True)
+    parser.add_argument("--influxdb_additional_buckets", type=str, default="")
+    parser.add_argument("--influxdb_bucket_retention", type=str, default="0")
+    parser.add_argument("--influxdb_downsampled_buckets", type=str, default="")
+    return parser.parse_args()
+
+
+class PhaseTimer:
+    """
+    Record how long each provisioning phase takes.
+    """
+
+    def __init__(self, trace=None):
+        self.timings = {}
+        self.trace = trace
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        trace_start = time.time()
+        status = 'error'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            elapsed = time.monotonic() - start
+            self.timings[name] = round(self.timings.get(name, 0) + elapsed, 3)
+            logging.info('Provisioning phase {} took {:.3f}s'.format(name, elapsed))
+            if self.trace is not None:
+                self.trace.record(name, trace_start, trace_start + elapsed, status)
+
+
+def validate_password(password) -> bool:
+    """
+    Check that the InfluxDB password is strong enough.
+
+    Parameters
+    ----------
+        password(str): The InfluxDB password
+
+    Returns
+    -------
+        valid(bool): True if the password is at least 16 characters long and contains uppercase and lowercase
+        letters, numbers and special characters
+    """
+    return (len(password) >= MIN_PASSWORD_LENGTH
+            and re.search('[A-Z]', password) is not None
+            and re.search('[a-z]', password) is not None
+            and re.search('[0-9]', password) is not None
+            and any(c in PASSWORD_SPECIAL_CHARACTERS for c in password))
+
+
+def parse_bucket_list(bucket_list, default_org) -> list:
+    """
+    Parse a comma separated list of buckets, each given as BUCKET or ORG/BUCKET.
+
+    Parameters
+    ----------
+        bucket_list(str): The list of buckets
+        default_org(str): The org of the buckets given without one
+
+    Returns
+    -------
+        buckets(list): The (org, bucket) pairs, without duplicates
+    """
+    buckets = []
+    for entry in bucket_list.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        org, _, bucket = entry.rpartition(ORG_SEPARATOR)
+        if not bucket:
+            raise ValueError('Invalid bucket {} in the bucket list'.format(entry))
+        if (org or default_org, bucket) not in buckets:
+            buckets.append((org or default_org, bucket))
+    return buckets
+
+
+def parse_duration(duration) -> int:
+    """
+    Parse a duration such as 30d, 12h or 15m.
+
+    Parameters
+    ----------
+        duration(str): The duration, as a whole number of seconds (s), minutes (m), hours (h), days (d) or weeks (w)
+
+    Returns
+    -------
+        seconds(int): The duration in seconds, or 0 for an empty duration or 0
+    """
+    duration = duration.strip()
+    if duration in ('', '0'):
+        return 0
+    match = re.fullmatch('([0-9]+)([smhdw])', duration)
+    if match is None:
+        raise ValueError('Invalid duration {}, expected for example 30d, 12h or 15m'.format(duration))
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def parse_retention(retention) -> int:
+    retention_seconds = parse_duration(retention)
+    if 0 < retention_seconds < MIN_RETENTION_SECONDS:
+        raise ValueError('Retention period {} must be at least 1h, or 0 to keep data forever'.format(retention))
+    return retention_seconds
+
+
+def parse_downsampled_buckets(downsampled_bucket_list) -> list:
+    """
+    Parse a comma separated list of downsampled buckets, each given as BUCKET:WINDOW:FUNCTION[:RETENTION].
+
+    Parameters
+    ----------
+        downsampled_bucket_list(str): The list of downsampled buckets, e.g. "telemetry-1h:1h:mean:365d"
+
+    Returns
+    -------
+        downsampled_buckets(list): A dict for each bucket with its bucket, window, function and retention_seconds
+    """
+    downsampled_buckets = []
+    for entry in downsampled_bucket_list.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = [part.strip() for part in entry.split(DOWNSAMPLE_SEPARATOR)]
+        if len(parts) not in (3, 4) or not parts[0]:
+            raise ValueError('Invalid downsampled bucket {}, expected BUCKET:WINDOW:FUNCTION[:RETENTION]'.format(entry))
+        if parse_duration(parts[1]) == 0:
+            raise ValueError('Invalid window {} of downsampled bucket {}'.format(parts[1], parts[0]))
+        if parts[2] not in DOWNSAMPLE_FUNCTIONS:
+            raise ValueError('Unknown function {} of downsampled bucket {}, expected one of {}'.format(
+                parts[2], parts[0], DOWNSAMPLE_FUNCTIONS))
+        if any(downsampled['bucket'] == parts[0] for downsampled in downsampled_buckets):
+            raise ValueError('Downsampled bucket {} is listed more than once'.format(parts[0]))
+        downsampled_buckets.append({
+            'bucket': parts[0],
+            'window': parts[1],
+            'function': parts[2],
+            'retention_seconds': parse_retention(parts[3]) if len(parts) == 4 else 0
+        })
+    return downsampled_buckets
+
+
+def get_downsample_task_name(bucket) -> str:
+    return '{}{}'.format(DOWNSAMPLE_TASK_PREFIX, bucket)
+
+
+def get_downsample_flux(org, source_bucket, downsampled) -> str:
+    """
+    Get the Flux script of the task that populates a downsampled bucket.
+
+    Parameters
+    ----------
+        org(str): The org of both buckets
+        source_bucket(str): The bucket to downsample
+        downsampled(dict): The downsampled bucket, as returned by parse_downsampled_buckets
+
+    Returns
+    -------
+        flux(str): The Flux script, which runs once per window and aggregates the window that has just ended
+    """
+    # JSON strings are also valid Flux string literals
+    return '\n'.join([
+        'option task = {{name: {}, every: {}}}'.format(
+            json.dumps(get_downsample_task_name(downsampled['bucket'])), downsampled['window']),
+        '',
+        'from(bucket: {})'.format(json.dumps(source_bucket)),
+        '    |> range(start: -task.every)',
+        '    |> aggregateWindow(every: {}, fn: {}, createEmpty: false)'.format(
+            downsampled['window'], downsampled['function']),
+        '    |> to(bucket: {}, org: {})'.format(json.dumps(downsampled['bucket']), json.dumps(org)),
+        ''
+    ])
+
+
+def get_token_description(access, org, bucket) -> str:
+    return '{}{}{}{}{}'.format(TOKEN_DESCRIPTIONS[access], BUCKET_SEPARATOR, org, ORG_SEPARATOR, bucket)
+
+
+def create_token(influxdb_client, org_id, bucket_id, access, description=None) -> dict:
+    """
+    Create a token scoped to a single bucket.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client authorized to create tokens
+        org_id(str): The ID of the org of the bucket
+        bucket_id(str): The ID of the bucket
+        access(str): readonly or readwrite
+        description(str): The token description; defaults to the description of the main bucket's token
+
+    Returns
+    -------
+        authorization(dict): The created authorization
+    """
+    description = description or TOKEN_DESCRIPTIONS[access]
+    permissions = [
+        {'action': action, 'resource': {'type': 'buckets', 'id': bucket_id, 'orgID': org_id}}
+        for action in TOKEN_ACTIONS[access]
+    ]
+    authorization = influxdb_client.create_authorization(org_id, description, permissions)
+    logging.info('Successfully created InfluxDB token {}'.format(description))
+    return authorization
+
+
+def get_or_create_org(influxdb_client, name) -> dict:
+    orgs = influxdb_client.get_orgs(name)
+    if orgs:
+        return orgs[0]
+    logging.info('Creating InfluxDB org {}'.format(name))
+    return influxdb_client.create_org(name)
+
+
+def get_retention_seconds(bucket) -> int:
+    return sum(rule.get('everySeconds', 0) for rule in bucket.get('retentionRules', []) if rule.get('type') == 'expire')
+
+
+def get_or_create_bucket(influxdb_client, org, name, retention_seconds=None) -> dict:
+    """
+    Get a bucket, creating it if it does not exist yet.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client authorized to create buckets
+        org(dict): The org of the bucket
+        name(str): The bucket name
+        retention_seconds(int): The retention period of the bucket in seconds, 0 to keep data forever, or None to
+        leave the retention period of an existing bucket unchanged
+
+    Returns
+    -------
+        bucket(dict): The bucket
+    """
+    buckets = influxdb_client.get_buckets(name, org['name'])
+    if not buckets:
+        logging.info('Creating InfluxDB bucket {}/{}'.format(org['name'], name))
+        return influxdb_client.create_bucket(org['id'], name, retention_seconds or 0)
+    bucket = buckets[0]
+    if retention_seconds is not None and get_retention_seconds(bucket) != retention_seconds:
+        logging.info('Changing the retention period of InfluxDB bucket {}/{} to {}s'.format(
+            org['name'], name, retention_seconds))
+        bucket = influxdb_client.update_bucket_retention(bucket['id'], retention_seconds)
+    return bucket
+
+
+def create_or_update_task(influxdb_client, org_id, name, flux, description) -> None:
+    tasks = influxdb_client.get_tasks(name, org_id)
+    if not tasks:
+        logging.info('Creating InfluxDB task {}'.format(name))
+        influxdb_client.create_task(org_id, flux, description)
+    elif tasks[0]['flux'] != flux:
+        logging.info('Updating InfluxDB task {}'.format(name))
+        influxdb_client.update_task(tasks[0]['id'], flux)
+
+
+def provision_additional_buckets(influxdb_client, buckets, timer, retentions=None) -> list:
+    """
+    Create the additional buckets and their scoped read and read/write tokens, skipping those that already exist.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client authorized to create orgs, buckets and tokens
+        buckets(list): The (org, bucket) pairs to provision
+        timer(PhaseTimer): Records the time taken by each phase
+        retentions(dict): The retention periods in seconds keyed by (org, bucket); the retention periods of other
+        existing buckets are left unchanged
+
+    Returns
+    -------
+        buckets(list): The provisioned buckets
+    """
+    retentions = retentions or {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_PROVISIONING_WORKERS) as executor:
+        with timer.phase('create_buckets'):
+            # Orgs are created first, since several buckets may share a new org
+            org_names = sorted({org for org, _ in buckets})
+            orgs = dict(zip(org_names, executor.map(lambda name: get_or_create_org(influxdb_client, name), org_names)))
+            created_buckets = list(executor.map(
+                lambda entry: get_or_create_bucket(influxdb_client, orgs[entry[0]], entry[1], retentions.get(entry)),
+                buckets))
+
+        with timer.phase('create_tokens'):
+            existing_descriptions = {authorization['description']
+                                     for authorization in influxdb_client.get_authorizations()}
+            futures = [
+                executor.submit(create_token, influxdb_client, bucket['orgID'], bucket['id'], access,
+                                get_token_description(access, org, name))
+                for (org, name), bucket in zip(buckets, created_buckets)
+                for access in TOKEN_DESCRIPTIONS
+                if get_token_description(access, org, name) not in existing_descriptions
+            ]
+            for future in futures:
+                future.result()
+    return created_buckets
+
+
+def provision_downsampling(influxdb_client, org, source_bucket, downsampled_buckets, timer) -> None:
+    """
+    Create or update the tasks that populate the downsampled buckets from the main bucket.
+
+    Parameters
+    ----------
+        influxdb_client(InfluxDBClient): InfluxDB API client authorized to create tasks
+        org(dict): The org of the main bucket and the downsampled buckets
+        source_bucket(str): The main bucket
+        downsampled_buckets(list): The downsampled buckets, as returned by parse_downsampled_buckets
+        timer(PhaseTimer): Records the time taken by each phase
+
+    Returns
+    -------
+        None
+    """
+    with timer.phase('create_tasks'):
+        for downsampled in downsampled_buckets:
+            create_or_update_task(
+                influxdb_client,
+                org['id'],
+                get_downsample_task_name(downsampled['bucket']),
+                get_downsample_flux(org['name'], source_bucket, downsampled),
+                'Downsamples {} into {}'.format(source_bucket, downsampled['bucket'])
+            )
+
+
+def provision_buckets(args, influxdb_client, timer, org, retention_seconds, additional_buckets,
+                      downsampled_buckets) -> None:
+    """
+    Provision the additional and downsampled buckets with their tokens, and the downsampling tasks.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        influxdb_client(InfluxDBClient): Signed in InfluxDB API client
+        timer(PhaseTimer): Records the time taken by each phase
+        org(dict): The org of the main bucket
+        retention_seconds(int): The retention period of the main bucket in seconds, or None to leave it unchanged
+        additional_buckets(list): The (org, bucket) pairs of the additional buckets
+        downsampled_buckets(list): The downsampled buckets, as returned by parse_downsampled_buckets
+
+    Returns
+    -------
+        None
+    """
+    if retention_seconds is not None:
+        with timer.phase('update_retention'):
+            get_or_create_bucket(influxdb_client, org, args.influxdb_bucket, retention_seconds)
+    retentions = {(args.influxdb_org, downsampled['bucket']): downsampled['retention_seconds']
+                  for downsampled in downsampled_buckets}
+    buckets = additional_buckets + [entry for entry in retentions if entry not in additional_buckets]
+    if buckets:
+        provision_additional_buckets(influxdb_client, buckets, timer, retentions)
+    if downsampled_buckets:
+        provision_downsampling(influxdb_client, org, args.influxdb_bucket, downsampled_buckets, timer)
+
+
+def provision_influxdb(args, influxdb_client, timer) -> bool:
+    """
+    Set up InfluxDB and create the tokens to vend, unless InfluxDB has already been set up.
+
+    Parameters
+    ----------
+        args(Namespace): Parsed arguments
+        influxdb_client(InfluxDBClient): InfluxDB API client
+        timer(PhaseTimer): Records the time taken by each phase
+
+    Returns
+    -------
+        provisioned(bool): True if InfluxDB was set up, False if the existing setup was reused
+    """
+    additional_buckets = parse_bucket_list(args.influxdb_additional_buckets, args.influxdb_org)
+    additional_buckets = [entry for entry in additional_buckets if entry != (args.influxdb_org, args.influxdb_bucket)]
+    retention_seconds = parse_retention(args.influxdb_bucket_retention)
+    downsampled_buckets = parse_downsampled_buckets(args.influxdb_downsampled_buckets)
+    if any(downsampled['bucket'] == args.influxdb_bucket for downsampled in downsampled_buckets):
+        raise ValueError('The bucket {} cannot be downsampled into itself'.format(args.influxdb_bucket))
+
+    logging.info('Checking if InfluxDB has already been set up...')
+    with timer.phase('check_setup'):
+        setup_allowed = influxdb_client.is_setup_allowed()
+    if not setup_allowed:
+        logging.info('Reusing existing InfluxDB setup...')
+        # Buckets and retention periods may have changed in the configuration since the initial setup, including a
+        # retention period set back to 0 to keep the data forever, so they are reconciled on every start
+        with timer.phase('retrieve_secret'):
+            username, password = SECRET_PROVIDER.get_credentials(args.secret_arn)
+        influxdb_client.signin(username, password)
+        org = get_or_create_org(influxdb_client, args.influxdb_org)
+        provision_buckets(args, influxdb_client, timer, org, retention_seconds, additional_buckets,
+                          downsampled_buckets)
+        return False
+
+    logging.info('Setting up InfluxDB with provided credentials...')
+    with timer.phase('retrieve_secret'):
+        username, password = SECRET_PROVIDER.get_credentials(args.secret_arn)
+
+    logging.info('Validating password...')
+    if not validate_password(password):
+        logging.error('Password must contain at least {} characters, uppercase and lowercase letters, numbers, '
+                      'and special characters.'.format(MIN_PASSWORD_LENGTH))
+        exit(1)
+
+    with timer.phase('setup'):
+        setup = influxdb_client.setup(username, password, args.influxdb_org, args.influxdb_bucket, retention_seconds)
+    org_id = setup['org']['id']
+    bucket_id = setup['bucket']['id']
+    logging.info('Retrieved bucket ID: {}'.format(bucket_id))
+
+    # The admin token returned by the setup is allowed to create the scoped tokens
+    influxdb_client.token = setup['auth']['token']
+    with timer.phase('create_tokens'):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(TOKEN_DESCRIPTIONS)) as executor:
+            futures = [executor.submit(create_token, influxdb_client, org_id, bucket_id, access)
+                       for access in TOKEN_DESCRIPTIONS]
+            for future in futures:
+                future.result()
+    provision_buckets(args, influxdb_client, timer, setup['org'], None, additional_buckets, downsampled_buckets)
+    return True
+
+
+if __name__ == "__main__":
+    try:
+        STARTUP_TRACE.record_process_start()
+        args = parse_arguments()
+        timer = PhaseTimer(STARTUP_TRACE)
+        influxdb_client = InfluxDBClient(
+            get_client_host(args.influxdb_interface),
+            args.influxdb_port,
+            server_protocol=args.server_protocol,
+            skip_tls_verify=parse_bool(args.skip_tls_verify),
+            server_hostname=args.tls_server_name,
+            timeout=TIMEOUT
+        )
+        with timer.phase('total'):
+            provision_influxdb(args, influxdb_client, timer)
+        influxdb_client.close()
+        logging.info('Provisioning phase timings: {}'.format(json.dumps(timer.timings)))
+    except Exception:
+        logging.error('Failed to provision InfluxDB.', exc_info=True)
+        exit(1)
@@ -0,0 +1,139 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import queue
+import threading
+
+from influxDBMetrics import REGISTRY
+
+# What to do with a new request when the publish queue is full
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_REJECT = 'reject'
+OVERFLOW_POLICIES = [OVERFLOW_DROP_OLDEST, OVERFLOW_REJECT]
+
+
+class PublishPipeline:
+    """
+    A bounded queue drained by a pool of worker threads, so that slow publishes do not block the IPC callback thread.
+    """
+
+    def __init__(self, publish_fn, max_queue_size, workers, overflow_policy=OVERFLOW_DROP_OLDEST, metrics_registry=REGISTRY):
+        if max_queue_size < 1:
+            raise ValueError('Publish queue size must be at least 1, got {}'.format(max_queue_size))
+        if workers < 1:
+            raise ValueError('Publish worker count must be at least 1, got {}'.format(workers))
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown publish overflow policy {}, expected one of {}'.format(
+                overflow_policy, OVERFLOW_POLICIES))
+
+        self.publish_fn = publish_fn
+        self.overflow_policy = overflow_policy
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.submit_lock = threading.Lock()
+        self.dropped_count = 0
+        self.rejected_count = 0
+        self.overflow_counter = metrics_registry.counter(
+            'influxdb_publish_queue_overflow_total', 'Responses dropped because the publish queue was full.', ['policy'])
+        metrics_registry.callback_gauge(
+            'influxdb_publish_queue_depth', 'Responses waiting in the publish queue.', self.queue.qsize)
+        self.workers = [
+            threading.Thread(target=self.run_worker, name='InfluxDBPublishWorker-{}'.format(i), daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+        logging.info('Started publish pipeline with {} workers, queue size {} and overflow policy {}'.format(
+            workers, max_queue_size, overflow_policy))
+
+    def submit(self, *publish_args) -> bool:
+        """
+        Queue a publish without blocking, applying the overflow policy if the queue is full.
+
+        Parameters
+        ----------
+            publish_args: Arguments to pass to the publish function
+
+        Returns
+        -------
+            queued(bool): False if the request was rejected because the queue was full
+        """
+        with self.submit_lock:
+            try:
+                self.queue.put_nowait(publish_args)
+                return True
+            except queue.Full:
+                pass
+
+            if self.overflow_policy == OVERFLOW_REJECT:
+                self.rejected_count += 1
+                self.overflow_counter.inc(policy=OVERFLOW_REJECT)
+                logging.warning('Publish queue is full, rejecting request ({} rejected so far)'.format(self.rejected_count))
+                return False
+
+            # Workers may have drained the queue in the meantime, so the oldest request might already be gone
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped_count += 1
+                self.overflow_counter.inc(policy=OVERFLOW_DROP_OLDEST)
+                logging.warning('Publish queue is full, dropped the oldest request ({} dropped so far)'.format(
+                    self.dropped_count))
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(publish_args)
+            return True
+
+    def run_worker(self) -> None:
+        """
+        Publish queued requests until a stop sentinel is received.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        while True:
+            publish_args = self.queue.get()
+            try:
+                if publish_args is None:
+                    return
+                self.publish_fn(*publish_args)
+            except Exception:
+                logging.error('Publish worker failed to publish a response', exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def join(self) -> None:
+        """
+        Block until every queued request has been processed.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        self.queue.join()
+
+    def stop(self) -> None:
+        """
+        Let the workers finish the queued requests, then stop them.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
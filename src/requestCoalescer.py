@@ -0,0 +1,89 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+
+
+class RequestCoalescer:
+    """
+    Collapse duplicate requests that arrive within a short window into a single response.
+
+    The first request for a key opens a window; requests for the same key arriving before the window closes are
+    merged into it. When the window closes, the flush function is called once with the response and the number of
+    requests it serves. Responses are only sent after the window closes so that every merged requester asked before
+    the response was published.
+    """
+
+    def __init__(self, window_seconds, flush_fn):
+        if window_seconds <= 0:
+            raise ValueError('Coalescing window must be positive, got {}'.format(window_seconds))
+        self.window_seconds = window_seconds
+        self.flush_fn = flush_fn
+        self.lock = threading.Lock()
+        # key -> [response, number of requests served, timer]
+        self.pending = {}
+
+    def submit(self, key, response) -> bool:
+        """
+        Add a request to the open window for its key, or open a new window.
+
+        Parameters
+        ----------
+            key: The key identifying duplicate requests
+            response: The response to send when the window closes
+
+        Returns
+        -------
+            opened(bool): True if this request opened a new window, False if it was merged into an open one
+        """
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry[1] += 1
+                return False
+            timer = threading.Timer(self.window_seconds, self.flush, args=(key,))
+            timer.daemon = True
+            self.pending[key] = [response, 1, timer]
+            timer.start()
+            return True
+
+    def flush(self, key) -> None:
+        """
+        Close the window for a key and send its response.
+
+        Parameters
+        ----------
+            key: The key of the window to close
+
+        Returns
+        -------
+            None
+        """
+        with self.lock:
+            entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        response, served, timer = entry
+        timer.cancel()
+        try:
+            self.flush_fn(response, served)
+        except Exception:
+            logging.error('Failed to flush coalesced response for {}'.format(key), exc_info=True)
+
+    def flush_all(self) -> None:
+        """
+        Close every open window immediately.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        with self.lock:
+            keys = list(self.pending.keys())
+        for key in keys:
+            self.flush(key)
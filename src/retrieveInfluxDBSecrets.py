@@ -5,11 +5,18 @@ import argparse
 import concurrent.futures
 import json
 import logging
+import threading
+import time
 from argparse import Namespace
 import awsiot.greengrasscoreipc
 from awsiot.greengrasscoreipc.model import GetSecretValueRequest, UnauthorizedError
 
+from ipcConnectionManager import IPC_CONNECTIONS
+from startupTrace import STARTUP_TRACE
+
 TIMEOUT = 10
+# How long a retrieved secret is served from memory before it is fetched from Secret Manager again
+DEFAULT_SECRET_TTL = 300
 logging.basicConfig(level=logging.INFO)
 
 
@@ -30,13 +37,14 @@ def parse_arguments() -> Namespace:
     return parser.parse_args()
 
 
-def get_secret_over_ipc(secret_arn) -> str:
+def get_secret_over_ipc(secret_arn, ipc_client=None) -> str:
     """
-    Parse arguments.
+    Retrieve a secret string from Secret Manager over IPC.
 
     Parameters
     ----------
         secret_arn(str): The ARN of the secret to retrieve from Secret Manager.
+        ipc_client(GreengrassCoreIPCClient): The IPC client to use; a new connection is made if not given.
 
     Returns
     -------
@@ -44,7 +52,8 @@ def get_secret_over_ipc(secret_arn) -> str:
     """
 
     try:
-        ipc_client = awsiot.greengrasscoreipc.connect()
+        if ipc_client is None:
+            ipc_client = awsiot.greengrasscoreipc.connect()
         request = GetSecretValueRequest()
         request.secret_id = secret_arn
         operation = ipc_client.new_get_secret_value()
@@ -63,16 +72,135 @@ def get_secret_over_ipc(secret_arn) -> str:
         raise e
 
 
-def retrieve_secret(secret_arn):
+def parse_credentials(secret_string) -> tuple:
+    secret_json = json.loads(secret_string)
+    return secret_json["influxdb_username"], secret_json["influxdb_password"]
+
+
+class SecretProvider:
+    """
+    Retrieves secrets from Secret Manager over a shared IPC connection, and caches them in memory for a TTL.
+
+    Concurrent callers asking for the same secret share a single in-flight retrieval.
+    """
+
+    def __init__(self, ttl=DEFAULT_SECRET_TTL, clock=time.monotonic, connection_manager=IPC_CONNECTIONS):
+        if ttl < 0:
+            raise ValueError('Secret TTL must not be negative, got {}'.format(ttl))
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection_manager = connection_manager
+        # secret_arn -> (secret_string, expiry)
+        self.cache = {}
+        # secret_arn -> Future of the retrieval in progress
+        self.in_flight = {}
+        self.fetch_count = 0
+
+    def get_secret_string(self, secret_arn) -> str:
+        """
+        Get a secret string, from the cache if it has not expired yet.
+
+        Parameters
+        ----------
+            secret_arn(str): The ARN of the secret to retrieve from Secret Manager.
+
+        Returns
+        -------
+            secret_string(str): The secret string.
+        """
+        with self.lock:
+            cached = self.cache.get(secret_arn)
+            if cached is not None and self.clock() < cached[1]:
+                return cached[0]
+            future = self.in_flight.get(secret_arn)
+            leader = future is None
+            if leader:
+                future = self.in_flight[secret_arn] = concurrent.futures.Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            with STARTUP_TRACE.span('get_secret_value'):
+                secret_string = get_secret_over_ipc(secret_arn, self.connection_manager.get_client())
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[secret_arn]
+            future.set_exception(e)
+            raise e
+
+        with self.lock:
+            self.fetch_count += 1
+            self.cache[secret_arn] = (secret_string, self.clock() + self.ttl)
+            del self.in_flight[secret_arn]
+        future.set_result(secret_string)
+        return secret_string
+
+    def get_credentials(self, secret_arn) -> tuple:
+        """
+        Get the InfluxDB username and password from a secret.
+
+        Parameters
+        ----------
+            secret_arn(str): The ARN of the secret to retrieve from Secret Manager.
+
+        Returns
+        -------
+            credentials(tuple): The InfluxDB username and password.
+        """
+        try:
+            return parse_credentials(self.get_secret_string(secret_arn))
+        except Exception as e:
+            logging.error("Exception while retrieving secret: {}".format(secret_arn), exc_info=True)
+            raise e
+
+    def invalidate(self, secret_arn=None) -> None:
+        """
+        Drop a secret from the cache, or all secrets if no ARN is given, so that the next call retrieves it again.
+
+        Parameters
+        ----------
+            secret_arn(str): The ARN of the secret to drop.
+
+        Returns
+        -------
+            None
+        """
+        with self.lock:
+            if secret_arn is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(secret_arn, None)
+
+
+# The provider shared by all modules of the component process
+SECRET_PROVIDER = SecretProvider()
+
+
+def retrieve_credentials(secret_arn) -> tuple:
+    """
+    Retrieve the InfluxDB username and password from Secret Manager.
+
+    Parameters
+    ----------
+        secret_arn(str): The ARN of the secret to retrieve from Secret Manager.
+
+    Returns
+    -------
+        credentials(tuple): The InfluxDB username and password.
+    """
     try:
-        response = get_secret_over_ipc(secret_arn)
-        secret_json = json.loads(response)
-        return "{} {}".format(secret_json["influxdb_username"], secret_json["influxdb_password"])
+        return parse_credentials(get_secret_over_ipc(secret_arn))
     except Exception as e:
         logging.error("Exception while retrieving secret: {}".format(secret_arn), exc_info=True)
         raise e
 
 
+def retrieve_secret(secret_arn):
+    return "{} {}".format(*retrieve_credentials(secret_arn))
+
+
 if __name__ == "__main__":
     args = parse_arguments()
     print(retrieve_secret(args.secret_arn))
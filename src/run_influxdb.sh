@@ -41,13 +41,28 @@ fi
 # Source our utils
 . "$ARTIFACT_PATH/influxdb_utils.sh"
 
+# Trace the startup phases of this run and of the scripts it starts into one file under the mount path
+INFLUXDB_STARTUP_TRACE=""
+if [ "${INFLUXDB_STARTUP_TRACE_ENABLED:-true}" == "true" ]; then
+  INFLUXDB_STARTUP_TRACE="$INFLUXDB_MOUNT_PATH/influxdb2_startup_trace.jsonl"
+  # Keep the trace of the previous runs small
+  if [ -f "$INFLUXDB_STARTUP_TRACE" ] && [ "$(wc -c < "$INFLUXDB_STARTUP_TRACE")" -gt 1048576 ]; then
+    mv -f "$INFLUXDB_STARTUP_TRACE" "$INFLUXDB_STARTUP_TRACE.1" || true
+  fi
+fi
+export INFLUXDB_STARTUP_TRACE
+export INFLUXDB_STARTUP_RUN_ID="$(date -u +%Y-%m-%dT%H:%M:%SZ)-$$"
+
+# Only follow the logs written from now on, since a container reused on a warm restart keeps its earlier logs
+LOGS_SINCE=$(date -u +%Y-%m-%dT%H:%M:%SZ)
+
 # If auto-provisioning, provision the container and begin vending the token
 child_pid=""
 if [ "$AUTO_PROVISION" == "true" ]; then
   echo "Using InfluxDB in auto-provisioning mode..."
   provision_influxdb $CONTAINER_NAME $BUCKET_NAME $ORG_NAME $ARTIFACT_PATH $SECRET_ARN $INFLUXDB_PORT $SERVER_PROTOCOL $BRIDGE_NETWORK_NAME $INFLUXDB_MOUNT_PATH $INFLUXDB_INTERFACE $SKIP_TLS_VERIFY
 
-  python3 -u "$ARTIFACT_PATH/influxDBTokenPublisher.py" \
+  INFLUXDB_STARTUP_LAUNCHED=$(trace_now) python3 -u "$ARTIFACT_PATH/influxDBTokenPublisher.py" \
     --subscribe_topic $TOKEN_REQUEST_TOPIC \
     --publish_topic $TOKEN_RESPONSE_TOPIC \
     --influxdb_container_name $CONTAINER_NAME \
@@ -56,18 +71,59 @@ if [ "$AUTO_PROVISION" == "true" ]; then
     --influxdb_port $INFLUXDB_PORT \
     --influxdb_interface $INFLUXDB_INTERFACE \
     --server_protocol $SERVER_PROTOCOL \
-    --skip_tls_verify $SKIP_TLS_VERIFY &
+    --skip_tls_verify $SKIP_TLS_VERIFY \
+    --tls_server_name "${INFLUXDB_TLS_SERVER_NAME:-$CONTAINER_NAME}" \
+    --secret_arn $SECRET_ARN \
+    --reply_topic_pattern "${INFLUXDB_TOKEN_REPLY_TOPIC_PATTERN:-}" \
+    --publish_workers "${INFLUXDB_PUBLISH_WORKERS:-0}" \
+    --publish_queue_size "${INFLUXDB_PUBLISH_QUEUE_SIZE:-100}" \
+    --publish_overflow_policy "${INFLUXDB_PUBLISH_OVERFLOW_POLICY:-drop_oldest}" \
+    --coalescing_window_ms "${INFLUXDB_COALESCING_WINDOW_MS:-0}" \
+    --request_client_rate "${INFLUXDB_TOKEN_REQUEST_CLIENT_RATE:-0}" \
+    --request_client_burst "${INFLUXDB_TOKEN_REQUEST_CLIENT_BURST:-1}" \
+    --request_global_rate "${INFLUXDB_TOKEN_REQUEST_GLOBAL_RATE:-0}" \
+    --request_global_burst "${INFLUXDB_TOKEN_REQUEST_GLOBAL_BURST:-1}" \
+    --token_refresh_interval "${INFLUXDB_TOKEN_REFRESH_INTERVAL:-0}" \
+    --control_topic "${INFLUXDB_CONTROL_TOPIC:-}" \
+    --ingest_topic "${INFLUXDB_INGEST_TOPIC:-}" \
+    --ingest_batch_size "${INFLUXDB_INGEST_BATCH_SIZE:-5000}" \
+    --ingest_flush_interval_ms "${INFLUXDB_INGEST_FLUSH_INTERVAL_MS:-1000}" \
+    --ingest_precision "${INFLUXDB_INGEST_PRECISION:-ns}" \
+    --aggregation_window "${INFLUXDB_AGGREGATION_WINDOW_SECONDS:-0}" \
+    --aggregation_functions "${INFLUXDB_AGGREGATION_FUNCTIONS:-min,max,mean,count,last}" \
+    --aggregation_raw_bucket "${INFLUXDB_AGGREGATION_RAW_BUCKET:-}" \
+    --aggregation_max_series "${INFLUXDB_AGGREGATION_MAX_SERIES:-10000}" \
+    --write_buffer_path "$INFLUXDB_MOUNT_PATH/influxdb2_buffer" \
+    --write_buffer_max_size_mb "${INFLUXDB_WRITE_BUFFER_MAX_SIZE_MB:-64}" \
+    --write_buffer_replay_rate "${INFLUXDB_WRITE_BUFFER_REPLAY_RATE:-5000}" \
+    --query_topic "${INFLUXDB_QUERY_TOPIC:-}" \
+    --query_reply_topic_pattern "${INFLUXDB_QUERY_REPLY_TOPIC_PATTERN:-}" \
+    --query_cache_size_mb "${INFLUXDB_QUERY_CACHE_SIZE_MB:-16}" \
+    --query_workers "${INFLUXDB_QUERY_WORKERS:-2}" \
+    --metrics_port "${INFLUXDB_METRICS_PORT:-0}" \
+    --metrics_interface "${INFLUXDB_METRICS_INTERFACE:-127.0.0.1}" \
+    --metrics_topic "${INFLUXDB_METRICS_TOPIC:-}" \
+    --metrics_publish_interval "${INFLUXDB_METRICS_PUBLISH_INTERVAL:-60}" \
+    --monitor_interval "${INFLUXDB_MONITOR_INTERVAL:-30}" \
+    --monitor_topic "${INFLUXDB_MONITOR_TOPIC:-}" \
+    --monitor_deltas "${INFLUXDB_MONITOR_DELTAS:-}" \
+    --influxdb_mount_path "$INFLUXDB_MOUNT_PATH" &
 
   child_pid="$!"
 else
   echo "Auto-provisioning is disabled, skippping..."
-  setup_blank_influxdb_with_http $CONTAINER_NAME $INFLUXDB_PORT $BRIDGE_NETWORK_NAME $INFLUXDB_MOUNT_PATH $INFLUXDB_INTERFACE
-  wait_for_influxdb_start $CONTAINER_NAME $INFLUXDB_PORT $SERVER_PROTOCOL $SKIP_TLS_VERIFY
+  trace_phase start_container setup_blank_influxdb_with_http $CONTAINER_NAME $INFLUXDB_PORT $BRIDGE_NETWORK_NAME $INFLUXDB_MOUNT_PATH $INFLUXDB_INTERFACE $ARTIFACT_PATH
+  trace_phase wait_for_ready wait_for_influxdb_start $CONTAINER_NAME $INFLUXDB_PORT $SERVER_PROTOCOL $SKIP_TLS_VERIFY $INFLUXDB_INTERFACE $ARTIFACT_PATH
 fi
 
 echo "InfluxDB is running..."
-# This will keep the component running and retrieving Docker logs
-docker logs --follow $CONTAINER_NAME 2>&1 
+# This will keep the component running and forwarding the Docker logs that pass the log filters
+docker logs --follow --since "$LOGS_SINCE" $CONTAINER_NAME 2>&1 | python3 -u "$ARTIFACT_PATH/influxDBLogForwarder.py" \
+  --min_level "${INFLUXDB_LOG_MIN_LEVEL:-info}" \
+  --exclude_pattern "${INFLUXDB_LOG_EXCLUDE_PATTERN:-}" \
+  --rate_limit "${INFLUXDB_LOG_RATE_LIMIT:-20}" \
+  --rate_interval "${INFLUXDB_LOG_RATE_INTERVAL_SECONDS:-60}" \
+  --sample_every "${INFLUXDB_LOG_SAMPLE_EVERY:-0}"
 
 if [ ! -z "${child_pid}" ]; then
   # If started, wait for the Python background process to exit
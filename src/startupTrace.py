@@ -0,0 +1,244 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from argparse import Namespace
+from contextlib import contextmanager
+
+# Set by run_influxdb.sh for every process it starts, so that all spans of one component start end up in one trace
+TRACE_PATH_VARIABLE = 'INFLUXDB_STARTUP_TRACE'
+RUN_ID_VARIABLE = 'INFLUXDB_STARTUP_RUN_ID'
+# The time at which the shell launched the Python interpreter
+LAUNCHED_VARIABLE = 'INFLUXDB_STARTUP_LAUNCHED'
+# When this module is imported first, this is when the script started running, after the interpreter started
+IMPORTED_AT = time.time()
+
+
+class StartupTrace:
+    """
+    Appends the spans of the startup phases of a process to the trace file shared by the scripts of the component.
+
+    Each span is one JSON line with the run ID, the source process, the phase, its start and end as Unix timestamps,
+    and whether it succeeded. Nothing is recorded if no trace file is configured, or once the process has started.
+    """
+
+    def __init__(self, source, path=None, run_id=None, environ=os.environ, clock=time.time):
+        self.source = source
+        self.path = environ.get(TRACE_PATH_VARIABLE, '') if path is None else path
+        self.run_id = environ.get(RUN_ID_VARIABLE, '') if run_id is None else run_id
+        self.launched = environ.get(LAUNCHED_VARIABLE, '')
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.finished = False
+
+    def record(self, phase, start, end, status='ok') -> None:
+        """
+        Append a span to the trace file.
+
+        Parameters
+        ----------
+            phase(str): The name of the phase
+            start(float): The Unix timestamp at which the phase started
+            end(float): The Unix timestamp at which the phase ended
+            status(str): ok, or error if the phase failed
+
+        Returns
+        -------
+            None
+        """
+        if not self.path or self.finished:
+            return
+        span = {'run': self.run_id, 'source': self.source, 'phase': phase, 'start': round(start, 6),
+                'end': round(end, 6), 'status': status}
+        try:
+            with self.lock, open(self.path, 'a') as trace_file:
+                trace_file.write(json.dumps(span) + '\n')
+        except OSError as e:
+            # Tracing must never stop the component from starting
+            logging.debug('Failed to write to the startup trace {}: {}'.format(self.path, e))
+
+    @contextmanager
+    def span(self, phase):
+        start = self.clock()
+        status = 'error'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            self.record(phase, start, self.clock(), status)
+
+    def record_process_start(self) -> None:
+        """
+        Record how long the interpreter took to start, if the shell recorded when it was launched, and how long the
+        script took to import its modules.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        if self.launched:
+            try:
+                self.record('interpreter', float(self.launched), IMPORTED_AT)
+            except ValueError:
+                logging.debug('Invalid launch time {} in {}'.format(self.launched, LAUNCHED_VARIABLE))
+        self.record('imports', IMPORTED_AT, self.clock())
+
+    def mark(self, phase) -> None:
+        # Record a point in time, such as when the process starts serving requests
+        now = self.clock()
+        self.record(phase, now, now)
+
+    def finish(self, phase='started') -> None:
+        # Mark the end of the startup, and stop recording the phases that run again later, like token refreshes
+        self.mark(phase)
+        self.finished = True
+
+
+# The trace of the running script, like run_influxdb.sh traces its own phases
+STARTUP_TRACE = StartupTrace(os.path.splitext(os.path.basename(sys.argv[0] if sys.argv else ''))[0])
+
+
+def parse_arguments() -> Namespace:
+    """
+    Parse arguments.
+
+    Parameters
+    ----------
+        None
+
+    Returns
+    -------
+        args(Namespace): Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Summarize the startup trace of the component, and compare runs.')
+    parser.add_argument("trace_file", type=str)
+    parser.add_argument("--runs", type=int, default=2)
+    return parser.parse_args()
+
+
+def load_runs(lines) -> dict:
+    """
+    Group the spans of a trace by run.
+
+    Parameters
+    ----------
+        lines(iterable): The lines of the trace file
+
+    Returns
+    -------
+        runs(dict): The spans of each run, sorted by start, with the runs in the order they were first seen
+    """
+    runs = {}
+    for line in lines:
+        try:
+            span = json.loads(line)
+            runs.setdefault(span['run'], []).append(span)
+        except (ValueError, KeyError, TypeError):
+            # A span may have been cut short when the device lost power
+            continue
+    for spans in runs.values():
+        spans.sort(key=lambda span: span['start'])
+    return runs
+
+
+def get_phase_durations(spans) -> dict:
+    durations = {}
+    for span in spans:
+        key = '{}/{}'.format(span['source'], span['phase'])
+        durations[key] = durations.get(key, 0) + span['end'] - span['start']
+    return durations
+
+
+def summarize_run(run_id, spans) -> list:
+    """
+    Describe the spans of a run relative to its start.
+
+    Parameters
+    ----------
+        run_id(str): The run ID
+        spans(list): The spans of the run, sorted by start
+
+    Returns
+    -------
+        lines(list): The report lines
+    """
+    start = spans[0]['start']
+    total = max(span['end'] for span in spans) - start
+    lines = ['Run {}: {:.3f}s'.format(run_id, total),
+             '  {:>9} {:>9}  {:<8} {}'.format('offset', 'duration', 'status', 'phase')]
+    for span in spans:
+        lines.append('  {:>8.3f}s {:>8.3f}s  {:<8} {}/{}'.format(
+            span['start'] - start, span['end'] - span['start'], span['status'], span['source'], span['phase']))
+    return lines
+
+
+def compare_runs(runs) -> list:
+    """
+    Compare the duration of each phase across runs.
+
+    Parameters
+    ----------
+        runs(dict): The spans of each run to compare, oldest first
+
+    Returns
+    -------
+        lines(list): The report lines, with the change from the first to the last run
+    """
+    durations = [get_phase_durations(spans) for spans in runs.values()]
+    phases = []
+    for run_durations in durations:
+        phases.extend(phase for phase in run_durations if phase not in phases)
+    width = max(len(phase) for phase in phases)
+    header = ' '.join('{:>9}'.format('run {}'.format(index + 1)) for index in range(len(durations)))
+    lines = ['  {:<{}} {}  {:>9}'.format('phase', width, header, 'change')]
+    for phase in phases:
+        values = [run_durations.get(phase) for run_durations in durations]
+        change = ''
+        if values[0] is not None and values[-1] is not None:
+            change = '{:>+8.3f}s'.format(values[-1] - values[0])
+        lines.append('  {:<{}} {}  {:>9}'.format(phase, width, ' '.join(
+            '{:>8.3f}s'.format(value) if value is not None else '{:>9}'.format('-') for value in values), change))
+    return lines
+
+
+def report(lines, run_count) -> list:
+    """
+    Summarize the last runs of a trace, and compare them if there is more than one.
+
+    Parameters
+    ----------
+        lines(iterable): The lines of the trace file
+        run_count(int): The number of most recent runs to report
+
+    Returns
+    -------
+        lines(list): The report lines
+    """
+    runs = load_runs(lines)
+    recent = dict(list(runs.items())[-max(run_count, 1):])
+    if not recent:
+        return ['The trace has no spans']
+    report_lines = []
+    for run_id, spans in recent.items():
+        report_lines.extend(summarize_run(run_id, spans))
+        report_lines.append('')
+    if len(recent) > 1:
+        report_lines.append('Comparison of the last {} runs:'.format(len(recent)))
+        report_lines.extend(compare_runs(recent))
+    return report_lines
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    with open(args.trace_file) as trace_file:
+        print('\n'.join(report(trace_file, args.runs)))
@@ -0,0 +1,78 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+
+
+class TokenRefresher:
+    """
+    Periodically re-read the InfluxDB tokens in the background, and update the token stream handler when they change.
+
+    A refresh can also be requested at any time, e.g. from the control topic.
+    """
+
+    def __init__(self, fetch_token_json, token_stream_handler, interval):
+        if interval < 0:
+            raise ValueError('Token refresh interval must not be negative, got {}'.format(interval))
+        self.fetch_token_json = fetch_token_json
+        self.token_stream_handler = token_stream_handler
+        # An interval of 0 only refreshes on request
+        self.interval = interval if interval > 0 else None
+        self.refresh_requested = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='InfluxDBTokenRefresher', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        logging.info('Started InfluxDB token refresher with an interval of {}s'.format(self.interval))
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.refresh_requested.set()
+        self.thread.join()
+
+    def request_refresh(self) -> None:
+        """
+        Refresh the tokens as soon as possible, without waiting for the refresh interval.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            None
+        """
+        logging.info('InfluxDB token refresh requested')
+        self.refresh_requested.set()
+
+    def refresh(self) -> bool:
+        """
+        Re-read the tokens once and update the token stream handler if they changed.
+
+        Parameters
+        ----------
+            None
+
+        Returns
+        -------
+            changed(bool): True if the vended tokens changed
+        """
+        try:
+            changed = self.token_stream_handler.update_tokens(self.fetch_token_json())
+        except Exception:
+            # Keep vending the cached tokens until InfluxDB can be read again
+            logging.error('Failed to refresh the InfluxDB tokens', exc_info=True)
+            return False
+        if not changed:
+            logging.info('InfluxDB tokens are unchanged')
+        return changed
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.refresh_requested.wait(self.interval)
+            if self.stopped.is_set():
+                return
+            self.refresh_requested.clear()
+            self.refresh()
@@ -0,0 +1,101 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Compare the per-request CPU cost of the token lookup before and after the handler pre-indexes its responses.
+
+Run from the repository root:
+    python test/benchmark/bench_token_lookup.py --requests 10000 --extra_tokens 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+
+from influxDBTokenStreamHandler import InfluxDBTokenStreamHandler  # noqa: E402
+
+ACCESS_LEVELS = ["RW", "RO", "Admin"]
+
+
+def build_token_json(extra_tokens) -> str:
+    """
+    Build an `influx auth list --json` style dump with the provisioned tokens and a number of unrelated ones.
+
+    Parameters
+    ----------
+        extra_tokens(int): Number of unrelated tokens to place before the provisioned ones
+
+    Returns
+    -------
+        token_json(str): The token JSON string
+    """
+    tokens = [{"description": "admin's Token", "token": "adminToken", "status": "active"}]
+    for i in range(extra_tokens):
+        tokens.append({"description": "other_token_{}".format(i), "token": "otherToken{}".format(i), "status": "active"})
+    tokens.append({"description": "greengrass_read", "token": "roToken", "status": "active"})
+    tokens.append({"description": "greengrass_readwrite", "token": "rwToken", "status": "active"})
+    return json.dumps(tokens)
+
+
+def legacy_get_publish_json(metadata_json, token_json, message) -> dict:
+    """
+    The lookup as it was implemented before the token index: parse everything and scan on every request.
+    """
+    loaded_token_json = json.loads(token_json)
+    publish_json = json.loads(metadata_json)
+    if message['accessLevel'] == 'RW':
+        token = next(d for d in loaded_token_json if d['description'] == 'greengrass_readwrite')['token']
+    elif message['accessLevel'] == 'RO':
+        token = next(d for d in loaded_token_json if d['description'] == 'greengrass_read')['token']
+    else:
+        token = loaded_token_json[0]['token']
+    publish_json['InfluxDBTokenAccessType'] = message['accessLevel']
+    publish_json['InfluxDBToken'] = token
+    return publish_json
+
+
+def measure(lookup, requests) -> float:
+    """
+    Return the CPU time in microseconds spent per request by the given lookup function.
+    """
+    messages = [{"action": "RetrieveToken", "accessLevel": ACCESS_LEVELS[i % len(ACCESS_LEVELS)]} for i in range(requests)]
+    start = time.process_time()
+    for message in messages:
+        lookup(message)
+    return (time.process_time() - start) * 1e6 / requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--extra_tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    metadata_json = json.dumps({
+        'InfluxDBContainerName': 'greengrass_InfluxDB',
+        'InfluxDBOrg': 'greengrass',
+        'InfluxDBBucket': 'greengrass-telemetry',
+        'InfluxDBPort': '8086',
+        'InfluxDBInterface': '127.0.0.1',
+        'InfluxDBServerProtocol': 'https',
+        'InfluxDBSkipTLSVerify': 'true',
+    })
+    token_json = build_token_json(args.extra_tokens)
+
+    with mock.patch("awsiot.greengrasscoreipc.connect"), mock.patch("logging.info"):
+        handler = InfluxDBTokenStreamHandler(metadata_json, token_json, "benchmark/topic")
+        before = measure(lambda message: legacy_get_publish_json(metadata_json, token_json, message), args.requests)
+        after = measure(handler.get_publish_json, args.requests)
+
+    print(json.dumps({
+        "requests": args.requests,
+        "tokens": args.extra_tokens + 3,
+        "before_cpu_us_per_request": round(before, 3),
+        "after_cpu_us_per_request": round(after, 3),
+        "speedup": round(before / after, 1) if after else None
+    }, indent=2))
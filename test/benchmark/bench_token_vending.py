@@ -0,0 +1,220 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Offline throughput and latency benchmark for the token vending path.
+
+Drives InfluxDBTokenStreamHandler.on_stream_event with synthetic SubscriptionResponseMessage events, publishing
+through a fake IPC client with a configurable publish latency. Every combination of token list size, request
+concurrency and publish mode is measured, and the results are written as JSON so they can be compared between
+releases.
+
+Run from the repository root:
+    python test/benchmark/bench_token_vending.py --requests 2000 --output bench_output.json
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+
+from awsiot.greengrasscoreipc.model import JsonMessage, SubscriptionResponseMessage  # noqa: E402
+from bench_token_lookup import ACCESS_LEVELS, build_token_json  # noqa: E402
+from influxDBTokenStreamHandler import InfluxDBTokenStreamHandler  # noqa: E402
+
+METADATA_JSON = json.dumps({
+    'InfluxDBContainerName': 'greengrass_InfluxDB',
+    'InfluxDBOrg': 'greengrass',
+    'InfluxDBBucket': 'greengrass-telemetry',
+    'InfluxDBPort': '8086',
+    'InfluxDBInterface': '127.0.0.1',
+    'InfluxDBServerProtocol': 'https',
+    'InfluxDBSkipTLSVerify': 'true',
+})
+
+
+class FakePublishResponse:
+    def __init__(self, client):
+        self.client = client
+
+    def result(self, timeout=None):
+        time.sleep(self.client.latency)
+        self.client.record_publish()
+
+
+class FakePublishOperation:
+    def __init__(self, client):
+        self.client = client
+
+    def activate(self, request):
+        pass
+
+    def get_response(self):
+        return FakePublishResponse(self.client)
+
+
+class FakePublishClient:
+    """
+    Stands in for the Greengrass IPC client; every publish takes `latency` seconds to be acknowledged.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.published = 0
+        self.all_published = threading.Event()
+        self.expected = None
+
+    def new_publish_to_topic(self):
+        return FakePublishOperation(self)
+
+    def record_publish(self):
+        with self.lock:
+            self.published += 1
+            if self.expected is not None and self.published >= self.expected:
+                self.all_published.set()
+
+    def expect(self, expected):
+        with self.lock:
+            self.expected = expected
+            if self.published >= expected:
+                self.all_published.set()
+
+
+def percentile(sorted_values, fraction) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(token_count, concurrency, publish_workers, coalescing_window_ms, requests, latency) -> dict:
+    """
+    Send `requests` token requests from `concurrency` threads and measure them.
+
+    Parameters
+    ----------
+        token_count(int): Number of tokens in the token list
+        concurrency(int): Number of threads delivering events at the same time
+        publish_workers(int): Publish workers of the handler; 0 publishes on the calling thread
+        coalescing_window_ms(int): Coalescing window of the handler; 0 disables coalescing
+        requests(int): Total number of requests
+        latency(float): Seconds each publish takes to be acknowledged
+
+    Returns
+    -------
+        result(dict): The scenario and its measurements
+    """
+    publish_client = FakePublishClient(latency)
+    with mock.patch("awsiot.greengrasscoreipc.connect", return_value=publish_client):
+        handler = InfluxDBTokenStreamHandler(
+            METADATA_JSON, build_token_json(max(token_count - 3, 0)), "benchmark/response",
+            publish_workers=publish_workers, publish_queue_size=requests, coalescing_window=coalescing_window_ms / 1000)
+
+    # Every request is published, unless it is coalesced: then every coalescing window is published once
+    windows = []
+    if handler.request_coalescer is not None:
+        submit = handler.request_coalescer.submit
+
+        def count_windows(key, response):
+            opened = submit(key, response)
+            if opened:
+                windows.append(key)
+            return opened
+
+        handler.request_coalescer.submit = count_windows
+
+    events = [
+        SubscriptionResponseMessage(json_message=JsonMessage(
+            message={"action": "RetrieveToken", "accessLevel": ACCESS_LEVELS[i % len(ACCESS_LEVELS)]}))
+        for i in range(requests)
+    ]
+    # How long on_stream_event takes; responses handed to the publish pipeline or coalescer are published later
+    callback_durations = [0.0] * requests
+
+    def deliver(i):
+        start = time.perf_counter()
+        handler.on_stream_event(events[i])
+        callback_durations[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(deliver, range(requests)))
+    callback_duration = time.perf_counter() - start
+
+    # Wait until everything handed off to the pipeline or coalescer has been published. Windows already closed by
+    # their timer are published on the timer thread, so flushing the open windows is not enough to wait for them.
+    if handler.request_coalescer is not None:
+        handler.request_coalescer.flush_all()
+    publish_client.expect(requests if handler.request_coalescer is None else len(windows))
+    if not publish_client.all_published.wait(max(60, 10 * requests * latency)):
+        raise RuntimeError('Timed out waiting for {} publishes, got {}'.format(
+            publish_client.expected, publish_client.published))
+    total_duration = time.perf_counter() - start
+    if handler.publish_pipeline is not None:
+        handler.publish_pipeline.stop()
+    if publish_client.published != publish_client.expected:
+        raise RuntimeError('Expected {} publishes, got {}'.format(publish_client.expected, publish_client.published))
+
+    callback_durations.sort()
+    return {
+        "token_count": token_count,
+        "concurrency": concurrency,
+        "publish_workers": publish_workers,
+        "coalescing_window_ms": coalescing_window_ms,
+        "requests": requests,
+        "publishes": publish_client.published,
+        "publish_latency_ms": latency * 1000,
+        "callback_requests_per_second": round(requests / callback_duration, 1),
+        "end_to_end_requests_per_second": round(requests / total_duration, 1),
+        "callback_duration_ms": {
+            "p50": round(percentile(callback_durations, 0.50) * 1000, 4),
+            "p95": round(percentile(callback_durations, 0.95) * 1000, 4),
+            "p99": round(percentile(callback_durations, 0.99) * 1000, 4),
+            "max": round(callback_durations[-1] * 1000, 4),
+        }
+    }
+
+
+def parse_list(value) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--publish_latency_ms", type=float, default=1.0)
+    parser.add_argument("--token_counts", type=parse_list, default=[3, 100, 1000])
+    parser.add_argument("--concurrency", type=parse_list, default=[1, 8])
+    parser.add_argument("--publish_workers", type=parse_list, default=[0, 4])
+    parser.add_argument("--coalescing_window_ms", type=parse_list, default=[0])
+    parser.add_argument("--output", type=str, default="")
+    args = parser.parse_args()
+
+    results = []
+    with mock.patch("logging.info"):
+        for token_count in args.token_counts:
+            for concurrency in args.concurrency:
+                for publish_workers in args.publish_workers:
+                    for coalescing_window_ms in args.coalescing_window_ms:
+                        results.append(run_scenario(token_count, concurrency, publish_workers, coalescing_window_ms,
+                                                    args.requests, args.publish_latency_ms / 1000))
+
+    report = json.dumps({
+        "benchmark": "token_vending",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(report)
+    print(report)
@@ -0,0 +1,386 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+A local stand-in for the Greengrass nucleus IPC server, covering the local pub/sub and Secret Manager operations used
+by this component.
+
+It speaks the event stream RPC protocol on a Unix domain socket, so the real awsiot.greengrasscoreipc client connects
+to it when AWS_GG_NUCLEUS_DOMAIN_SOCKET_FILEPATH_FOR_COMPONENT and SVCUID point at it.
+"""
+
+import base64
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import zlib
+
+# Event stream RPC message types and flags
+APPLICATION_MESSAGE = 0
+APPLICATION_ERROR = 1
+PING = 2
+PING_RESPONSE = 3
+CONNECT = 4
+CONNECT_ACK = 5
+PROTOCOL_ERROR = 6
+CONNECTION_ACCEPTED = 1
+TERMINATE_STREAM = 2
+
+# Event stream header value types
+HEADER_BOOL_TRUE = 0
+HEADER_BOOL_FALSE = 1
+HEADER_BYTE = 2
+HEADER_INT16 = 3
+HEADER_INT32 = 4
+HEADER_INT64 = 5
+HEADER_BYTE_BUF = 6
+HEADER_STRING = 7
+HEADER_TIMESTAMP = 8
+HEADER_UUID = 9
+FIXED_HEADER_FORMATS = {HEADER_BYTE: '>b', HEADER_INT16: '>h', HEADER_INT32: '>i', HEADER_INT64: '>q',
+                        HEADER_TIMESTAMP: '>q'}
+PRELUDE_LENGTH = 12
+CRC_LENGTH = 4
+
+SERVICE = 'aws.greengrass#'
+CONTENT_TYPE = 'application/json'
+
+
+def encode_headers(headers) -> bytes:
+    """
+    Encode event stream headers, with integers as INT32 and str as STRING values.
+    """
+    encoded = b''
+    for name, value in headers.items():
+        name_bytes = name.encode('utf-8')
+        encoded += struct.pack('>B', len(name_bytes)) + name_bytes
+        if isinstance(value, bool):
+            encoded += struct.pack('>B', HEADER_BOOL_TRUE if value else HEADER_BOOL_FALSE)
+        elif isinstance(value, int):
+            encoded += struct.pack('>Bi', HEADER_INT32, value)
+        else:
+            value_bytes = value.encode('utf-8')
+            encoded += struct.pack('>BH', HEADER_STRING, len(value_bytes)) + value_bytes
+    return encoded
+
+
+def decode_headers(data) -> dict:
+    headers = {}
+    offset = 0
+    while offset < len(data):
+        name_length = data[offset]
+        name = data[offset + 1:offset + 1 + name_length].decode('utf-8')
+        offset += 1 + name_length
+        value_type = data[offset]
+        offset += 1
+        if value_type in (HEADER_BOOL_TRUE, HEADER_BOOL_FALSE):
+            value = value_type == HEADER_BOOL_TRUE
+        elif value_type in FIXED_HEADER_FORMATS:
+            value_format = FIXED_HEADER_FORMATS[value_type]
+            value = struct.unpack_from(value_format, data, offset)[0]
+            offset += struct.calcsize(value_format)
+        elif value_type in (HEADER_BYTE_BUF, HEADER_STRING):
+            value_length = struct.unpack_from('>H', data, offset)[0]
+            value = data[offset + 2:offset + 2 + value_length]
+            value = value.decode('utf-8') if value_type == HEADER_STRING else value
+            offset += 2 + value_length
+        elif value_type == HEADER_UUID:
+            value = data[offset:offset + 16]
+            offset += 16
+        else:
+            raise ValueError('Unknown event stream header type {}'.format(value_type))
+        headers[name] = value
+    return headers
+
+
+def encode_message(headers, payload=b'') -> bytes:
+    """
+    Encode an event stream message.
+
+    Parameters
+    ----------
+        headers(dict): The message headers
+        payload(bytes): The message payload
+
+    Returns
+    -------
+        message(bytes): The prelude, headers and payload, each followed by their CRC32
+    """
+    encoded_headers = encode_headers(headers)
+    total_length = PRELUDE_LENGTH + len(encoded_headers) + len(payload) + CRC_LENGTH
+    prelude = struct.pack('>II', total_length, len(encoded_headers))
+    prelude += struct.pack('>I', zlib.crc32(prelude))
+    message = prelude + encoded_headers + payload
+    return message + struct.pack('>I', zlib.crc32(message))
+
+
+def read_message(stream):
+    """
+    Read an event stream message.
+
+    Parameters
+    ----------
+        stream(file): The binary stream to read from
+
+    Returns
+    -------
+        message(tuple): The (headers, payload) of the message, or None at the end of the stream
+    """
+    prelude = stream.read(PRELUDE_LENGTH)
+    if len(prelude) < PRELUDE_LENGTH:
+        return None
+    total_length, headers_length, prelude_crc = struct.unpack('>III', prelude)
+    if zlib.crc32(prelude[:8]) != prelude_crc:
+        raise ValueError('Event stream prelude CRC mismatch')
+    rest = stream.read(total_length - PRELUDE_LENGTH)
+    if len(rest) < total_length - PRELUDE_LENGTH:
+        return None
+    message_crc = struct.unpack('>I', rest[-CRC_LENGTH:])[0]
+    if zlib.crc32(prelude + rest[:-CRC_LENGTH]) != message_crc:
+        raise ValueError('Event stream message CRC mismatch')
+    headers = decode_headers(rest[:headers_length])
+    return headers, rest[headers_length:-CRC_LENGTH]
+
+
+def topic_matches(topic_filter, topic) -> bool:
+    # Subscriptions may use the MQTT style + and # wildcards, like local pub/sub in the Greengrass nucleus
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels) or (level != '+' and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class FakeIPCHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one IPC connection. Every operation is a stream, opened by a message with an operation header.
+    """
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.connected = False
+        # Stream ID -> topic filter of the subscriptions of this connection
+        self.subscriptions = {}
+        with self.server.lock:
+            self.server.connection_count += 1
+
+    def send(self, message_type, stream_id=0, flags=0, model=None, body=None) -> None:
+        headers = {':message-type': message_type, ':message-flags': flags, ':stream-id': stream_id}
+        payload = b''
+        if model is not None:
+            headers[':content-type'] = CONTENT_TYPE
+            headers['service-model-type'] = SERVICE + model
+            payload = json.dumps(body).encode('utf-8')
+        try:
+            with self.write_lock:
+                self.wfile.write(encode_message(headers, payload))
+                self.wfile.flush()
+        except (OSError, ValueError):
+            # The client disconnected
+            pass
+
+    def handle(self):
+        try:
+            while True:
+                message = read_message(self.rfile)
+                if message is None:
+                    return
+                self.handle_message(*message)
+        except (OSError, ValueError):
+            return
+        finally:
+            with self.server.lock:
+                self.server.connections.discard(self)
+
+    def handle_message(self, headers, payload) -> None:
+        message_type = headers.get(':message-type')
+        stream_id = headers.get(':stream-id', 0)
+        if message_type == CONNECT:
+            auth_token = json.loads(payload.decode('utf-8') or '{}').get('authToken')
+            self.connected = auth_token == self.server.auth_token
+            self.send(CONNECT_ACK, flags=CONNECTION_ACCEPTED if self.connected else 0)
+            if self.connected:
+                with self.server.lock:
+                    self.server.connections.add(self)
+        elif not self.connected:
+            self.send(PROTOCOL_ERROR)
+        elif message_type == PING:
+            self.send(PING_RESPONSE)
+        elif message_type == APPLICATION_MESSAGE and headers.get(':message-flags', 0) & TERMINATE_STREAM:
+            # The client closed the stream of a subscription
+            with self.server.lock:
+                self.subscriptions.pop(stream_id, None)
+        elif message_type == APPLICATION_MESSAGE and 'operation' in headers:
+            operation = headers['operation'][len(SERVICE):]
+            request = json.loads(payload.decode('utf-8') or '{}')
+            with self.server.lock:
+                self.server.operations.append((operation, request))
+            route = getattr(self, 'route_{}'.format(operation), None)
+            if route is None:
+                self.send(APPLICATION_ERROR, stream_id, TERMINATE_STREAM, 'ServiceError',
+                          {'message': 'Operation {} is not supported by the fake IPC server'.format(operation)})
+            else:
+                route(stream_id, request)
+
+    def route_GetSecretValue(self, stream_id, request) -> None:
+        secret_string = self.server.secrets.get(request.get('secretId'))
+        if secret_string is None:
+            self.send(APPLICATION_ERROR, stream_id, TERMINATE_STREAM, 'ResourceNotFoundError',
+                      {'message': 'Secret not found', 'resourceType': 'secret', 'resourceName': request.get('secretId')})
+            return
+        self.send(APPLICATION_MESSAGE, stream_id, TERMINATE_STREAM, 'GetSecretValueResponse', {
+            'secretId': request['secretId'], 'versionId': 'version1', 'versionStage': ['AWSCURRENT'],
+            'secretValue': {'secretString': secret_string}})
+
+    def route_SubscribeToTopic(self, stream_id, request) -> None:
+        # Acknowledge the subscription before any message can be delivered on its stream
+        self.send(APPLICATION_MESSAGE, stream_id, 0, 'SubscribeToTopicResponse', {'topicName': request['topic']})
+        with self.server.lock:
+            self.subscriptions[stream_id] = request['topic']
+            self.server.subscription_added.notify_all()
+
+    def route_PublishToTopic(self, stream_id, request) -> None:
+        publish_message = request.get('publishMessage', {})
+        if 'jsonMessage' in publish_message:
+            message = publish_message['jsonMessage'].get('message')
+        else:
+            message = base64.b64decode(publish_message.get('binaryMessage', {}).get('message', ''))
+        self.server.fake.publish(request['topic'], message)
+        self.send(APPLICATION_MESSAGE, stream_id, TERMINATE_STREAM, 'PublishToTopicResponse', {})
+
+    def deliver(self, stream_id, topic, message) -> None:
+        if isinstance(message, bytes):
+            event = {'binaryMessage': {'message': base64.b64encode(message).decode(), 'context': {'topic': topic}}}
+        else:
+            event = {'jsonMessage': {'message': message, 'context': {'topic': topic}}}
+        self.send(APPLICATION_MESSAGE, stream_id, 0, 'SubscriptionResponseMessage', event)
+
+
+class ThreadingUnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class FakeGreengrassIPCServer:
+    """
+    Run the fake IPC server on a Unix domain socket in a background thread.
+
+    The harness can publish to the components with publish(), and receive what they publish with subscribe().
+    """
+
+    def __init__(self, socket_path, auth_token='fake_svcuid', secrets=None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.socket_path = socket_path
+        self.server = ThreadingUnixStreamServer(socket_path, FakeIPCHandler)
+        self.server.lock = threading.Lock()
+        self.server.subscription_added = threading.Condition(self.server.lock)
+        self.server.connection_count = 0
+        self.server.connections = set()
+        self.server.operations = []
+        self.server.auth_token = auth_token
+        self.server.secrets = dict(secrets or {})
+        self.server.fake = self
+        # The (topic filter, callback) of the harness subscriptions
+        self.callbacks = []
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        with self.server.lock:
+            connections = list(self.server.connections)
+        for connection in connections:
+            try:
+                connection.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    @property
+    def environment(self) -> dict:
+        # The environment the nucleus gives a component to connect to IPC with
+        return {'AWS_GG_NUCLEUS_DOMAIN_SOCKET_FILEPATH_FOR_COMPONENT': self.socket_path,
+                'SVCUID': self.server.auth_token}
+
+    @property
+    def connection_count(self) -> int:
+        return self.server.connection_count
+
+    @property
+    def operations(self) -> list:
+        return self.server.operations
+
+    def set_secret(self, secret_id, secret_string) -> None:
+        self.server.secrets[secret_id] = secret_string
+
+    def subscribe(self, topic_filter, callback) -> None:
+        """
+        Receive the messages published to a topic, in the thread of the connection that published them.
+
+        Parameters
+        ----------
+            topic_filter(str): The topic, which may contain wildcards
+            callback(function): Called with the topic and message of every matching message
+
+        Returns
+        -------
+            None
+        """
+        with self.server.lock:
+            self.callbacks.append((topic_filter, callback))
+
+    def publish(self, topic, message) -> int:
+        """
+        Publish a message to the matching subscriptions of the components and of the harness.
+
+        Parameters
+        ----------
+            topic(str): The topic
+            message(dict): The JSON message, or bytes for a binary message
+
+        Returns
+        -------
+            delivered(int): The number of subscriptions the message was delivered to
+        """
+        with self.server.lock:
+            streams = [(connection, stream_id) for connection in self.server.connections
+                       for stream_id, topic_filter in connection.subscriptions.items()
+                       if topic_matches(topic_filter, topic)]
+            callbacks = [callback for topic_filter, callback in self.callbacks if topic_matches(topic_filter, topic)]
+        for connection, stream_id in streams:
+            connection.deliver(stream_id, topic, message)
+        for callback in callbacks:
+            callback(topic, message)
+        return len(streams) + len(callbacks)
+
+    def wait_for_subscription(self, topic, timeout) -> bool:
+        """
+        Wait until a component subscribes to a topic.
+
+        Parameters
+        ----------
+            topic(str): The topic the subscription must match
+            timeout(float): The number of seconds to wait
+
+        Returns
+        -------
+            subscribed(bool): True if a component subscribed in time
+        """
+        def is_subscribed():
+            return any(topic_matches(topic_filter, topic) for connection in self.server.connections
+                       for topic_filter in connection.subscriptions.values())
+
+        with self.server.lock:
+            return self.server.subscription_added.wait_for(is_subscribed, timeout)
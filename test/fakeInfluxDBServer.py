@@ -0,0 +1,333 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+A local, in-memory stand-in for the parts of the InfluxDB v2 HTTP API used by this component.
+"""
+
+import base64
+import gzip
+import json
+import re
+import socketserver
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SESSION_COOKIE_NAME = 'influxdb-oss-session'
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_task_name(flux) -> str:
+    # Like InfluxDB, take the task name from the task option of the Flux script
+    match = re.search(r'option task = \{.*?name: "([^"]*)"', flux, re.DOTALL)
+    return match.group(1) if match else ''
+
+
+class FakeInfluxDBHandler(BaseHTTPRequestHandler):
+    # Keep connections alive between requests like InfluxDB does
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connection_count += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_empty(self, status, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def is_authorized(self) -> bool:
+        state = self.server.state
+        authorization = self.headers.get('Authorization', '')
+        if authorization.startswith('Token '):
+            token = authorization[len('Token '):]
+            return any(auth['token'] == token for auth in state['authorizations'])
+        cookie = self.headers.get('Cookie', '')
+        return '{}={}'.format(SESSION_COOKIE_NAME, state['session']) in cookie
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self.read_body()
+        with self.server.lock:
+            self.server.requests.append((method, url.path, query, body))
+        route = getattr(self, 'route_{}'.format(method.lower()))
+        route(url.path, query, body)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def route_get(self, path, query, body):
+        state = self.server.state
+        if path == '/api/v2/setup':
+            self.send_json(200, {'allowed': state['org'] is None})
+            return
+        if path == '/health':
+            if self.server.healthy:
+                self.send_json(200, {'name': 'influxdb', 'status': 'pass', 'message': 'ready for queries and writes'})
+            else:
+                self.send_json(503, {'name': 'influxdb', 'status': 'fail', 'message': 'not ready'})
+            return
+        if path == '/metrics':
+            data = self.server.metrics.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if not self.is_authorized():
+            self.send_json(401, {'code': 'unauthorized', 'message': 'unauthorized access'})
+            return
+        if path == '/api/v2/authorizations':
+            self.send_json(200, {'authorizations': state['authorizations']})
+        elif path == '/api/v2/buckets':
+            org_ids = [org['id'] for org in state['orgs'] if query.get('org') in (None, org['name'])]
+            buckets = [bucket for bucket in state['buckets']
+                       if query.get('name') in (None, bucket['name']) and bucket['orgID'] in org_ids]
+            if query.get('name') and not buckets:
+                self.send_json(404, {'code': 'not found', 'message': 'bucket "{}" not found'.format(query['name'])})
+                return
+            self.send_json(200, {'buckets': buckets})
+        elif path == '/api/v2/orgs':
+            orgs = [org for org in state['orgs'] if query.get('org') in (None, org['name'])]
+            if query.get('org') and not orgs:
+                self.send_json(404, {'code': 'not found', 'message': 'organization name "{}" not found'.format(
+                    query['org'])})
+                return
+            self.send_json(200, {'orgs': orgs})
+        elif path == '/api/v2/tasks':
+            tasks = [task for task in state['tasks']
+                     if query.get('name') in (None, task['name']) and query.get('orgID') in (None, task['orgID'])]
+            self.send_json(200, {'tasks': tasks})
+        else:
+            self.send_json(404, {'code': 'not found', 'message': 'path not found'})
+
+    def route_post(self, path, query, body):
+        state = self.server.state
+        if path == '/api/v2/signin':
+            expected = base64.b64encode('{}:{}'.format(state['username'], state['password']).encode('utf-8'))
+            if self.headers.get('Authorization') != 'Basic {}'.format(expected.decode('ascii')):
+                self.send_json(401, {'code': 'unauthorized', 'message': 'unauthorized access'})
+                return
+            self.send_empty(204, {'Set-Cookie': '{}={}; Path=/; HttpOnly'.format(SESSION_COOKIE_NAME, state['session'])})
+        elif path == '/api/v2/setup':
+            if state['org'] is not None:
+                self.send_json(422, {'code': 'conflict', 'message': 'onboarding has already been completed'})
+                return
+            request = json.loads(body)
+            state['username'] = request['username']
+            state['password'] = request['password']
+            org = self.server.fake.add_org(request['org'])
+            bucket = self.server.fake.add_bucket(request['bucket'], retention_seconds=request.get(
+                'retentionPeriodSeconds', 0))
+            auth = self.server.fake.add_authorization("{}'s Token".format(request['username']))
+            self.send_json(201, {'user': {'name': request['username']}, 'org': org, 'bucket': bucket, 'auth': auth})
+        elif not self.is_authorized():
+            self.send_json(401, {'code': 'unauthorized', 'message': 'unauthorized access'})
+        elif path == '/api/v2/authorizations':
+            request = json.loads(body)
+            auth = self.server.fake.add_authorization(request['description'], permissions=request['permissions'],
+                                                      org_id=request['orgID'])
+            self.send_json(201, auth)
+        elif path == '/api/v2/write':
+            if self.server.write_status != 204:
+                self.send_json(self.server.write_status, {'code': 'unavailable', 'message': 'write failed'})
+                return
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            with self.server.lock:
+                self.server.writes.append((query['org'], query['bucket'], query.get('precision', 'ns'),
+                                           body.decode('utf-8').split('\n')))
+            self.send_empty(204)
+        elif path == '/api/v2/query':
+            request = json.loads(body)
+            with self.server.lock:
+                self.server.queries.append((query['org'], request['query']))
+            data = self.server.query_result.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif path == '/api/v2/orgs':
+            request = json.loads(body)
+            if any(org['name'] == request['name'] for org in state['orgs']):
+                self.send_json(422, {'code': 'conflict', 'message': 'organization name is not unique'})
+                return
+            self.send_json(201, self.server.fake.add_org(request['name']))
+        elif path == '/api/v2/buckets':
+            request = json.loads(body)
+            org = next(org for org in state['orgs'] if org['id'] == request['orgID'])
+            if any(bucket['name'] == request['name'] and bucket['orgID'] == org['id'] for bucket in state['buckets']):
+                self.send_json(422, {'code': 'conflict', 'message': 'bucket with name {} already exists'.format(
+                    request['name'])})
+                return
+            retention_seconds = sum(rule['everySeconds'] for rule in request.get('retentionRules', []))
+            self.send_json(201, self.server.fake.add_bucket(request['name'], org, retention_seconds))
+        elif path == '/api/v2/tasks':
+            request = json.loads(body)
+            self.send_json(201, self.server.fake.add_task(request['orgID'], request['flux'], request['status']))
+        else:
+            self.send_json(404, {'code': 'not found', 'message': 'path not found'})
+
+    def route_patch(self, path, query, body):
+        state = self.server.state
+        if not self.is_authorized():
+            self.send_json(401, {'code': 'unauthorized', 'message': 'unauthorized access'})
+            return
+        request = json.loads(body)
+        collection, _, resource_id = path[len('/api/v2/'):].partition('/')
+        resources = {'buckets': state['buckets'], 'tasks': state['tasks']}.get(collection, [])
+        resource = next((resource for resource in resources if resource['id'] == resource_id), None)
+        if resource is None:
+            self.send_json(404, {'code': 'not found', 'message': 'path not found'})
+            return
+        resource.update(request)
+        if collection == 'tasks':
+            resource['name'] = get_task_name(resource['flux'])
+        self.send_json(200, resource)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeInfluxDBServer:
+    """
+    Run the fake InfluxDB API on a random local port, or on the given address, in a background thread.
+    """
+
+    def __init__(self, username='test_username', password='test_password', host='127.0.0.1', port=0,
+                 handler_class=FakeInfluxDBHandler, ssl_context=None):
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        if ssl_context is not None:
+            self.httpd.socket = ssl_context.wrap_socket(self.httpd.socket, server_side=True)
+        self.httpd.lock = threading.Lock()
+        self.httpd.connection_count = 0
+        self.httpd.requests = []
+        self.httpd.healthy = True
+        self.httpd.writes = []
+        self.httpd.write_status = 204
+        self.httpd.queries = []
+        self.httpd.query_result = ''
+        self.httpd.metrics = ''
+        self.httpd.fake = self
+        self.httpd.state = {
+            'username': username,
+            'password': password,
+            'session': new_id(),
+            'org': None,
+            'orgs': [],
+            'authorizations': [],
+            'buckets': [],
+            'tasks': [],
+        }
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    @property
+    def state(self) -> dict:
+        return self.httpd.state
+
+    @property
+    def requests(self) -> list:
+        return self.httpd.requests
+
+    @property
+    def connection_count(self) -> int:
+        return self.httpd.connection_count
+
+    @property
+    def writes(self) -> list:
+        return self.httpd.writes
+
+    @property
+    def queries(self) -> list:
+        return self.httpd.queries
+
+    def set_query_result(self, result) -> None:
+        self.httpd.query_result = result
+
+    def set_metrics(self, metrics) -> None:
+        self.httpd.metrics = metrics
+
+    def set_healthy(self, healthy) -> None:
+        self.httpd.healthy = healthy
+
+    def set_write_status(self, status) -> None:
+        self.httpd.write_status = status
+
+    def add_org(self, name) -> dict:
+        org = {'id': new_id(), 'name': name}
+        self.state['orgs'].append(org)
+        # The first org is the one created by the initial setup
+        if self.state['org'] is None:
+            self.state['org'] = org
+        return org
+
+    def add_bucket(self, name, org=None, retention_seconds=0) -> dict:
+        org = org or self.state['org']
+        retention_rules = [{'type': 'expire', 'everySeconds': retention_seconds}] if retention_seconds else []
+        bucket = {'id': new_id(), 'name': name, 'orgID': org['id'], 'retentionRules': retention_rules}
+        self.state['buckets'].append(bucket)
+        return bucket
+
+    def add_task(self, org_id, flux, status='active') -> dict:
+        task = {'id': new_id(), 'orgID': org_id, 'name': get_task_name(flux), 'flux': flux, 'status': status}
+        self.state['tasks'].append(task)
+        return task
+
+    def add_authorization(self, description, token=None, status='active', permissions=None, org_id=None) -> dict:
+        authorization = {
+            'id': new_id(),
+            'token': token if token is not None else new_id(),
+            'status': status,
+            'description': description,
+            'orgID': org_id or (self.state['org']['id'] if self.state['org'] else None),
+            'permissions': permissions or [],
+        }
+        self.state['authorizations'].append(authorization)
+        return authorization
@@ -0,0 +1,21 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+A stand-in for InfluxDBClient.write that records each write, or fails as if InfluxDB were unreachable.
+"""
+
+import threading
+
+
+class FakeWriter:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.writes = []
+        self.written = threading.Event()
+
+    def __call__(self, org, bucket, data, precision):
+        if self.fail:
+            raise ConnectionRefusedError("test")
+        self.writes.append((org, bucket, precision, data.decode("utf-8").split("\n")))
+        self.written.set()
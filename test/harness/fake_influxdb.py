@@ -0,0 +1,68 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Runs the fake InfluxDB API as the process of a fake InfluxDB container, started by the docker shim of the harness.
+
+The setup, org, buckets and tokens are kept in the data directory of the container, so that they survive the
+container being recreated like they do with InfluxDB.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fakeInfluxDBServer import FakeInfluxDBHandler, FakeInfluxDBServer  # noqa: E402
+
+STATE_FILE = 'fake_influxdb_state.json'
+
+
+class PersistentInfluxDBHandler(FakeInfluxDBHandler):
+    def handle_request(self, method):
+        super().handle_request(method)
+        if method != 'GET':
+            with self.server.lock:
+                save_state(self.server.state, self.server.data_path)
+
+
+def load_state(state, data_path) -> None:
+    path = os.path.join(data_path, STATE_FILE)
+    if os.path.exists(path):
+        with open(path) as state_file:
+            state.update(json.load(state_file))
+
+
+def save_state(state, data_path) -> None:
+    path = os.path.join(data_path, STATE_FILE)
+    with open(path + '.tmp', 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(path + '.tmp', path)
+
+
+def log(message, **fields) -> None:
+    # Log in the logfmt format of InfluxDB, for the log forwarder of the component
+    line = 'ts={} lvl=info msg="{}"'.format(time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), message)
+    print(' '.join([line] + ['{}={}'.format(key, value) for key, value in fields.items()]), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interface", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--data_path", type=str, required=True)
+    parser.add_argument("--startup_delay", type=float, default=0)
+    args = parser.parse_args()
+
+    log('Welcome to InfluxDB', version='fake')
+    # Stand in for the time InfluxDB takes to open its storage engine
+    time.sleep(args.startup_delay)
+    server = FakeInfluxDBServer(host=args.interface, port=args.port, handler_class=PersistentInfluxDBHandler)
+    server.httpd.data_path = args.data_path
+    os.makedirs(args.data_path, exist_ok=True)
+    load_state(server.state, args.data_path)
+    log('Listening', service='tcp-listener', transport='http', port=args.port)
+    server.httpd.serve_forever(poll_interval=0.05)
@@ -0,0 +1,407 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Offline end-to-end harness for the startup time and token serving throughput of the component.
+
+Runs the Run lifecycle of the recipe, src/run_influxdb.sh, with its default configuration, against local stand-ins for
+Greengrass and Docker: a fake nucleus IPC server for local pub/sub and Secret Manager, and a docker shim that runs
+the fake InfluxDB API as the container. Each run measures how long the component takes to answer its first token
+request after it is started, then sends token requests at a fixed concurrency and measures the throughput and latency.
+The first run is a cold start; later runs reuse the InfluxDB setup, and the container too if WarmRestart is true.
+
+Run from the repository root on Linux or macOS, with the awsiot SDK installed:
+    python test/harness/run_harness.py --runs 2 --requests 2000 --output harness_output.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HARNESS_PATH = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(HARNESS_PATH))
+SRC_PATH = os.path.join(REPOSITORY_PATH, 'src')
+sys.path.append(os.path.dirname(HARNESS_PATH))
+sys.path.append(SRC_PATH)
+
+from fakeGreengrassIPCServer import FakeGreengrassIPCServer  # noqa: E402
+from startupTrace import report  # noqa: E402
+
+SECRET_ARN = 'arn:aws:secretsmanager:region:account:secret:harness'
+CREDENTIALS = {'influxdb_username': 'harness_admin', 'influxdb_password': 'HarnessPassword123!@#'}
+ACCESS_LEVELS = ['RO', 'RW', 'Admin']
+# The positional arguments of run_influxdb.sh, as given by the Run lifecycle of the recipe
+RUN_ARGUMENTS = ['AutoProvision', 'InfluxDBContainerName', 'InfluxDBBucket', 'InfluxDBOrg', None, 'SecretArn',
+                 'InfluxDBPort', 'TokenRequestTopic', 'TokenResponseTopic', 'ServerProtocol', 'BridgeNetworkName',
+                 'InfluxDBMountPath', 'InfluxDBInterface', 'SkipTLSVerify']
+DEFAULT_LINE = re.compile("^    ([A-Za-z]+): '?(.*?)'?$")
+SETENV_LINE = re.compile("^ +(INFLUXDB_[A-Z_]+): '\\{configuration:/([A-Za-z]+)\\}'$")
+
+
+def load_recipe(recipe_text) -> tuple:
+    """
+    Read the default configuration and the environment variables it is passed to the scripts with from the recipe.
+
+    Parameters
+    ----------
+        recipe_text(str): The recipe YAML
+
+    Returns
+    -------
+        recipe(tuple): The default configuration, and the configuration key of every environment variable
+    """
+    configuration = {}
+    environment = {}
+    in_defaults = False
+    for line in recipe_text.splitlines():
+        if line.strip() == 'DefaultConfiguration:':
+            in_defaults = True
+            continue
+        match = DEFAULT_LINE.match(line)
+        if in_defaults and match is not None:
+            configuration[match.group(1)] = match.group(2)
+        elif line.strip():
+            in_defaults = in_defaults and line.startswith('    ')
+        match = SETENV_LINE.match(line)
+        if match is not None:
+            environment[match.group(1)] = match.group(2)
+    return configuration, environment
+
+
+def get_free_port() -> int:
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        return free_socket.getsockname()[1]
+
+
+def percentile(sorted_values, fraction) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TokenRequester:
+    """
+    Sends token requests over the fake local pub/sub, and matches the responses by their correlation ID.
+    """
+
+    def __init__(self, ipc_server, request_topic, reply_topic):
+        self.ipc_server = ipc_server
+        self.request_topic = request_topic
+        self.reply_topic = reply_topic
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        # Correlation ID -> time the request was sent
+        self.pending = {}
+        self.latencies = []
+        self.failures = 0
+        self.next_id = 0
+        ipc_server.subscribe(reply_topic, self.on_response)
+
+    def on_response(self, topic, message) -> None:
+        received = time.perf_counter()
+        with self.lock:
+            sent = self.pending.pop(message.get('correlationId'), None)
+            if sent is None:
+                return
+            if 'InfluxDBToken' in message:
+                self.latencies.append(received - sent)
+            else:
+                self.failures += 1
+            self.condition.notify_all()
+
+    def send(self, access_level) -> str:
+        with self.lock:
+            correlation_id = str(self.next_id)
+            self.next_id += 1
+            self.pending[correlation_id] = time.perf_counter()
+        self.ipc_server.publish(self.request_topic, {
+            'action': 'RetrieveToken', 'accessLevel': access_level, 'replyTopic': self.reply_topic,
+            'correlationId': correlation_id})
+        return correlation_id
+
+    def wait_for_pending(self, limit, timeout) -> int:
+        """
+        Wait until at most `limit` requests are pending, and give up on the oldest requests after the timeout.
+
+        Parameters
+        ----------
+            limit(int): The number of pending requests to wait for
+            timeout(float): The number of seconds to wait
+
+        Returns
+        -------
+            lost(int): The number of requests given up on
+        """
+        with self.lock:
+            if self.condition.wait_for(lambda: len(self.pending) <= limit, timeout):
+                return 0
+            lost = sorted(self.pending, key=self.pending.get)[:len(self.pending) - limit]
+            for correlation_id in lost:
+                del self.pending[correlation_id]
+            return len(lost)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.pending.clear()
+            self.latencies = []
+            self.failures = 0
+
+
+class ComponentHarness:
+    """
+    Runs the component against the fake IPC server and docker shim, in a work directory that stands in for the
+    InfluxDB mount path and the state of Docker.
+    """
+
+    def __init__(self, work_path, overrides=None, influxdb_startup_delay=0.0):
+        self.work_path = work_path
+        with open(os.path.join(REPOSITORY_PATH, 'recipe.yaml')) as recipe_file:
+            self.configuration, environment = load_recipe(recipe_file.read())
+        self.configuration.update({
+            'SecretArn': SECRET_ARN,
+            'InfluxDBMountPath': os.path.join(work_path, 'dashboard'),
+            'InfluxDBPort': str(get_free_port()),
+            # The fake InfluxDB API only serves HTTP
+            'ServerProtocol': 'http',
+            # The load comes from one client, which the rate limits would throttle rather than measure
+            'TokenRequestClientRate': '0',
+            'TokenRequestGlobalRate': '0',
+        })
+        self.configuration.update(overrides or {})
+        os.makedirs(self.configuration['InfluxDBMountPath'], exist_ok=True)
+
+        self.ipc_server = FakeGreengrassIPCServer(os.path.join(work_path, 'ipc.socket'),
+                                                  secrets={SECRET_ARN: json.dumps(CREDENTIALS)})
+        self.environment = dict(os.environ)
+        self.environment.update({variable: self.configuration[key] for variable, key in environment.items()})
+        self.environment.update(self.ipc_server.environment)
+        self.environment.update({
+            'PATH': os.path.join(HARNESS_PATH, 'bin') + os.pathsep + os.environ.get('PATH', ''),
+            'FAKE_DOCKER_STATE_PATH': os.path.join(work_path, 'docker'),
+            'FAKE_INFLUXDB_STARTUP_DELAY': str(influxdb_startup_delay),
+        })
+        reply_topic = self.configuration['TokenReplyTopicPattern'].replace('*', 'harness')
+        self.requester = TokenRequester(self.ipc_server, self.configuration['TokenRequestTopic'], reply_topic)
+        self.process = None
+        self.log_file = None
+
+    def __enter__(self):
+        self.ipc_server.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        # Remove the container, even if it is left running on a warm restart
+        self.docker('rm', '--force', self.configuration['InfluxDBContainerName'])
+        self.ipc_server.__exit__(*args)
+
+    @property
+    def trace_path(self) -> str:
+        return os.path.join(self.configuration['InfluxDBMountPath'], 'influxdb2_startup_trace.jsonl')
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.work_path, 'component.log')
+
+    def docker(self, *arguments) -> None:
+        subprocess.run(['docker'] + list(arguments), env=self.environment, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+
+    def start(self) -> None:
+        # Like the Run lifecycle of the recipe, with the artifacts in the source tree
+        arguments = [SRC_PATH + '/' if key is None else self.configuration[key] for key in RUN_ARGUMENTS]
+        self.log_file = open(self.log_path, 'a')
+        self.process = subprocess.Popen(['bash', os.path.join(SRC_PATH, 'run_influxdb.sh')] + arguments,
+                                        env=self.environment, stdout=self.log_file, stderr=subprocess.STDOUT,
+                                        stdin=subprocess.DEVNULL, start_new_session=True)
+
+    def stop(self) -> None:
+        # Like the nucleus stopping the component, followed by the Shutdown lifecycle of the recipe
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+        self.process = None
+        self.log_file.close()
+        if self.configuration['WarmRestart'] != 'true':
+            self.docker('stop', self.configuration['InfluxDBContainerName'])
+            self.docker('rm', self.configuration['InfluxDBContainerName'])
+
+    def get_log_tail(self, lines=20) -> str:
+        with open(self.log_path) as log_file:
+            return ''.join(log_file.readlines()[-lines:])
+
+    def wait_until_serving(self, timeout) -> float:
+        """
+        Start the component, and send a token request every 50 ms until one is answered.
+
+        Parameters
+        ----------
+            timeout(float): The number of seconds to wait for an answer
+
+        Returns
+        -------
+            startup_seconds(float): The time from starting the component to receiving the first token
+        """
+        self.requester.reset()
+        start = time.perf_counter()
+        self.start()
+        deadline = start + timeout
+        request_topic = self.configuration['TokenRequestTopic']
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('The component exited with {} before answering a token request:\n{}'.format(
+                    self.process.returncode, self.get_log_tail()))
+            if self.ipc_server.wait_for_subscription(request_topic, 0.05):
+                self.requester.send('RO')
+                self.requester.wait_for_pending(0, 0.05)
+                with self.requester.lock:
+                    if self.requester.latencies:
+                        return time.perf_counter() - start
+        raise RuntimeError('The component did not answer a token request within {}s:\n{}'.format(
+            timeout, self.get_log_tail()))
+
+    def wait_until_stopped(self, timeout=10) -> None:
+        # The subscriptions end when the connections of the stopped processes are closed
+        self.stop()
+        deadline = time.perf_counter() + timeout
+        while self.ipc_server.wait_for_subscription(self.configuration['TokenRequestTopic'], 0):
+            if time.perf_counter() > deadline:
+                raise RuntimeError('The token request subscription outlived the component')
+            time.sleep(0.05)
+
+    def send_requests(self, requests, concurrency, timeout) -> dict:
+        """
+        Send token requests, keeping up to `concurrency` of them waiting for an answer.
+
+        Parameters
+        ----------
+            requests(int): The number of requests
+            concurrency(int): The number of requests in flight at a time
+            timeout(float): The number of seconds to wait for an answer before a request is counted as lost
+
+        Returns
+        -------
+            result(dict): The throughput and latency
+        """
+        self.requester.reset()
+        lost = 0
+        start = time.perf_counter()
+        for index in range(requests):
+            lost += self.requester.wait_for_pending(concurrency - 1, timeout)
+            self.requester.send(ACCESS_LEVELS[index % len(ACCESS_LEVELS)])
+        lost += self.requester.wait_for_pending(0, timeout)
+        duration = time.perf_counter() - start
+
+        with self.requester.lock:
+            latencies = sorted(self.requester.latencies)
+            failures = self.requester.failures
+        return {
+            'requests': requests,
+            'answered': len(latencies),
+            'failed': failures,
+            'lost': lost,
+            'requests_per_second': round(len(latencies) / duration, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50) * 1000, 3),
+                'p95': round(percentile(latencies, 0.95) * 1000, 3),
+                'p99': round(percentile(latencies, 0.99) * 1000, 3),
+                'max': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            }
+        }
+
+    def run(self, run_count, requests, concurrency, startup_timeout=60, request_timeout=10) -> dict:
+        """
+        Start and stop the component `run_count` times, and measure its startup and token serving each time.
+
+        Parameters
+        ----------
+            run_count(int): The number of runs
+            requests(int): The number of token requests of each run
+            concurrency(int): The number of requests in flight at a time
+            startup_timeout(float): The number of seconds the component has to answer its first request
+            request_timeout(float): The number of seconds before a request is counted as lost
+
+        Returns
+        -------
+            results(dict): The configuration, the results of each run, and the startup trace report
+        """
+        runs = []
+        for index in range(run_count):
+            startup_seconds = self.wait_until_serving(startup_timeout)
+            result = {'run': index + 1, 'startup_seconds': round(startup_seconds, 3)}
+            if requests:
+                result.update(self.send_requests(requests, concurrency, request_timeout))
+            self.wait_until_stopped()
+            runs.append(result)
+
+        trace = []
+        if os.path.exists(self.trace_path):
+            with open(self.trace_path) as trace_file:
+                trace = report(trace_file, run_count)
+        return {
+            'harness': 'component',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'warm_restart': self.configuration['WarmRestart'],
+            'publish_workers': self.configuration['PublishWorkers'],
+            'coalescing_window_ms': self.configuration['CoalescingWindowMs'],
+            'concurrency': concurrency,
+            'runs': runs,
+            'startup_trace': trace,
+        }
+
+
+def parse_override(value) -> tuple:
+    key, separator, override = value.partition('=')
+    if not separator:
+        raise argparse.ArgumentTypeError('Expected Key=Value, got {}'.format(value))
+    return key, override
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--startup_timeout", type=float, default=60)
+    parser.add_argument("--influxdb_startup_delay", type=float, default=0.0)
+    parser.add_argument("--config", type=parse_override, action="append", default=[],
+                        help="Override a recipe configuration key, for example --config WarmRestart=true")
+    parser.add_argument("--work_path", type=str, default="",
+                        help="Keep the component log, trace and fake InfluxDB data here instead of a temporary "
+                             "directory")
+    parser.add_argument("--output", type=str, default="")
+    args = parser.parse_args()
+
+    work_path = args.work_path or tempfile.mkdtemp(prefix='influxdb_harness_')
+    try:
+        with ComponentHarness(work_path, dict(args.config), args.influxdb_startup_delay) as harness:
+            results = harness.run(args.runs, args.requests, args.concurrency, args.startup_timeout)
+    finally:
+        if not args.work_path:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    print(output)
@@ -0,0 +1,111 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+
+import pytest
+
+from test.fakeClock import FakeClock
+
+sys.path.append("src/")
+
+
+def create_controller(**kwargs):
+    import src.admissionControl as admissionControl
+    from src.influxDBMetrics import MetricsRegistry
+
+    clock = FakeClock(0)
+    registry = MetricsRegistry()
+    controller = admissionControl.AdmissionController(clock=clock, metrics_registry=registry, **kwargs)
+    return controller, clock, registry
+
+
+def test_get_client_id():
+    import src.admissionControl as admissionControl
+
+    assert admissionControl.get_client_id({"clientId": "app1", "replyTopic": "reply/app2"}) == "app1"
+    assert admissionControl.get_client_id({"clientId": 1, "replyTopic": "reply/app2"}) == "reply/app2"
+    assert admissionControl.get_client_id({"action": "RetrieveToken"}) == admissionControl.ANONYMOUS_CLIENT
+    assert admissionControl.get_client_id(None) == admissionControl.ANONYMOUS_CLIENT
+    assert len(admissionControl.get_client_id({"clientId": "x" * 1000})) == admissionControl.MAX_CLIENT_ID_LENGTH
+
+
+def test_client_rate_limit():
+    controller, clock, registry = create_controller(client_rate=2, client_burst=3)
+    assert [controller.admit("app1") for _ in range(5)] == [True, True, True, False, False]
+    # Other clients have their own limit
+    assert controller.admit("app2")
+
+    # The bucket refills at the rate, up to the burst
+    clock.now = 1
+    assert [controller.admit("app1") for _ in range(3)] == [True, True, False]
+    clock.now = 100
+    assert [controller.admit("app1") for _ in range(4)] == [True, True, True, False]
+
+    assert registry.counter("influxdb_token_requests_admitted_total", "").get() == 9
+    assert registry.counter("influxdb_token_requests_throttled_total", "", ["limit"]).get(limit="client") == 4
+
+
+def test_global_rate_limit():
+    controller, clock, registry = create_controller(client_rate=1, client_burst=2, global_rate=1, global_burst=3)
+    assert controller.admit("app1")
+    assert controller.admit("app1")
+    # Requests over the client limit do not use up the global limit
+    assert not controller.admit("app1")
+    assert controller.admit("app2")
+    assert not controller.admit("app3")
+    throttled = registry.counter("influxdb_token_requests_throttled_total", "", ["limit"])
+    assert throttled.get(limit="client") == 1
+    assert throttled.get(limit="global") == 1
+
+    # The request throttled by the global limit did not count against its client
+    clock.now = 1
+    assert controller.admit("app3")
+    clock.now = 2
+    assert controller.admit("app3")
+
+
+def test_anonymous_requests_only_have_the_global_limit():
+    import src.admissionControl as admissionControl
+
+    controller, _, registry = create_controller(client_rate=1, client_burst=1, global_rate=1, global_burst=50)
+    assert all(controller.admit(admissionControl.ANONYMOUS_CLIENT) for _ in range(50))
+    assert not controller.admit(admissionControl.ANONYMOUS_CLIENT)
+    assert not controller.clients
+    assert registry.counter("influxdb_token_requests_throttled_total", "", ["limit"]).get(limit="global") == 1
+
+
+def test_disabled_limits():
+    controller, _, registry = create_controller()
+    assert all(controller.admit("app1") for _ in range(1000))
+    assert not controller.clients
+    assert registry.counter("influxdb_token_requests_admitted_total", "").get() == 1000
+
+
+def test_max_clients():
+    import src.admissionControl as admissionControl
+
+    controller, clock, registry = create_controller(client_rate=1, client_burst=1, max_clients=2)
+    assert controller.admit("app1")
+    assert controller.admit("app2")
+    # New clients beyond the maximum share one limit
+    assert controller.admit("app3")
+    assert not controller.admit("app4")
+    assert set(controller.clients) == {"app1", "app2", admissionControl.OVERFLOW_CLIENT}
+    assert "influxdb_token_rate_limited_clients 3" in registry.render()
+
+    # Idle clients are pruned to make room for new ones
+    clock.now = 10
+    assert controller.admit("app5")
+    assert set(controller.clients) == {"app5"}
+
+
+def test_invalid_limits():
+    import src.admissionControl as admissionControl
+
+    with pytest.raises(ValueError, match="client token request rate must not be negative"):
+        admissionControl.AdmissionController(client_rate=-1)
+    with pytest.raises(ValueError, match="global token request burst must be at least 1"):
+        admissionControl.AdmissionController(global_rate=10, global_burst=0)
+    with pytest.raises(ValueError, match="Max clients"):
+        admissionControl.AdmissionController(max_clients=0)
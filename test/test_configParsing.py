@@ -0,0 +1,19 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+
+import pytest
+
+sys.path.append("src/")
+
+
+def test_parse_bool():
+    import src.configParsing as configParsing
+
+    assert all(configParsing.parse_bool(value) for value in ["true", "True", "1", "yes", "on", " t "])
+    assert not any(configParsing.parse_bool(value) for value in ["false", "FALSE", "0", "no", "off", "f"])
+    with pytest.raises(ValueError, match="Invalid boolean value"):
+        configParsing.parse_bool("")
+    with pytest.raises(ValueError, match="Invalid boolean value"):
+        configParsing.parse_bool("enabled")
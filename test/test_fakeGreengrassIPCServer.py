@@ -0,0 +1,99 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import os
+import sys
+import threading
+
+import awsiot.greengrasscoreipc
+import awsiot.greengrasscoreipc.client as client
+import pytest
+from awsiot.eventstreamrpc import AccessDeniedError
+from awsiot.greengrasscoreipc.model import (
+    GetSecretValueRequest,
+    JsonMessage,
+    PublishMessage,
+    PublishToTopicRequest,
+    ResourceNotFoundError,
+    SubscribeToTopicRequest
+)
+
+from test.fakeGreengrassIPCServer import FakeGreengrassIPCServer, encode_message, read_message, topic_matches
+
+sys.path.append("src/")
+
+TIMEOUT = 5
+
+
+class RecordingStreamHandler(client.SubscribeToTopicStreamHandler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.received = threading.Event()
+
+    def on_stream_event(self, event):
+        self.messages.append(event.json_message.message)
+        self.received.set()
+
+
+def test_event_stream_codec():
+    headers = {":message-type": 0, ":message-flags": 2, ":stream-id": 7, "operation": "aws.greengrass#PublishToTopic",
+               "flag": True}
+    stream = io.BytesIO(encode_message(headers, b'{"topic": "a"}') + encode_message({":stream-id": 0}))
+    assert read_message(stream) == (headers, b'{"topic": "a"}')
+    assert read_message(stream) == ({":stream-id": 0}, b"")
+    assert read_message(stream) is None
+
+    corrupted = bytearray(encode_message(headers, b"payload"))
+    corrupted[-5] ^= 0xff
+    with pytest.raises(ValueError, match="message CRC"):
+        read_message(io.BytesIO(bytes(corrupted)))
+
+
+def test_topic_matches():
+    assert topic_matches("greengrass/influxdb/token/request", "greengrass/influxdb/token/request")
+    assert topic_matches("greengrass/+/token/#", "greengrass/influxdb/token/response/a")
+    assert topic_matches("#", "a/b")
+    assert not topic_matches("greengrass/+", "greengrass/influxdb/token")
+    assert not topic_matches("greengrass/influxdb/token", "greengrass/influxdb")
+
+
+def test_real_ipc_client(tmp_path):
+    with FakeGreengrassIPCServer(str(tmp_path / "ipc.socket"), secrets={"arn:secret": "secret value"}) as server:
+        ipc_client = awsiot.greengrasscoreipc.connect(ipc_socket=server.socket_path, authtoken="fake_svcuid")
+
+        operation = ipc_client.new_get_secret_value()
+        operation.activate(GetSecretValueRequest(secret_id="arn:secret"))
+        assert operation.get_response().result(TIMEOUT).secret_value.secret_string == "secret value"
+        operation = ipc_client.new_get_secret_value()
+        operation.activate(GetSecretValueRequest(secret_id="arn:other"))
+        with pytest.raises(ResourceNotFoundError):
+            operation.get_response().result(TIMEOUT)
+
+        # Messages published by the harness reach the subscriptions of the component, and the other way around
+        handler = RecordingStreamHandler()
+        subscription = ipc_client.new_subscribe_to_topic(handler)
+        subscription.activate(SubscribeToTopicRequest(topic="requests/+"))
+        subscription.get_response().result(TIMEOUT)
+        assert server.wait_for_subscription("requests/a", TIMEOUT)
+        assert server.publish("requests/a", {"action": "RetrieveToken"}) == 1
+        assert handler.received.wait(TIMEOUT)
+        assert handler.messages == [{"action": "RetrieveToken"}]
+
+        received = []
+        server.subscribe("responses", lambda topic, message: received.append((topic, message)))
+        operation = ipc_client.new_publish_to_topic()
+        operation.activate(PublishToTopicRequest(
+            topic="responses", publish_message=PublishMessage(json_message=JsonMessage(message={"token": "t"}))))
+        operation.get_response().result(TIMEOUT)
+        assert received == [("responses", {"token": "t"})]
+
+        subscription.close().result(TIMEOUT)
+        ipc_client.close()
+        assert [operation for operation, request in server.operations] == [
+            "GetSecretValue", "GetSecretValue", "SubscribeToTopic", "PublishToTopic"]
+
+        with pytest.raises(AccessDeniedError):
+            awsiot.greengrasscoreipc.connect(ipc_socket=server.socket_path, authtoken="other")
+    assert not os.path.exists(server.socket_path)
@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.append("src/")
+
+
+def test_load_recipe():
+    import test.harness.run_harness as run_harness
+
+    with open("recipe.yaml") as recipe_file:
+        configuration, environment = run_harness.load_recipe(recipe_file.read())
+    assert configuration["InfluxDBContainerName"] == "greengrass_InfluxDB"
+    assert configuration["ReadinessDeadline"] == "120"
+    assert configuration["AdditionalBuckets"] == ""
+    assert environment["INFLUXDB_TOKEN_REPLY_TOPIC_PATTERN"] == "TokenReplyTopicPattern"
+    # Every environment variable of the scripts has a default
+    assert set(environment.values()) <= set(configuration)
+    assert all(key in configuration for key in run_harness.RUN_ARGUMENTS if key is not None)
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="The harness runs the component scripts with bash")
+def test_component_end_to_end(tmp_path):
+    import test.harness.run_harness as run_harness
+
+    overrides = {"WarmRestart": "true", "MonitorInterval": "0"}
+    with run_harness.ComponentHarness(str(tmp_path), overrides) as harness:
+        results = harness.run(2, requests=30, concurrency=4, startup_timeout=60)
+        state_path = os.path.join(str(tmp_path), "docker")
+        # The container was left running and reused by the second run
+        assert os.path.exists(os.path.join(state_path, "greengrass_InfluxDB.json"))
+    assert not os.path.exists(os.path.join(state_path, "greengrass_InfluxDB.json"))
+
+    assert [run["answered"] for run in results["runs"]] == [30, 30]
+    assert all(run["lost"] == 0 and run["failed"] == 0 for run in results["runs"])
+    assert results["runs"][0]["startup_seconds"] > 0
+    # The first run sets InfluxDB up and creates the tokens, which the second run reuses
+    trace = "\n".join(results["startup_trace"])
+    assert "provisionInfluxDB/setup" in trace
+    assert "influxDBTokenPublisher/listening" in trace
+    assert "Comparison of the last 2 runs:" in trace
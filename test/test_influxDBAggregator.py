@@ -0,0 +1,86 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import pytest
+
+from test.fakeClock import FakeClock
+
+sys.path.append("src/")
+
+SECOND = 10 ** 9
+
+
+def create_aggregator(window=60, **kwargs):
+    from src.influxDBMetrics import MetricsRegistry
+    import src.influxDBAggregator as influxDBAggregator
+
+    clock = FakeClock(0)
+    wall_clock = FakeClock(1700000000 * SECOND)
+    registry = MetricsRegistry()
+    aggregator = influxDBAggregator.InfluxDBAggregator(
+        window, clock=clock, wall_clock=wall_clock, metrics_registry=registry, **kwargs)
+    return aggregator, clock, wall_clock, registry
+
+
+def test_aggregate_window():
+    aggregator, clock, wall_clock, registry = create_aggregator()
+    lines = ["cpu,host=a usage=10,state=\"ok\" 1700000000000", "cpu,host=a usage=20,state=\"busy\" 1700000001000",
+             "cpu,host=b usage=5i 1700000002000"]
+    assert aggregator.add_lines("greengrass", "telemetry", lines, "ms") == []
+    assert aggregator.flush_expired() == []
+
+    clock.now = 60
+    wall_clock.now += 60 * SECOND
+    assert aggregator.flush_expired() == [("greengrass", "telemetry", [
+        'cpu,host=a usage_min=10.0,usage_max=20.0,usage_mean=15.0,usage_count=2i,usage_last=20.0,'
+        'state_count=2i,state_last="busy" 1699999980000000000',
+        'cpu,host=b usage_min=5i,usage_max=5i,usage_mean=5.0,usage_count=1i,usage_last=5i 1699999980000000000'
+    ], "ns")]
+    assert registry.counter("influxdb_aggregation_points_total", "").get() == 3
+    assert registry.counter("influxdb_aggregation_windows_total", "").get() == 2
+
+    # Points for a window that has been written are dropped
+    assert aggregator.add_lines("greengrass", "telemetry", ["cpu,host=a usage=1 1700000003"], "s") == []
+    assert registry.counter("influxdb_aggregation_points_skipped_total", "", ["reason"]).get(reason="late") == 1
+
+    # Series without points are forgotten after another window
+    clock.now = 120
+    aggregator.flush_expired()
+    assert aggregator.series == {}
+
+
+def test_later_window_closes_open_window():
+    aggregator, _, _, _ = create_aggregator(functions=["max"])
+    assert aggregator.add_lines("greengrass", "telemetry", ["mem value=1 10", "mem value=2 70", "mem value=3 20"],
+                                "s") == [("greengrass", "telemetry", ["mem value_max=1.0 0"], "ns")]
+    assert aggregator.flush_all() == [("greengrass", "telemetry", ["mem value_max=2.0 60000000000"], "ns")]
+
+
+def test_passthrough_and_raw_bucket():
+    aggregator, _, _, registry = create_aggregator(raw_bucket="raw", max_series=1)
+    lines = ["cpu value=1", "mem value=1", "bad"]
+    assert aggregator.add_lines("greengrass", "telemetry", lines, "ns") == [
+        ("greengrass", "telemetry", ["mem value=1", "bad"], "ns"),
+        ("greengrass", "raw", lines, "ns")]
+    skipped = registry.counter("influxdb_aggregation_points_skipped_total", "", ["reason"])
+    assert skipped.get(reason="series_limit") == 1
+    assert skipped.get(reason="unparsed") == 1
+
+
+def test_type_conflict():
+    aggregator, _, _, registry = create_aggregator(functions=["count"])
+    aggregator.add_lines("greengrass", "telemetry", ["cpu value=1,ok=t", "cpu value=\"x\",ok=f"], "ns")
+    assert aggregator.flush_all() == [("greengrass", "telemetry", ["cpu value_count=1i,ok_count=1i 1699999980000000000"],
+                                       "ns")]
+    assert registry.counter("influxdb_aggregation_points_skipped_total", "", ["reason"]).get(reason="type_conflict") == 1
+
+
+def test_parse_functions():
+    import src.influxDBAggregator as influxDBAggregator
+
+    assert influxDBAggregator.parse_functions("last, min,min") == ["min", "last"]
+    with pytest.raises(ValueError, match="Unknown aggregate functions"):
+        influxDBAggregator.parse_functions("median")
+    with pytest.raises(ValueError, match="must be positive"):
+        create_aggregator(window=0)
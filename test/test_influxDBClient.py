@@ -0,0 +1,175 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import ssl
+import sys
+import pytest
+
+from test.fakeInfluxDBServer import FakeInfluxDBServer
+
+sys.path.append("src/")
+
+
+def signed_in_client(server):
+    import src.influxDBClient as influxDBClient
+
+    client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+    client.signin("test_username", "test_password")
+    return client
+
+
+def test_get_authorizations_over_one_connection():
+    with FakeInfluxDBServer() as server:
+        server.add_org("greengrass")
+        server.add_authorization("test's Token", token="testAdminToken")
+        server.add_authorization("greengrass_read", token="testROToken")
+
+        client = signed_in_client(server)
+        for _ in range(5):
+            authorizations = client.get_authorizations()
+        client.close()
+
+        assert [auth["token"] for auth in authorizations] == ["testAdminToken", "testROToken"]
+        assert server.connection_count == 1
+
+
+def test_get_buckets():
+    with FakeInfluxDBServer() as server:
+        server.add_org("greengrass")
+        bucket = server.add_bucket("greengrass-telemetry")
+        client = signed_in_client(server)
+
+        assert client.get_buckets(name="greengrass-telemetry") == [bucket]
+        assert client.get_buckets(name="missing") == []
+        assert server.requests[-1][2]["name"] == "missing"
+
+
+def test_write_gzipped_line_protocol():
+    with FakeInfluxDBServer() as server:
+        server.add_org("greengrass")
+        client = signed_in_client(server)
+        client.write("greengrass", "greengrass-telemetry", b"cpu value=1 1\ncpu value=2 2", precision="s")
+        client.write("greengrass", "greengrass-telemetry", b"cpu value=3 3", precision="s", compress=False)
+
+        assert server.writes == [
+            ("greengrass", "greengrass-telemetry", "s", ["cpu value=1 1", "cpu value=2 2"]),
+            ("greengrass", "greengrass-telemetry", "s", ["cpu value=3 3"]),
+        ]
+        assert server.connection_count == 1
+
+
+def test_token_auth():
+    with FakeInfluxDBServer() as server:
+        server.add_org("greengrass")
+        server.add_authorization("test's Token", token="testAdminToken")
+
+        import src.influxDBClient as influxDBClient
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http", token="testAdminToken")
+        assert len(client.get_authorizations()) == 1
+
+
+def test_unauthorized():
+    with FakeInfluxDBServer() as server:
+        import src.influxDBClient as influxDBClient
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+
+        with pytest.raises(influxDBClient.InfluxDBAPIError) as error:
+            client.signin("test_username", "wrong_password")
+        assert error.value.status == 401
+
+        with pytest.raises(influxDBClient.InfluxDBAPIError, match='401'):
+            client.get_authorizations()
+
+
+def test_is_retryable_error():
+    import http.client
+    import src.influxDBClient as influxDBClient
+
+    def api_error(status):
+        return influxDBClient.InfluxDBAPIError("POST", "/api/v2/write", status, "")
+
+    for error in [ConnectionRefusedError(), http.client.RemoteDisconnected(), api_error(503), api_error(429),
+                  api_error(401)]:
+        assert influxDBClient.is_retryable_error(error)
+    for error in [ValueError(), api_error(400), api_error(404), api_error(413), api_error(422)]:
+        assert not influxDBClient.is_retryable_error(error)
+
+
+def test_health():
+    with FakeInfluxDBServer() as server:
+        import src.influxDBClient as influxDBClient
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+
+        assert client.health()["status"] == "pass"
+        server.set_healthy(False)
+        assert client.health()["status"] == "fail"
+
+
+def test_tls_settings():
+    import src.influxDBClient as influxDBClient
+
+    client = influxDBClient.InfluxDBClient("127.0.0.1", 8086, server_protocol="https", skip_tls_verify=True)
+    assert client.url == "https://127.0.0.1:8086"
+    assert client.ssl_context.verify_mode == ssl.CERT_NONE
+    assert not client.ssl_context.check_hostname
+
+    client = influxDBClient.InfluxDBClient("127.0.0.1", 8086, server_protocol="https", skip_tls_verify=False)
+    assert client.ssl_context.verify_mode == ssl.CERT_REQUIRED
+
+    client = influxDBClient.InfluxDBClient("127.0.0.1", 8086, server_protocol="http")
+    assert client.ssl_context is None
+
+    with pytest.raises(ValueError, match='Unsupported server protocol'):
+        influxDBClient.InfluxDBClient("127.0.0.1", 8086, server_protocol="ftp")
+
+
+def test_verify_tls_server_name(tmp_path):
+    import shutil
+    import subprocess
+    import src.influxDBClient as influxDBClient
+
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is not installed")
+    cert = str(tmp_path / "cert.pem")
+    key = str(tmp_path / "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+                    "-days", "1", "-subj", "/CN=greengrass_InfluxDB", "-addext", "subjectAltName=DNS:greengrass_InfluxDB"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert, key)
+
+    with FakeInfluxDBServer(ssl_context=server_context) as server:
+        # The certificate is verified against the container name, while connecting to the port published on the host
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_hostname="greengrass_InfluxDB")
+        client.ssl_context.load_verify_locations(cert)
+        assert client.health()["status"] == "pass"
+
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port)
+        client.ssl_context.load_verify_locations(cert)
+        with pytest.raises(ssl.SSLError):
+            client.health()
+
+
+def test_get_client_host():
+    import src.influxDBClient as influxDBClient
+
+    assert influxDBClient.get_client_host("0.0.0.0") == "127.0.0.1"
+    assert influxDBClient.get_client_host("192.168.1.10") == "192.168.1.10"
+
+
+def test_metrics():
+    with FakeInfluxDBServer() as server:
+        server.set_metrics("# TYPE go_goroutines gauge\ngo_goroutines 42\n")
+
+        import src.influxDBClient as influxDBClient
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+        assert client.metrics() == "# TYPE go_goroutines gauge\ngo_goroutines 42\n"
+
+
+def test_query():
+    with FakeInfluxDBServer() as server:
+        server.add_org("greengrass")
+        server.set_query_result("#datatype,string,long\n,result,table\n")
+        client = signed_in_client(server)
+        assert client.query("greengrass", "buckets()") == "#datatype,string,long\n,result,table\n"
+        assert server.queries == [("greengrass", "buckets()")]
@@ -0,0 +1,151 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import subprocess
+import sys
+from argparse import Namespace
+
+import pytest
+
+sys.path.append("src/")
+
+
+class FakeDocker:
+    def __init__(self, container=None, error=None):
+        self.container = container
+        self.error = error
+        self.commands = []
+
+    def __call__(self, arguments):
+        self.commands.append(arguments)
+        if arguments[:2] == ["container", "inspect"]:
+            if self.error is not None:
+                raise subprocess.CalledProcessError(1, ["docker"] + arguments, "", self.error)
+            if self.container is None:
+                raise subprocess.CalledProcessError(1, ["docker"] + arguments, "", "Error: No such container: influxdb")
+            return json.dumps([self.container])
+        return ""
+
+
+def get_test_args(server_protocol="https", warm_restart="true", influxdb_port="8086", tuning_profile="default",
+                  memory_limit="", cpu_limit=""):
+    return Namespace(
+        container_name="greengrass_InfluxDB",
+        influxdb_port=influxdb_port,
+        influxdb_interface="127.0.0.1",
+        bridge_network_name="greengrass-telemetry-bridge",
+        influxdb_mount_path="/home/ggc_user/dashboard",
+        server_protocol=server_protocol,
+        warm_restart=warm_restart,
+        tuning_profile=tuning_profile,
+        memory_limit=memory_limit,
+        cpu_limit=cpu_limit
+    )
+
+
+def get_container(args, running=True):
+    import src.influxDBContainer as influxDBContainer
+
+    config_hash = influxDBContainer.get_config_hash(influxDBContainer.get_run_options(args))
+    return {"State": {"Running": running}, "Config": {"Labels": {influxDBContainer.CONFIG_HASH_LABEL: config_hash}}}
+
+
+def test_create_container():
+    import src.influxDBContainer as influxDBContainer
+
+    args = get_test_args()
+    docker = FakeDocker()
+    assert influxDBContainer.start_container(args, docker) == "created"
+    run = docker.commands[-1]
+    assert run[:5] == ["run", "-d", "--name", "greengrass_InfluxDB", "--label"]
+    assert run[5] == influxDBContainer.CONFIG_HASH_LABEL + "=" + get_container(args)["Config"]["Labels"][
+        influxDBContainer.CONFIG_HASH_LABEL]
+    assert "INFLUXD_TLS_CERT=/etc/ssl/greengrass/influxdb.crt" in run
+    assert run[-1] == influxDBContainer.IMAGE
+
+
+def test_reuse_container_with_same_config():
+    import src.influxDBContainer as influxDBContainer
+
+    args = get_test_args()
+    docker = FakeDocker(get_container(args))
+    assert influxDBContainer.start_container(args, docker) == "running"
+    assert len(docker.commands) == 1
+
+    docker = FakeDocker(get_container(args, running=False))
+    assert influxDBContainer.start_container(args, docker) == "restarted"
+    assert docker.commands[-1] == ["start", "greengrass_InfluxDB"]
+
+
+def test_recreate_container():
+    import src.influxDBContainer as influxDBContainer
+
+    # The configuration changed
+    docker = FakeDocker(get_container(get_test_args(influxdb_port="8087")))
+    assert influxDBContainer.start_container(get_test_args(), docker) == "created"
+    assert docker.commands[1] == ["rm", "--force", "greengrass_InfluxDB"]
+
+    # The container was created without a label
+    docker = FakeDocker({"State": {"Running": True}, "Config": {"Labels": None}})
+    assert influxDBContainer.start_container(get_test_args(), docker) == "created"
+
+    # Warm restart is disabled
+    docker = FakeDocker(get_container(get_test_args(warm_restart="false")))
+    assert influxDBContainer.start_container(get_test_args(warm_restart="false"), docker) == "created"
+    assert docker.commands[1][0] == "rm"
+
+
+def test_config_hash():
+    import src.influxDBContainer as influxDBContainer
+
+    https_options = influxDBContainer.get_run_options(get_test_args())
+    http_options = influxDBContainer.get_run_options(get_test_args(server_protocol="http"))
+    assert influxDBContainer.get_config_hash(https_options) == influxDBContainer.get_config_hash(list(https_options))
+    assert influxDBContainer.get_config_hash(https_options) != influxDBContainer.get_config_hash(http_options)
+    assert influxDBContainer.get_config_hash(https_options) != influxDBContainer.get_config_hash(https_options, "other")
+
+
+def test_docker_errors():
+    import src.influxDBContainer as influxDBContainer
+
+    docker = FakeDocker(error="Cannot connect to the Docker daemon")
+    with pytest.raises(subprocess.CalledProcessError):
+        influxDBContainer.start_container(get_test_args(), docker)
+    assert len(docker.commands) == 1
+
+
+def test_tuning_profile():
+    import src.influxDBContainer as influxDBContainer
+
+    options = influxDBContainer.get_run_options(get_test_args(tuning_profile="low-memory", memory_limit="512M",
+                                                              cpu_limit="1.0"))
+    assert "INFLUXD_STORAGE_CACHE_MAX_MEMORY_SIZE=67108864" in options
+    assert "INFLUXD_STORAGE_WAL_FSYNC_DELAY=100ms" in options
+    assert options[-4:] == ["--memory", "512m", "--cpus", "1"]
+    # The default profile only sets TLS
+    assert [option for option in influxDBContainer.get_run_options(get_test_args())
+            if option.startswith("INFLUXD_")] == ["INFLUXD_TLS_CERT=/etc/ssl/greengrass/influxdb.crt",
+                                                  "INFLUXD_TLS_KEY=/etc/ssl/greengrass/influxdb.key"]
+
+    # Changing the profile recreates the container
+    docker = FakeDocker(get_container(get_test_args()))
+    assert influxDBContainer.start_container(get_test_args(tuning_profile="balanced"), docker) == "created"
+
+
+def test_invalid_tuning():
+    import src.influxDBContainer as influxDBContainer
+
+    with pytest.raises(ValueError, match="Unknown tuning profile"):
+        influxDBContainer.get_run_options(get_test_args(tuning_profile="tiny"))
+    with pytest.raises(ValueError, match="needs a container memory limit of at least 1024m"):
+        influxDBContainer.get_run_options(get_test_args(tuning_profile="balanced", memory_limit="512m"))
+    with pytest.raises(ValueError, match="Invalid container memory limit"):
+        influxDBContainer.parse_memory_limit("1.5g")
+    with pytest.raises(ValueError, match="below the minimum"):
+        influxDBContainer.parse_memory_limit("4m")
+    assert influxDBContainer.parse_memory_limit("1G") == 1024 ** 3
+    with pytest.raises(ValueError, match="must be positive"):
+        influxDBContainer.parse_cpu_limit("0")
+    with pytest.raises(ValueError, match="more than the 2 CPUs"):
+        influxDBContainer.parse_cpu_limit("4", 2)
@@ -0,0 +1,32 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+
+from awsiot.greengrasscoreipc.model import (
+    JsonMessage,
+    SubscriptionResponseMessage
+)
+
+sys.path.append("src/")
+
+
+def testHandleRefreshTokensEvent(mocker):
+    import src.influxDBControlStreamHandler as controlHandler
+
+    token_refresher = mocker.Mock()
+    handler = controlHandler.InfluxDBControlStreamHandler(token_refresher)
+    message = JsonMessage(message={"action": "RefreshTokens"})
+    handler.on_stream_event(SubscriptionResponseMessage(json_message=message))
+    assert token_refresher.request_refresh.call_count == 1
+
+
+def testHandleInvalidControlEvent(mocker):
+    import src.influxDBControlStreamHandler as controlHandler
+
+    token_refresher = mocker.Mock()
+    handler = controlHandler.InfluxDBControlStreamHandler(token_refresher)
+    handler.on_stream_event(SubscriptionResponseMessage(json_message=JsonMessage(message={"action": "invalid"})))
+    handler.on_stream_event(SubscriptionResponseMessage(json_message=JsonMessage(message={})))
+    handler.on_stream_event(None)
+    assert not token_refresher.request_refresh.called
@@ -0,0 +1,203 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import pytest
+
+from awsiot.greengrasscoreipc.model import (
+    BinaryMessage,
+    JsonMessage,
+    SubscriptionResponseMessage
+)
+
+from test.fakeClock import FakeClock
+from test.fakeWriter import FakeWriter
+
+sys.path.append("src/")
+
+NOW = 1700000000 * 10 ** 9
+
+
+def create_gateway(writer, **kwargs):
+    from src.influxDBMetrics import MetricsRegistry
+    import src.influxDBIngestGateway as influxDBIngestGateway
+
+    registry = MetricsRegistry()
+    kwargs.setdefault("wall_clock", FakeClock(NOW))
+    gateway = influxDBIngestGateway.InfluxDBIngestGateway(
+        writer, "greengrass", "greengrass-telemetry", metrics_registry=registry, **kwargs)
+    return gateway, registry
+
+
+def test_batches_by_size_and_bucket():
+    writer = FakeWriter()
+    gateway, registry = create_gateway(writer, batch_size=3, flush_interval=60)
+    gateway.start()
+
+    assert gateway.add_message({"lines": "cpu value=1 1\ncpu value=2 2"}) == 2
+    assert gateway.add_message({"bucket": "app1", "points": [{"measurement": "mem", "fields": {"value": 1}}]}) == 1
+    assert gateway.add_message({"measurement": "cpu", "fields": {"value": 3}, "time": 3}) == 1
+    gateway.join()
+    assert writer.writes == [
+        ("greengrass", "greengrass-telemetry", "ns", ["cpu value=1 1", "cpu value=2 2", "cpu value=3i 3"])]
+
+    gateway.stop()
+    assert writer.writes[1] == ("greengrass", "app1", "ns", ["mem value=1i 1700000000000000000"])
+    assert registry.counter("influxdb_ingest_points_written_total", "").get() == 4
+    assert registry.histogram("influxdb_ingest_batch_points", "").get_count() == 2
+
+
+def test_flush_after_interval():
+    writer = FakeWriter()
+    gateway, registry = create_gateway(writer, batch_size=1000, flush_interval=0.05)
+    gateway.start()
+    gateway.add_text("cpu value=1 1")
+    assert writer.written.wait(5)
+    gateway.stop()
+    assert writer.writes == [("greengrass", "greengrass-telemetry", "ns", ["cpu value=1 1"])]
+
+
+def test_invalid_messages():
+    writer = FakeWriter()
+    gateway, registry = create_gateway(writer, batch_size=1, precision="s")
+
+    assert gateway.add_message({"points": [{"measurement": "cpu", "fields": {"value": 1}}, {"fields": {}}]}) == 0
+    assert gateway.add_message({"lines": "cpu value=1", "precision": "hours"}) == 0
+    assert gateway.add_text("cpu") == 0
+    assert gateway.pending.qsize() == 0
+    assert registry.counter("influxdb_ingest_invalid_messages_total", "").get() == 3
+
+    with pytest.raises(ValueError, match="Unknown precision"):
+        create_gateway(writer, precision="hours")
+    with pytest.raises(ValueError, match="batch size"):
+        create_gateway(writer, batch_size=0)
+
+
+def test_invalid_lines_do_not_reject_other_messages():
+    writer = FakeWriter()
+    gateway, registry = create_gateway(writer, batch_size=2)
+    gateway.start()
+
+    assert gateway.add_message({"lines": "cpu value=1 1"}) == 1
+    assert gateway.add_message({"lines": ["mem value=2 2", "mem value= 3"]}) == 0
+    assert gateway.add_text("disk value=\"open 4") == 0
+    assert gateway.add_text("cpu value=5 5") == 1
+    gateway.stop()
+    assert writer.writes == [("greengrass", "greengrass-telemetry", "ns", ["cpu value=1 1", "cpu value=5 5"])]
+    assert registry.counter("influxdb_ingest_invalid_messages_total", "").get() == 2
+
+
+def test_reject_unwritable_buckets():
+    writer = FakeWriter()
+    gateway, registry = create_gateway(
+        writer, batch_size=1, is_writable=lambda org, bucket: (org, bucket) == ("greengrass", "greengrass-telemetry"))
+
+    assert gateway.add_message({"org": "other", "lines": "cpu value=1"}) == 0
+    assert gateway.add_message({"bucket": "_monitoring", "lines": "cpu value=1\ncpu value=2"}) == 0
+    assert gateway.add_text("cpu value=3") == 1
+    gateway.start()
+    gateway.stop()
+    assert writer.writes == [("greengrass", "greengrass-telemetry", "ns", ["cpu value=3 1700000000000000000"])]
+    assert registry.counter("influxdb_ingest_invalid_messages_total", "").get() == 2
+    assert registry.counter("influxdb_ingest_points_dropped_total", "", ["reason"]).get(reason="unknown_bucket") == 3
+
+
+def test_drop_oldest_batch_when_queue_is_full():
+    writer = FakeWriter()
+    gateway, registry = create_gateway(writer, batch_size=1, max_pending_batches=2)
+    for i in range(3):
+        gateway.add_text("cpu value={}".format(i))
+    gateway.start()
+    gateway.stop()
+    assert [lines for _, _, _, lines in writer.writes] == [
+        ["cpu value=1 1700000000000000000"], ["cpu value=2 1700000000000000000"]]
+    assert registry.counter("influxdb_ingest_points_dropped_total", "", ["reason"]).get(reason="queue_full") == 1
+
+
+def test_write_errors_are_counted():
+    writer = FakeWriter(fail=True)
+    gateway, registry = create_gateway(writer, batch_size=2)
+    gateway.start()
+    gateway.add_text("cpu value=1\ncpu value=2")
+    gateway.stop()
+    assert registry.counter("influxdb_ingest_points_dropped_total", "", ["reason"]).get(reason="write_error") == 2
+
+
+def test_rejected_writes_are_not_buffered(tmp_path):
+    import src.influxDBWriteBuffer as influxDBWriteBuffer
+    from src.influxDBClient import InfluxDBAPIError
+
+    def writer(org, bucket, data, precision):
+        raise InfluxDBAPIError("POST", "/api/v2/write", 404, "bucket not found")
+
+    write_buffer = influxDBWriteBuffer.InfluxDBWriteBuffer(str(tmp_path), writer, lambda: True)
+    gateway, registry = create_gateway(writer, batch_size=2, write_buffer=write_buffer)
+    gateway.start()
+    gateway.add_text("cpu value=1 1\ncpu value=2 2")
+    gateway.stop()
+    assert registry.counter("influxdb_ingest_points_dropped_total", "", ["reason"]).get(reason="rejected") == 2
+    assert write_buffer.is_empty()
+    write_buffer.stop()
+
+
+def test_ingest_stream_handler():
+    import src.influxDBIngestGateway as influxDBIngestGateway
+
+    writer = FakeWriter()
+    gateway, registry = create_gateway(writer, batch_size=10)
+    handler = influxDBIngestGateway.InfluxDBIngestStreamHandler(gateway)
+    handler.on_stream_event(SubscriptionResponseMessage(json_message=JsonMessage(message={"lines": ["cpu value=1"]})))
+    handler.on_stream_event(SubscriptionResponseMessage(binary_message=BinaryMessage(message=b"cpu value=2")))
+    gateway.start()
+    gateway.stop()
+    assert writer.writes == [
+        ("greengrass", "greengrass-telemetry", "ns", ["cpu value=1 1700000000000000000", "cpu value=2 1700000000000000000"])]
+
+
+def test_buffer_failed_writes(tmp_path):
+    import src.influxDBWriteBuffer as influxDBWriteBuffer
+
+    writer = FakeWriter(fail=True)
+    write_buffer = influxDBWriteBuffer.InfluxDBWriteBuffer(str(tmp_path), writer, lambda: True)
+    gateway, registry = create_gateway(writer, batch_size=2, write_buffer=write_buffer)
+    gateway.start()
+    gateway.add_text("cpu value=1 1\ncpu value=2 2")
+    gateway.stop()
+    assert registry.counter("influxdb_ingest_points_dropped_total", "", ["reason"]).get(reason="write_error") == 0
+    assert sum(write_buffer.segment_points.values()) == 2
+    write_buffer.stop()
+
+
+def test_replay_keeps_arrival_time(tmp_path):
+    import src.influxDBWriteBuffer as influxDBWriteBuffer
+
+    writer = FakeWriter(fail=True)
+    wall_clock = FakeClock(NOW)
+    write_buffer = influxDBWriteBuffer.InfluxDBWriteBuffer(str(tmp_path), writer, lambda: True)
+    gateway, registry = create_gateway(writer, batch_size=10, precision="ms", write_buffer=write_buffer,
+                                       wall_clock=wall_clock)
+    gateway.start()
+    gateway.add_text("cpu value=1")
+    gateway.stop()
+
+    # InfluxDB comes back an hour later
+    wall_clock.now += 3600 * 10 ** 9
+    writer.fail = False
+    write_buffer.start()
+    assert writer.written.wait(5)
+    write_buffer.stop()
+    assert writer.writes == [("greengrass", "greengrass-telemetry", "ms", ["cpu value=1 1700000000000"])]
+
+
+def test_aggregate_before_writing():
+    from src.influxDBMetrics import MetricsRegistry
+    import src.influxDBAggregator as influxDBAggregator
+
+    writer = FakeWriter()
+    aggregator = influxDBAggregator.InfluxDBAggregator(60, functions=["mean"], metrics_registry=MetricsRegistry())
+    gateway, registry = create_gateway(writer, batch_size=10, precision="s", aggregator=aggregator)
+    gateway.start()
+    gateway.add_text("cpu value=1 1700000000\ncpu value=3 1700000001")
+    gateway.stop()
+    assert writer.writes == [("greengrass", "greengrass-telemetry", "ns", ["cpu value_mean=2.0 1699999980000000000"])]
+    assert registry.counter("influxdb_ingest_points_received_total", "").get() == 2
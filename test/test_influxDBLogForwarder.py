@@ -0,0 +1,76 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import sys
+import pytest
+
+from test.fakeClock import FakeClock
+
+sys.path.append("src/")
+
+REQUEST_LINE = 'ts=2021-11-11T19:55:59.847535Z lvl=info msg=Unauthorized log_id=0XkE00UW000 error="authorization not found"'
+
+
+def create_forwarder(**kwargs):
+    import src.influxDBLogForwarder as influxDBLogForwarder
+
+    output = io.StringIO()
+    clock = FakeClock(0)
+    forwarder = influxDBLogForwarder.LogForwarder(output, clock=clock, **kwargs)
+    return forwarder, output, clock
+
+
+def test_parse_logfmt():
+    import src.influxDBLogForwarder as influxDBLogForwarder
+
+    assert influxDBLogForwarder.parse_logfmt(REQUEST_LINE) == {
+        "ts": "2021-11-11T19:55:59.847535Z", "lvl": "info", "msg": "Unauthorized", "log_id": "0XkE00UW000",
+        "error": "authorization not found"}
+    assert influxDBLogForwarder.parse_logfmt('msg="say \\"hi\\"" empty=') == {"msg": 'say "hi"', "empty": ""}
+    assert influxDBLogForwarder.get_level({"lvl": "WARNING"}) == "warn"
+    assert influxDBLogForwarder.get_level({}) == "info"
+
+
+def test_filter_level_and_pattern():
+    forwarder, output, _ = create_forwarder(min_level="warn", exclude_pattern="msg=\"Flux query failed\"")
+    assert not forwarder.forward(REQUEST_LINE)
+    assert not forwarder.forward('lvl=warn msg="Flux query failed" err="unauthorized"')
+    assert forwarder.forward('lvl=error msg="Failed to open shard"')
+    # Lines that are not logfmt are forwarded at the default level
+    assert not forwarder.forward("Command \"print-config\" is deprecated")
+    assert output.getvalue() == 'lvl=error msg="Failed to open shard"\n'
+
+    with pytest.raises(ValueError, match="Unknown log level"):
+        create_forwarder(min_level="verbose")
+
+
+def test_rate_limit_per_message():
+    forwarder, output, clock = create_forwarder(rate_limit=2, rate_interval=60)
+    forwarded = [forwarder.forward(REQUEST_LINE) for _ in range(5)]
+    assert forwarded == [True, True, False, False, False]
+    assert forwarder.forward('lvl=info msg="Listening" service=tcp-listener')
+
+    # The summary is written with the first line of the next interval
+    clock.now = 60
+    assert forwarder.forward(REQUEST_LINE)
+    assert output.getvalue().splitlines() == [
+        REQUEST_LINE, REQUEST_LINE, 'lvl=info msg="Listening" service=tcp-listener',
+        'lvl=info msg="Suppressed 3 InfluxDB log lines in the last 60s" suppressed_msg="Unauthorized"',
+        REQUEST_LINE]
+
+
+def test_sample_suppressed_lines():
+    forwarder, output, _ = create_forwarder(rate_limit=1, sample_every=2)
+    forwarded = [forwarder.forward(REQUEST_LINE) for _ in range(6)]
+    assert forwarded == [True, False, True, False, True, False]
+    forwarder.flush()
+    assert output.getvalue().splitlines()[-1] == \
+        'lvl=info msg="Suppressed 3 InfluxDB log lines in the last 60s" suppressed_msg="Unauthorized"'
+
+
+def test_run_until_end_of_stream():
+    forwarder, output, _ = create_forwarder(rate_limit=1)
+    forwarder.run(io.StringIO("{}\r\n{}\n".format(REQUEST_LINE, REQUEST_LINE)))
+    assert output.getvalue().splitlines() == [
+        REQUEST_LINE, 'lvl=info msg="Suppressed 1 InfluxDB log lines in the last 60s" suppressed_msg="Unauthorized"']
@@ -0,0 +1,104 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import urllib.request
+import pytest
+
+sys.path.append("src/")
+
+
+def test_render_counters_and_gauges():
+    import src.influxDBMetrics as influxDBMetrics
+
+    registry = influxDBMetrics.MetricsRegistry()
+    counter = registry.counter("test_requests_total", "Test requests.", ["action"])
+    counter.inc(action="read")
+    counter.inc(2, action="write")
+    registry.gauge("test_depth", "Test depth.").set(3)
+    registry.callback_gauge("test_callback", "Test callback.", lambda: 1.5)
+
+    assert registry.counter("test_requests_total", "Test requests.", ["action"]) is counter
+    assert registry.render().splitlines() == [
+        '# HELP test_callback Test callback.',
+        '# TYPE test_callback gauge',
+        'test_callback 1.5',
+        '# HELP test_depth Test depth.',
+        '# TYPE test_depth gauge',
+        'test_depth 3',
+        '# HELP test_requests_total Test requests.',
+        '# TYPE test_requests_total counter',
+        'test_requests_total{action="read"} 1',
+        'test_requests_total{action="write"} 2',
+    ]
+    assert registry.summarize() == {
+        "test_callback": 1.5,
+        "test_depth": 3,
+        "test_requests_total": {"read": 1, "write": 2}
+    }
+
+
+def test_metric_validation():
+    import src.influxDBMetrics as influxDBMetrics
+
+    registry = influxDBMetrics.MetricsRegistry()
+    counter = registry.counter("test_total", "Test.", ["action"])
+    with pytest.raises(ValueError, match="expects labels"):
+        counter.inc(reason="test")
+    with pytest.raises(ValueError, match="already registered as a counter"):
+        registry.gauge("test_total", "Test.")
+
+
+def test_histogram_buckets_are_cumulative():
+    import src.influxDBMetrics as influxDBMetrics
+
+    registry = influxDBMetrics.MetricsRegistry()
+    histogram = registry.histogram("test_latency_seconds", "Test latency.", buckets=(0.1, 1))
+    for value in [0.05, 0.1, 0.5, 2]:
+        histogram.observe(value)
+
+    assert histogram.get_count() == 4
+    assert registry.render().splitlines()[2:] == [
+        'test_latency_seconds_bucket{le="0.1"} 2',
+        'test_latency_seconds_bucket{le="1"} 3',
+        'test_latency_seconds_bucket{le="+Inf"} 4',
+        'test_latency_seconds_sum 2.65',
+        'test_latency_seconds_count 4',
+    ]
+    assert registry.summarize() == {"test_latency_seconds": {"count": 4, "sum": 2.65}}
+
+
+def test_metrics_http_server():
+    import src.influxDBMetrics as influxDBMetrics
+
+    registry = influxDBMetrics.MetricsRegistry()
+    registry.counter("test_total", "Test.").inc()
+    server = influxDBMetrics.MetricsHTTPServer("127.0.0.1", 0, registry)
+    server.start()
+    try:
+        url = "http://127.0.0.1:{}".format(server.server_address[1])
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"] == influxDBMetrics.PROMETHEUS_CONTENT_TYPE
+            assert "test_total 1" in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other")
+    finally:
+        server.stop()
+
+
+def test_metrics_summary_publisher():
+    import src.influxDBMetrics as influxDBMetrics
+
+    registry = influxDBMetrics.MetricsRegistry()
+    registry.counter("test_total", "Test.").inc()
+    published = []
+    publisher = influxDBMetrics.MetricsSummaryPublisher(published.append, 60, registry)
+    publisher.publish()
+    assert published[0]["metrics"] == {"test_total": 1}
+    assert isinstance(published[0]["timestamp"], int)
+
+    failing_publisher = influxDBMetrics.MetricsSummaryPublisher(lambda summary: 1 / 0, 60, registry)
+    failing_publisher.publish()
+
+    with pytest.raises(ValueError, match="must be positive"):
+        influxDBMetrics.MetricsSummaryPublisher(published.append, 0, registry)
@@ -0,0 +1,142 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+from collections import namedtuple
+
+import pytest
+
+from test.fakeClock import FakeClock
+from test.fakeInfluxDBServer import FakeInfluxDBServer
+
+sys.path.append("src/")
+
+DiskUsage = namedtuple("DiskUsage", ["total", "used", "free"])
+
+METRICS = """# HELP http_api_requests_total Number of http requests received
+# TYPE http_api_requests_total counter
+http_api_requests_total{{handler="platform",method="POST",path="/api/v2/write",response_code="204",status="2XX"}} {writes}
+http_api_requests_total{{handler="platform",method="POST",path="/api/v2/write",response_code="400",status="4XX"}} 2
+http_api_requests_total{{handler="platform",method="POST",path="/api/v2/query",response_code="200",status="2XX"}} 10
+storage_cache_inuse_bytes{{bucket="a",engine="tsm1",id="1",path="/var/lib/influxdb2/engine/data/a/autogen/1"}} 1000
+storage_cache_inuse_bytes{{bucket="b",engine="tsm1",id="2",path="/var/lib/influxdb2/engine/data/b/autogen/2"}} 24
+storage_compactions_queued{{bucket="a",engine="tsm1",id="1",level="1"}} {queued}
+storage_bucket_series_num{{bucket="a"}} 300
+"""
+
+
+def create_monitor(server, **kwargs):
+    from src.influxDBClient import InfluxDBClient
+    from src.influxDBMetrics import MetricsRegistry
+    import src.influxDBMonitor as influxDBMonitor
+
+    published = []
+    clock = FakeClock(0)
+    registry = MetricsRegistry()
+    client = InfluxDBClient("127.0.0.1", server.port, server_protocol="http", timeout=2)
+    monitor = influxDBMonitor.InfluxDBMonitor(
+        client, published.append, 30, "/greengrass", clock=clock,
+        disk_usage=lambda path: DiskUsage(1000, 400, 600), metrics_registry=registry, **kwargs)
+    return monitor, published, clock, registry
+
+
+def test_publish_changes_only():
+    with FakeInfluxDBServer() as server:
+        server.set_metrics(METRICS.format(writes=100, queued=0))
+        monitor, published, clock, registry = create_monitor(server)
+        monitor.check()
+        assert published == [dict(published[0], health="pass", writeRate=None, queryRate=None, cacheBytes=1024,
+                                  compactionsQueued=0, series=300, diskUsedPercent=40.0, diskFreeBytes=600)]
+
+        # The rates appear on the second check
+        clock.now = 10
+        server.set_metrics(METRICS.format(writes=200, queued=1))
+        monitor.check()
+        assert len(published) == 2
+        assert published[1]["writeRate"] == 10.0 and published[1]["queryRate"] == 0.0
+
+        # Changes smaller than the deltas are not published
+        clock.now = 20
+        server.set_metrics(METRICS.format(writes=300, queued=2))
+        monitor.check()
+        assert len(published) == 2
+
+        clock.now = 30
+        server.set_metrics(METRICS.format(writes=400, queued=3))
+        monitor.check()
+        assert len(published) == 3
+        assert published[2]["compactionsQueued"] == 3
+        assert registry.counter("influxdb_monitor_statuses_published_total", "").get() == 3
+
+
+def test_publish_health_changes():
+    with FakeInfluxDBServer() as server:
+        monitor, published, clock, registry = create_monitor(server)
+        monitor.check()
+        server.set_healthy(False)
+        monitor.check()
+        assert [status["health"] for status in published] == ["pass", "fail"]
+        assert registry.render().count("influxdb_monitor_healthy 0") == 1
+
+    # The server has stopped, and its keep-alive connections are closed
+    monitor.influxdb_client.close()
+    monitor.check()
+    assert published[-1]["health"] == "unreachable"
+    assert published[-1]["cacheBytes"] is None
+    assert registry.counter("influxdb_monitor_scrape_errors_total", "", ["source"]).get(source="health") == 1
+
+
+def test_publish_again_after_failure():
+    with FakeInfluxDBServer() as server:
+        monitor, published, clock, registry = create_monitor(server)
+        monitor.check()
+        server.set_healthy(False)
+
+        # The IPC connection is being restored, so the first publish of the failed health is lost
+        failures = [ConnectionError("test")]
+
+        def publish(status):
+            if failures:
+                raise failures.pop()
+            published.append(status)
+
+        monitor.publish_fn = publish
+        monitor.check()
+        assert [status["health"] for status in published] == ["pass"]
+        monitor.check()
+        assert [status["health"] for status in published] == ["pass", "fail"]
+        assert registry.counter("influxdb_monitor_statuses_published_total", "").get() == 2
+
+
+def test_rate_after_counter_reset():
+    with FakeInfluxDBServer() as server:
+        server.set_metrics(METRICS.format(writes=100, queued=0))
+        monitor, published, clock, registry = create_monitor(server)
+        monitor.check()
+        clock.now = 10
+        server.set_metrics(METRICS.format(writes=5, queued=0))
+        assert monitor.scrape()["writeRate"] is None
+
+
+def test_parse_metrics():
+    import src.influxDBMonitor as influxDBMonitor
+
+    samples = influxDBMonitor.parse_metrics('# TYPE a counter\na{path="/x",b="say \\"hi\\""} 2\na{path="/y"} 3 1700\n'
+                                            'b 1.5e3\nbad line\n')
+    assert samples == [("a", {"path": "/x", "b": 'say \\"hi\\"'}, 2.0), ("a", {"path": "/y"}, 3.0), ("b", {}, 1500.0)]
+    assert influxDBMonitor.sum_samples(samples, "a") == 5
+    assert influxDBMonitor.sum_samples(samples, "a", path="/y") == 3
+    assert influxDBMonitor.sum_samples(samples, "c") is None
+
+
+def test_parse_deltas():
+    import src.influxDBMonitor as influxDBMonitor
+
+    deltas = influxDBMonitor.parse_deltas("writeRate=20, diskUsedPercent=0.5")
+    assert deltas["writeRate"] == 20 and deltas["diskUsedPercent"] == 0.5
+    assert deltas["series"] == influxDBMonitor.DEFAULT_DELTAS["series"]
+    assert influxDBMonitor.parse_deltas("") == influxDBMonitor.DEFAULT_DELTAS
+    with pytest.raises(ValueError, match="Unknown monitor figure"):
+        influxDBMonitor.parse_deltas("memory=1")
+    with pytest.raises(ValueError, match="must not be negative"):
+        influxDBMonitor.parse_deltas("series=-1")
@@ -0,0 +1,177 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import threading
+import pytest
+
+from awsiot.greengrasscoreipc.model import JsonMessage, SubscriptionResponseMessage
+
+from test.fakeClock import FakeClock
+
+sys.path.append("src/")
+
+QUERY = 'from(bucket: "greengrass-telemetry")  // the main bucket\n  |> range(start: v.timeRangeStart)'
+REPLY_TOPIC = "test/query/response/dashboard"
+
+
+class FakeQuery:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.queries = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, org, flux):
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionRefusedError("test")
+        self.queries.append((org, flux))
+        return "result {}".format(len(self.queries))
+
+
+class FakePublisher:
+    def __init__(self):
+        self.responses = []
+        self.published = threading.Semaphore(0)
+
+    def __call__(self, topic, response):
+        self.responses.append((topic, response))
+        self.published.release()
+
+    def wait(self, count):
+        return all(self.published.acquire(timeout=5) for _ in range(count))
+
+
+def create_proxy(query, cache_bytes=1024, workers=2):
+    from src.influxDBMetrics import MetricsRegistry
+    import src.influxDBQueryProxy as influxDBQueryProxy
+
+    registry = MetricsRegistry()
+    clock = FakeClock(1000)
+    cache = influxDBQueryProxy.QueryCache(cache_bytes, clock=clock, metrics_registry=registry)
+    publisher = FakePublisher()
+    proxy = influxDBQueryProxy.InfluxDBQueryProxy(
+        query, publisher, "greengrass", "test/query/response/*", cache, workers=workers, metrics_registry=registry)
+    return proxy, publisher, clock, registry
+
+
+def request(query=QUERY, start="-1h", **kwargs):
+    message = {"query": query, "range": {"start": start}, "replyTopic": REPLY_TOPIC}
+    message.update(kwargs)
+    return message
+
+
+def test_cache_results():
+    query = FakeQuery()
+    proxy, publisher, clock, registry = create_proxy(query)
+
+    proxy.submit(request(correlationId="1"))
+    assert publisher.wait(1)
+    # Only whitespace and comments differ, so the cached result is used
+    proxy.submit(request('from(bucket: "greengrass-telemetry") |> range(start: v.timeRangeStart)', correlationId="2"))
+    assert publisher.wait(1)
+    proxy.stop()
+
+    assert query.queries == [("greengrass", "option v = {timeRangeStart: -1h, timeRangeStop: now()}\n" + QUERY)]
+    assert publisher.responses == [
+        (REPLY_TOPIC, {"status": "ok", "cached": False, "result": "result 1", "correlationId": "1"}),
+        (REPLY_TOPIC, {"status": "ok", "cached": True, "result": "result 1", "correlationId": "2"})]
+    assert registry.counter("influxdb_query_cache_hits_total", "").get() == 1
+    assert registry.counter("influxdb_query_cache_misses_total", "").get() == 1
+
+
+def test_ttl_aligned_to_range():
+    import src.influxDBQueryProxy as influxDBQueryProxy
+
+    assert influxDBQueryProxy.get_ttl(-3600, 0) == 60
+    assert influxDBQueryProxy.get_ttl(-300, 0) == 5
+    assert influxDBQueryProxy.get_ttl(-10, 0) == 1
+    assert influxDBQueryProxy.get_ttl(None, None) == 60
+
+    query = FakeQuery()
+    proxy, publisher, clock, registry = create_proxy(query, workers=1)
+    clock.now = 1003
+    proxy.submit(request(start="-5m"))
+    assert publisher.wait(1)
+    # The result expires at the next multiple of the 5 second TTL
+    clock.now = 1004.9
+    proxy.submit(request(start="-5m"))
+    assert publisher.wait(1)
+    clock.now = 1005
+    proxy.submit(request(start="-5m"))
+    assert publisher.wait(1)
+    proxy.stop()
+    assert [response["cached"] for _, response in publisher.responses] == [False, True, False]
+
+
+def test_evict_least_recently_used():
+    query = FakeQuery()
+    proxy, publisher, clock, registry = create_proxy(query, cache_bytes=len(QUERY) * 2 + 40, workers=1)
+    for start in ["-1h", "-2h", "-1h", "-3h", "-1h", "-2h"]:
+        proxy.submit(request(start=start))
+        assert publisher.wait(1)
+    proxy.stop()
+    assert [response["cached"] for _, response in publisher.responses] == [False, False, True, False, True, False]
+    assert registry.counter("influxdb_query_cache_evictions_total", "").get() == 2
+
+
+def test_share_concurrent_queries():
+    query = FakeQuery()
+    query.release.clear()
+    proxy, publisher, clock, registry = create_proxy(query, cache_bytes=0)
+    proxy.submit(request())
+    proxy.submit(request())
+    query.release.set()
+    assert publisher.wait(2)
+    proxy.stop()
+    assert len(query.queries) == 1
+    assert [response["result"] for _, response in publisher.responses] == ["result 1", "result 1"]
+
+
+def test_invalid_requests():
+    query = FakeQuery()
+    proxy, publisher, clock, registry = create_proxy(query)
+
+    proxy.submit(request(replyTopic="other/topic"))
+    proxy.submit(request(start="-1h) |> drop(columns: [\"_value\"]"))
+    proxy.submit(request(query=""))
+    assert publisher.wait(2)
+    proxy.stop()
+    assert query.queries == []
+    assert [response["status"] for _, response in publisher.responses] == ["error", "error"]
+    invalid_requests = registry.counter("influxdb_query_invalid_requests_total", "", ["reason"])
+    assert invalid_requests.get(reason="reply_topic_not_allowed") == 1
+    assert invalid_requests.get(reason="invalid_query") == 2
+
+
+def test_query_errors():
+    query = FakeQuery(fail=True)
+    proxy, publisher, clock, registry = create_proxy(query)
+    proxy.submit(request())
+    assert publisher.wait(1)
+    proxy.stop()
+    assert publisher.responses[0][1] == {"status": "error", "error": "test"}
+    assert registry.counter("influxdb_query_errors_total", "").get() == 1
+
+
+def test_parse_time():
+    import src.influxDBQueryProxy as influxDBQueryProxy
+
+    assert influxDBQueryProxy.parse_time("-1h30m") == -5400
+    assert influxDBQueryProxy.parse_time("now()") == 0
+    assert influxDBQueryProxy.parse_time("2021-01-01T00:00:00Z") is None
+    with pytest.raises(ValueError, match="Invalid time"):
+        influxDBQueryProxy.parse_time("yesterday")
+
+
+def test_query_stream_handler():
+    import src.influxDBQueryProxy as influxDBQueryProxy
+
+    query = FakeQuery()
+    proxy, publisher, clock, registry = create_proxy(query)
+    handler = influxDBQueryProxy.InfluxDBQueryStreamHandler(proxy)
+    handler.on_stream_event(SubscriptionResponseMessage(json_message=JsonMessage(message=request())))
+    assert publisher.wait(1)
+    proxy.stop()
+    assert publisher.responses[0][1]["result"] == "result 1"
@@ -0,0 +1,66 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import pytest
+
+from test.fakeClock import FakeClock
+from test.fakeInfluxDBServer import FakeInfluxDBServer
+
+sys.path.append("src/")
+
+
+def test_ready_against_fake_influxdb():
+    import src.influxDBClient as influxDBClient
+    import src.influxDBReadinessProbe as probe
+
+    with FakeInfluxDBServer() as server:
+        client = influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+        assert probe.is_ready(client)
+        server.set_healthy(False)
+        assert not probe.is_ready(client)
+
+
+def test_not_reachable(mocker):
+    import src.influxDBReadinessProbe as probe
+
+    client = mocker.Mock()
+    client.health.side_effect = ConnectionRefusedError("test")
+    assert not probe.is_ready(client)
+
+
+def test_wait_for_ready_backs_off(mocker):
+    import src.influxDBReadinessProbe as probe
+
+    client = mocker.Mock()
+    client.health.side_effect = [ConnectionRefusedError("test"), {"status": "fail"}, {"status": "fail"},
+                                 {"status": "fail"}, {"status": "fail"}, {"status": "pass"}]
+    fake_clock = FakeClock()
+    time_to_ready = probe.wait_for_ready(client, 1, 2, 60, sleep=fake_clock.sleep, clock=fake_clock)
+
+    # The interval doubles after each failed check, but never exceeds MAX_INTERVAL
+    assert fake_clock.sleeps == [1, 2, 4, 5, 5]
+    assert time_to_ready == 17
+    assert client.health.call_count == 6
+
+
+def test_wait_for_ready_deadline(mocker):
+    import src.influxDBReadinessProbe as probe
+
+    client = mocker.Mock()
+    client.health.return_value = {"status": "fail"}
+    fake_clock = FakeClock()
+    with pytest.raises(TimeoutError, match='not ready after 10'):
+        probe.wait_for_ready(client, 1, 2, 10, sleep=fake_clock.sleep, clock=fake_clock)
+
+    # The last sleep is cut short so that the deadline is respected
+    assert fake_clock.sleeps == [1, 2, 4, 3]
+
+
+def test_wait_for_ready_invalid_settings(mocker):
+    import src.influxDBReadinessProbe as probe
+
+    with pytest.raises(ValueError, match='Invalid readiness probe settings'):
+        probe.wait_for_ready(mocker.Mock(), 0, 2, 10)
+    with pytest.raises(ValueError, match='Invalid readiness probe settings'):
+        probe.wait_for_ready(mocker.Mock(), 1, 0.5, 10)
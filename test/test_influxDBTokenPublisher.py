@@ -5,7 +5,8 @@ import argparse
 import sys
 import pytest
 import json
-import subprocess
+
+from test.fakeInfluxDBServer import FakeInfluxDBServer
 
 sys.path.append("src/")
 
@@ -40,6 +41,21 @@ def test_parse_valid_args(mocker):
     assert mock_parse_args.call_count == 1
 
 
+def test_parse_optional_feature_defaults(mocker):
+    mocker.patch("sys.argv", ["influxDBTokenPublisher.py"] + [
+        "--{}=test".format(name) for name in [
+            "subscribe_topic", "publish_topic", "influxdb_container_name", "influxdb_org", "influxdb_bucket",
+            "influxdb_port", "influxdb_interface", "server_protocol", "skip_tls_verify", "secret_arn"]])
+    import src.influxDBTokenPublisher as publisher
+    from src.influxDBAggregator import AGGREGATE_FUNCTIONS
+    from src.lineProtocol import DEFAULT_PRECISION
+
+    # The defaults are inlined in the publisher, and must match the modules of the optional features
+    args = publisher.parse_arguments()
+    assert args.ingest_precision == DEFAULT_PRECISION
+    assert args.aggregation_functions == ",".join(AGGREGATE_FUNCTIONS)
+
+
 def test_parse_no_args(mocker):
     import src.influxDBTokenPublisher as publisher
 
@@ -62,27 +78,23 @@ def test_retrieve_secret_valid_response(mocker):
         skip_tls_verify="true"
         )
 
-    testProcessOutput = [{
+    testAuthorizations = [{
         "id": "testID",
         "description": "greengrass_readwrite",
         "token": "testToken",
         "status": "active",
-        "userName": "test",
         "userID": "testID",
-        "permissions": [
-            "read:orgs/7testorg",
-            "write:orgs/76ae57693d25fabf/buckets/testbucket"
-        ]
+        "permissions": []
     }]
-    completed_process = subprocess.CompletedProcess(args=[], stdout=json.dumps(testProcessOutput), returncode=0)
-    mock_subprocess_call = mocker.patch("subprocess.run", return_value=completed_process)
+    mock_client = mocker.Mock()
+    mock_client.get_authorizations.return_value = testAuthorizations
 
     import src.influxDBTokenPublisher as publisher
 
-    json_output = json.loads(publisher.retrieve_influxDB_token_json(testArgs))[0]
+    json_output = json.loads(publisher.retrieve_influxDB_token_json(testArgs, mock_client))[0]
     assert json_output['description'] == "greengrass_readwrite"
     assert json_output['token'] == "testToken"
-    assert mock_subprocess_call.call_count == 1
+    assert mock_client.get_authorizations.call_count == 1
 
 
 def test_retrieve_secret_invalid_response(mocker):
@@ -99,22 +111,17 @@ def test_retrieve_secret_invalid_response(mocker):
         skip_tls_verify="true"
         )
 
-    testProcessOutput = [{
+    testAuthorizations = [{
         "description": "greengrass_readwrite",
         "token": "",
     }]
-
-    completed_process = subprocess.CompletedProcess(
-        args=[],
-        stdout=json.dumps(testProcessOutput),
-        stderr="error",
-        returncode=0)
-    mocker.patch("subprocess.run", return_value=completed_process)
+    mock_client = mocker.Mock()
+    mock_client.get_authorizations.return_value = testAuthorizations
 
     import src.influxDBTokenPublisher as publisher
 
     with pytest.raises(SystemExit) as pytest_wrapped_e:
-        publisher.retrieve_influxDB_token_json(testArgs)
+        publisher.retrieve_influxDB_token_json(testArgs, mock_client)
     assert pytest_wrapped_e.type == SystemExit
 
 
@@ -132,14 +139,112 @@ def test_retrieve_secret_failed_response(mocker):
         skip_tls_verify="true"
         )
 
-    completed_process = subprocess.CompletedProcess(args=[], stdout="", stderr="error", returncode=0)
-    mocker.patch("subprocess.run", return_value=completed_process)
+    mock_client = mocker.Mock()
+    mock_client.get_authorizations.side_effect = ConnectionRefusedError("test")
 
     import src.influxDBTokenPublisher as publisher
 
     with pytest.raises(SystemExit) as pytest_wrapped_e:
-        publisher.retrieve_influxDB_token_json(testArgs)
-        assert pytest_wrapped_e.type == SystemExit
+        publisher.retrieve_influxDB_token_json(testArgs, mock_client)
+    assert pytest_wrapped_e.type == SystemExit
+
+    mock_client.get_authorizations.side_effect = None
+    mock_client.get_authorizations.return_value = []
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        publisher.retrieve_influxDB_token_json(testArgs, mock_client)
+    assert pytest_wrapped_e.type == SystemExit
+
+
+def test_retrieve_tokens_from_fake_influxdb(mocker):
+
+    with FakeInfluxDBServer() as server:
+        server.add_org("testorg")
+        server.add_authorization("test's Token", token="testAdminToken")
+        server.add_authorization("greengrass_readwrite", token="testRWToken")
+
+        testArgs = argparse.Namespace(
+            influxdb_port=str(server.port),
+            influxdb_interface="127.0.0.1",
+            server_protocol="http",
+            skip_tls_verify="false",
+            tls_server_name="",
+            secret_arn="arn:test:object"
+        )
+        import src.influxDBTokenPublisher as publisher
+        mock_credentials = mocker.patch.object(publisher.SECRET_PROVIDER, "get_credentials",
+                                               return_value=("test_username", "test_password"))
+
+        client = publisher.create_influxdb_client(testArgs)
+        token_json = json.loads(publisher.retrieve_influxDB_token_json(testArgs, client))
+        assert [auth["token"] for auth in token_json] == ["testAdminToken", "testRWToken"]
+        mock_credentials.assert_called_once_with("arn:test:object")
+
+
+def test_fetch_tokens_after_session_expired(mocker):
+
+    with FakeInfluxDBServer() as server:
+        server.add_org("testorg")
+        server.add_authorization("greengrass_readwrite", token="testRWToken")
+
+        testArgs = argparse.Namespace(secret_arn="arn:test:object")
+
+        import src.influxDBTokenPublisher as publisher
+        mock_credentials = mocker.patch.object(publisher.SECRET_PROVIDER, "get_credentials",
+                                               return_value=("test_username", "test_password"))
+
+        client = publisher.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+        client.session_cookie = "expired"
+        token_json = json.loads(publisher.fetch_influxDB_token_json(testArgs, client))
+        assert token_json[0]["token"] == "testRWToken"
+        assert mock_credentials.call_count == 1
+
+
+def test_write_after_token_rotated(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+
+    with FakeInfluxDBServer() as server:
+        server.add_org("testorg")
+        server.add_authorization("greengrass_readwrite", token="rotatedToken")
+        testArgs = argparse.Namespace(secret_arn="arn:test:object")
+
+        import src.influxDBTokenPublisher as publisher
+        from src.influxDBMetrics import MetricsRegistry
+        from src.tokenRefresher import TokenRefresher
+        mocker.patch.object(publisher.SECRET_PROVIDER, "get_credentials", return_value=("test_username", "test_password"))
+
+        metadata = {"InfluxDBOrg": "testorg", "InfluxDBBucket": "testbucket"}
+        handler = publisher.InfluxDBTokenStreamHandler(
+            json.dumps(metadata), json.dumps([{"description": "greengrass_readwrite", "token": "oldToken"}]),
+            "test/publish", metrics_registry=MetricsRegistry())
+        admin_client = publisher.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+        refresher = TokenRefresher(lambda: publisher.fetch_influxDB_token_json(testArgs, admin_client), handler, 0)
+        # The writes do not sign in, and only use the token of their bucket
+        client = publisher.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+        publisher.write_to_influxdb(client, handler, refresher, "testorg", "testbucket", b"cpu value=1", "ns")
+        assert server.writes == [("testorg", "testbucket", "ns", ["cpu value=1"])]
+        assert handler.get_token("testorg", "testbucket", "RW") == "rotatedToken"
+
+        with pytest.raises(ValueError, match="No InfluxDB greengrass_readwrite token for bucket testorg/other"):
+            publisher.write_to_influxdb(client, handler, refresher, "testorg", "other", b"cpu value=1", "ns")
+        assert len(server.writes) == 1
+
+
+def test_query_after_token_rotated(mocker):
+
+    with FakeInfluxDBServer() as server:
+        server.add_org("testorg")
+        server.add_authorization("greengrass_read", token="rotatedToken")
+        server.set_query_result("#datatype,string\n")
+        testArgs = argparse.Namespace(secret_arn="arn:test:object", influxdb_org="testorg")
+
+        import src.influxDBTokenPublisher as publisher
+        mocker.patch.object(publisher.SECRET_PROVIDER, "get_credentials", return_value=("test_username", "test_password"))
+
+        client = publisher.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+        query_client = publisher.InfluxDBClient("127.0.0.1", server.port, server_protocol="http", token="oldToken")
+        assert publisher.run_query(testArgs, query_client, client, "buckets()") == "#datatype,string\n"
+        assert query_client.token == "rotatedToken"
+        assert server.queries == [("testorg", "buckets()")]
 
 
 def test_listen_to_token_requests(mocker):
@@ -152,14 +257,33 @@ def test_listen_to_token_requests(mocker):
         influxdb_port="testport",
         influxdb_interface="testinterface",
         server_protocol="https",
-        skip_tls_verify="true"
+        skip_tls_verify="true",
+        publish_workers=0,
+        publish_queue_size=100,
+        publish_overflow_policy="drop_oldest",
+        coalescing_window_ms=0,
+        reply_topic_pattern="",
+        request_client_rate=10,
+        request_client_burst=20,
+        request_global_rate=0,
+        request_global_burst=1
         )
-    test_influxdb_rw_token = "testToken"
+    test_influxdb_rw_token = json.dumps([{"description": "greengrass_readwrite", "token": "testToken"}])
     mock_ipc_client = mocker.patch("awsiot.greengrasscoreipc.connect")
 
     import src.influxDBTokenPublisher as publisher
-    publisher.listen_to_token_requests(testArgs, test_influxdb_rw_token)
+    from src.ipcConnectionManager import IPCConnectionManager, PUBLISH_CHANNEL
+
+    connection_manager = IPCConnectionManager()
+    handler = publisher.listen_to_token_requests(testArgs, test_influxdb_rw_token, connection_manager)
+    assert mock_ipc_client.call_count == 1
+    connection_manager.get_client(PUBLISH_CHANNEL)
     assert mock_ipc_client.call_count == 2
+    assert handler.admission_controller.client_rate == 10
+    assert handler.admission_controller.global_bucket is None
+    assert handler.get_publish_client() is connection_manager.get_client(PUBLISH_CHANNEL)
+    assert mock_ipc_client.call_count == 2
+    connection_manager.close()
 
 
 def test_no_ipc_connection(mocker):
@@ -180,5 +304,25 @@ def test_no_ipc_connection(mocker):
 
     import src.influxDBTokenPublisher as publisher
 
+    from src.ipcConnectionManager import IPCConnectionManager
+
+    with pytest.raises(TimeoutError, match='test'):
+        publisher.listen_to_token_requests(testArgs, test_influxdb_rw_token, IPCConnectionManager())
+
+
+def test_subscribe_unauthorized(mocker):
+    import src.influxDBTokenPublisher as publisher
+    from awsiot.greengrasscoreipc.model import UnauthorizedError
+
+    unauthorized = publisher.REGISTRY.counter('influxdb_subscribe_unauthorized_total', '', ['topic'])
+    count = unauthorized.get(topic="test/ingest")
+    connection_manager = mocker.Mock()
+    connection_manager.subscribe.side_effect = UnauthorizedError()
+    with pytest.raises(UnauthorizedError):
+        publisher.subscribe_topic(connection_manager, "test/ingest", mocker.Mock())
+    assert unauthorized.get(topic="test/ingest") == count + 1
+
+    connection_manager.subscribe.side_effect = TimeoutError("test")
     with pytest.raises(TimeoutError, match='test'):
-        publisher.listen_to_token_requests(testArgs, test_influxdb_rw_token)
+        publisher.subscribe_topic(connection_manager, "test/ingest", mocker.Mock())
+    assert unauthorized.get(topic="test/ingest") == count + 1
@@ -1,6 +1,7 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
 
+import copy
 import sys
 import json
 import pytest
@@ -80,6 +81,76 @@ def testHandleValidStreamEvent(mocker):
     assert mock_publish_response.call_count == 1
 
 
+def testHandleStreamEventWithPublishWorkers(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_publish_response = mocker.patch('src.influxDBTokenStreamHandler.InfluxDBTokenStreamHandler.publish_response')
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    handler = streamHandler.InfluxDBTokenStreamHandler(
+        json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic", publish_workers=2, publish_queue_size=10)
+    message = JsonMessage(message={"action": "RetrieveToken",  "accessLevel": "RW"})
+    handler.handle_stream_event(SubscriptionResponseMessage(json_message=message))
+    handler.publish_pipeline.join()
+    handler.publish_pipeline.stop()
+    mock_publish_response.assert_called_once_with(testPublishJson)
+
+
+def testHandleCoalescedStreamEvents(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_publish_response = mocker.patch('src.influxDBTokenStreamHandler.InfluxDBTokenStreamHandler.publish_response')
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    handler = streamHandler.InfluxDBTokenStreamHandler(
+        json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic", coalescing_window=60)
+    message = JsonMessage(message={"action": "RetrieveToken",  "accessLevel": "RW"})
+    for _ in range(3):
+        handler.handle_stream_event(SubscriptionResponseMessage(json_message=message))
+    assert not mock_publish_response.called
+    handler.request_coalescer.flush_all()
+    mock_publish_response.assert_called_once_with(testPublishJson)
+
+
+def testHandleStreamEventWithReplyTopic(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_publish_response = mocker.patch('src.influxDBTokenStreamHandler.InfluxDBTokenStreamHandler.publish_response')
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    handler = streamHandler.InfluxDBTokenStreamHandler(
+        json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic", coalescing_window=60,
+        reply_topic_pattern="test/reply/*, other/reply")
+
+    message = JsonMessage(message={"action": "RetrieveToken", "accessLevel": "RW", "replyTopic": "test/reply/app1",
+                                   "correlationId": "request-1"})
+    handler.handle_stream_event(SubscriptionResponseMessage(json_message=message))
+    expectedPublishJson = dict(testPublishJson)
+    expectedPublishJson["correlationId"] = "request-1"
+    mock_publish_response.assert_called_once_with(expectedPublishJson, "test/reply/app1")
+    # The correlation ID is only added to the response of this request
+    assert "correlationId" not in handler.get_publish_json({"action": "RetrieveToken", "accessLevel": "RW"})
+
+    mock_publish_response.reset_mock()
+    for reply_topic in ["other/reply", "other/reply", "test/other"]:
+        message = JsonMessage(message={"action": "RetrieveToken", "accessLevel": "RW", "replyTopic": reply_topic})
+        handler.handle_stream_event(SubscriptionResponseMessage(json_message=message))
+    handler.request_coalescer.flush_all()
+    mock_publish_response.assert_called_once_with(testPublishJson, "other/reply")
+
+
+def testReplyTopicsDisabledByDefault(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_publish_response = mocker.patch('src.influxDBTokenStreamHandler.InfluxDBTokenStreamHandler.publish_response')
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    handler = streamHandler.InfluxDBTokenStreamHandler(json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic")
+    message = JsonMessage(message={"action": "RetrieveToken", "accessLevel": "RW", "replyTopic": "test/reply"})
+    handler.handle_stream_event(SubscriptionResponseMessage(json_message=message))
+    assert not mock_publish_response.called
+
+
 def testHandleInvalidStreamEvent(mocker):
     mock_ipc_client = mocker.patch("awsiot.greengrasscoreipc.connect")
     mock_publish_response = mocker.patch('src.influxDBTokenStreamHandler.InfluxDBTokenStreamHandler.publish_response')
@@ -159,6 +230,128 @@ def testGetValidPublishJson(mocker):
     assert publish_json == testPublishJson
 
 
+def testTokenIndexBuiltOnce(mocker):
+
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    handler = streamHandler.InfluxDBTokenStreamHandler(json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic")
+    assert set(handler.token_index.keys()) == {
+        ("greengrass", "greengrass-telemetry", "RW"), ("greengrass", "greengrass-telemetry", "RO"), (None, None, "Admin")}
+    assert handler.token_index[("greengrass", "greengrass-telemetry", "RO")]["InfluxDBToken"] == "testROToken"
+
+    mock_json_loads = mocker.patch("src.influxDBTokenStreamHandler.json.loads")
+    message = {"action": "RetrieveToken",  "accessLevel": "RW"}
+    assert handler.get_publish_json(message)["InfluxDBToken"] == "testRWToken"
+    assert handler.get_publish_json(message) is handler.get_publish_json(message)
+    assert not mock_json_loads.called
+
+
+def testGetPublishJsonForBucket(mocker):
+
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    bucketTokenJson = copy.deepcopy(testTokenJson) + [
+        {"description": "greengrass_readwrite:greengrass/app1", "token": "testApp1RWToken", "status": "active"},
+        {"description": "greengrass_read:other/app2", "token": "testApp2ROToken", "status": "active"},
+        {"description": "greengrass_read:invalid", "token": "testInvalidToken", "status": "active"}
+    ]
+    handler = streamHandler.InfluxDBTokenStreamHandler(json.dumps(testMetadataJson), json.dumps(bucketTokenJson), "test/topic")
+
+    publish_json = handler.get_publish_json({"action": "RetrieveToken", "accessLevel": "RW", "bucket": "app1"})
+    assert publish_json["InfluxDBToken"] == "testApp1RWToken"
+    assert publish_json["InfluxDBBucket"] == "app1"
+    assert publish_json["InfluxDBOrg"] == "greengrass"
+    publish_json = handler.get_publish_json(
+        {"action": "RetrieveToken", "accessLevel": "RO", "org": "other", "bucket": "app2"})
+    assert publish_json["InfluxDBToken"] == "testApp2ROToken"
+    assert publish_json["InfluxDBOrg"] == "other"
+    assert handler.get_publish_json({"action": "RetrieveToken", "accessLevel": "RW"})["InfluxDBToken"] == "testRWToken"
+    assert handler.get_publish_json({"action": "RetrieveToken", "accessLevel": "RO", "bucket": "app1"}) is None
+    assert handler.get_publish_json({"action": "RetrieveToken", "accessLevel": "RW", "bucket": "app2"}) is None
+    assert len(handler.token_index) == 5
+
+
+def testUpdateTokens(mocker):
+
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+
+    import src.influxDBTokenStreamHandler as streamHandler
+
+    handler = streamHandler.InfluxDBTokenStreamHandler(json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic")
+    token_index = handler.token_index
+    assert not handler.update_tokens(json.dumps(testTokenJson))
+    assert handler.token_index is token_index
+
+    rotatedTokenJson = copy.deepcopy(testTokenJson)
+    rotatedTokenJson[2]['token'] = "rotatedRWToken"
+    rotatedTokenJson[1]['status'] = "inactive"
+    assert handler.update_tokens(json.dumps(rotatedTokenJson))
+    message = {"action": "RetrieveToken",  "accessLevel": "RW"}
+    assert handler.get_publish_json(message)['InfluxDBToken'] == "rotatedRWToken"
+    message = {"action": "RetrieveToken",  "accessLevel": "RO"}
+    assert handler.get_publish_json(message) is None
+
+
+def testTokenVendingMetrics(mocker):
+
+    mock_ipc_client = mocker.patch("awsiot.greengrasscoreipc.connect")
+
+    import src.influxDBTokenStreamHandler as streamHandler
+    from src.influxDBMetrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    handler = streamHandler.InfluxDBTokenStreamHandler(
+        json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic", metrics_registry=registry)
+    for message in [{"action": "RetrieveToken", "accessLevel": "RW"},
+                    {"action": "RetrieveToken", "accessLevel": "RW"},
+                    {"action": "RetrieveToken", "accessLevel": "bogus"},
+                    {"action": "DeleteToken", "accessLevel": "RO"}]:
+        handler.handle_stream_event(SubscriptionResponseMessage(json_message=JsonMessage(message=message)))
+
+    requests = registry.counter('influxdb_token_requests_total', '', ['action', 'access_level'])
+    assert requests.get(action="RetrieveToken", access_level="RW") == 2
+    assert requests.get(action="RetrieveToken", access_level="unknown") == 1
+    assert requests.get(action="unknown", access_level="RO") == 1
+    invalid = registry.counter('influxdb_token_invalid_requests_total', '', ['reason'])
+    assert invalid.get(reason="unknown_access_level") == 1
+    assert invalid.get(reason="unknown_action") == 1
+    assert registry.histogram('influxdb_token_publish_latency_seconds', '').get_count() == 2
+
+    mock_ipc_client.return_value.new_publish_to_topic.return_value.get_response.return_value.result.side_effect = \
+        ValueError("test")
+    with pytest.raises(ValueError):
+        handler.publish_response(testPublishJson)
+    assert registry.counter('influxdb_token_publish_errors_total', '').get() == 1
+
+
+def testThrottledStreamEvents(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_publish_response = mocker.patch('src.influxDBTokenStreamHandler.InfluxDBTokenStreamHandler.publish_response')
+
+    import src.influxDBTokenStreamHandler as streamHandler
+    from src.admissionControl import AdmissionController
+    from src.influxDBMetrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    admission_controller = AdmissionController(client_rate=1, client_burst=2, metrics_registry=registry)
+    handler = streamHandler.InfluxDBTokenStreamHandler(
+        json.dumps(testMetadataJson), json.dumps(testTokenJson), "test/topic", metrics_registry=registry,
+        admission_controller=admission_controller)
+    for client_id in ["app1", "app1", "app1", "app2"]:
+        message = JsonMessage(message={"action": "RetrieveToken", "accessLevel": "RW", "clientId": client_id})
+        handler.handle_stream_event(SubscriptionResponseMessage(json_message=message))
+
+    assert mock_publish_response.call_count == 3
+    # Throttled requests are dropped before they are counted or validated
+    requests = registry.counter('influxdb_token_requests_total', '', ['action', 'access_level'])
+    assert requests.get(action="RetrieveToken", access_level="RW") == 3
+    assert registry.counter('influxdb_token_requests_throttled_total', '', ['limit']).get(limit="client") == 1
+
+
 def testGetInvalidPublishJson(mocker):
 
     mocker.patch("awsiot.greengrasscoreipc.connect")
@@ -0,0 +1,160 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+import threading
+import time
+import pytest
+
+from test.fakeWriter import FakeWriter
+
+sys.path.append("src/")
+
+KEY = ("greengrass", "greengrass-telemetry", "ns")
+
+
+def create_buffer(directory, writer, healthy=lambda: True, **kwargs):
+    from src.influxDBMetrics import MetricsRegistry
+    import src.influxDBWriteBuffer as influxDBWriteBuffer
+
+    registry = MetricsRegistry()
+    kwargs.setdefault("replay_rate", 1000000)
+    write_buffer = influxDBWriteBuffer.InfluxDBWriteBuffer(
+        str(directory), writer, healthy, metrics_registry=registry, **kwargs)
+    return write_buffer, registry
+
+
+def wait_until_empty(write_buffer, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not write_buffer.is_empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return write_buffer.is_empty()
+
+
+def test_replay_merges_batches(tmp_path):
+    writer = FakeWriter()
+    write_buffer, registry = create_buffer(tmp_path, writer)
+    write_buffer.append(KEY, ["cpu value=1 1"])
+    write_buffer.append(KEY, ["cpu value=2 2"])
+    write_buffer.append(("greengrass", "app1", "s"), ["mem value=1 1"])
+    write_buffer.start()
+
+    assert wait_until_empty(write_buffer)
+    write_buffer.stop()
+    assert writer.writes == [
+        ("greengrass", "greengrass-telemetry", "ns", ["cpu value=1 1", "cpu value=2 2"]),
+        ("greengrass", "app1", "s", ["mem value=1 1"])]
+    assert write_buffer.is_empty()
+    assert os.listdir(str(tmp_path)) == []
+    assert registry.counter("influxdb_buffer_points_replayed_total", "").get() == 3
+
+
+def test_recover_after_crash(tmp_path):
+    writer = FakeWriter()
+    write_buffer, _ = create_buffer(tmp_path, writer)
+    write_buffer.append(KEY, ["cpu value=1 1"])
+    write_buffer.append(KEY, ["cpu value=2 2"])
+    write_buffer.active_file.close()
+
+    # Simulate a crash in the middle of an append
+    segment = os.path.join(str(tmp_path), os.listdir(str(tmp_path))[0])
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x00\x01\x00torn")
+
+    write_buffer, registry = create_buffer(tmp_path, writer)
+    assert registry.counter("influxdb_buffer_corrupt_segments_total", "").get() == 1
+    write_buffer.append(KEY, ["cpu value=3 3"])
+    assert len(os.listdir(str(tmp_path))) == 2
+
+    write_buffer.start()
+    assert wait_until_empty(write_buffer)
+    write_buffer.stop()
+    assert [line for _, _, _, lines in writer.writes for line in lines] == [
+        "cpu value=1 1", "cpu value=2 2", "cpu value=3 3"]
+
+
+def test_evict_oldest_segments(tmp_path):
+    writer = FakeWriter()
+    write_buffer, registry = create_buffer(tmp_path, writer, max_bytes=200, segment_bytes=100)
+    for i in range(6):
+        write_buffer.append(KEY, ["cpu value={} {}".format(i, i) * 2])
+    write_buffer.stop()
+
+    assert write_buffer.total_bytes <= 200
+    assert registry.counter("influxdb_buffer_points_evicted_total", "").get() > 0
+    assert registry.counter("influxdb_buffer_points_evicted_total", "").get() + sum(
+        write_buffer.segment_points.values()) == 6
+    assert min(write_buffer.segments) > 1
+
+
+def test_wait_until_healthy(tmp_path, mocker):
+    import src.influxDBWriteBuffer as influxDBWriteBuffer
+
+    mocker.patch.object(influxDBWriteBuffer, "HEALTH_CHECK_INTERVAL", 0.01)
+    healthy = threading.Event()
+    checked = threading.Event()
+
+    def health():
+        checked.set()
+        return healthy.is_set()
+
+    writer = FakeWriter()
+    write_buffer, _ = create_buffer(tmp_path, writer, healthy=health)
+    write_buffer.append(KEY, ["cpu value=1 1"])
+    write_buffer.start()
+    assert checked.wait(5)
+    assert writer.writes == []
+
+    healthy.set()
+    assert writer.written.wait(5)
+    write_buffer.stop()
+    assert write_buffer.is_empty()
+
+
+def test_keep_segment_after_failed_replay(tmp_path, mocker):
+    import src.influxDBWriteBuffer as influxDBWriteBuffer
+
+    mocker.patch.object(influxDBWriteBuffer, "HEALTH_CHECK_INTERVAL", 0.01)
+    writer = FakeWriter(fail=True)
+    write_buffer, _ = create_buffer(tmp_path, writer)
+    write_buffer.append(KEY, ["cpu value=1 1"])
+    assert not write_buffer.replay_segment(write_buffer.take_oldest_segment())
+    assert not write_buffer.is_empty()
+
+    writer.fail = False
+    write_buffer.start()
+    assert writer.written.wait(5)
+    write_buffer.stop()
+    assert writer.writes == [("greengrass", "greengrass-telemetry", "ns", ["cpu value=1 1"])]
+
+
+def test_drop_rejected_records(tmp_path):
+    from src.influxDBClient import InfluxDBAPIError
+
+    writes = []
+
+    def writer(org, bucket, data, precision):
+        lines = data.decode("utf-8").split("\n")
+        if "invalid" in lines:
+            raise InfluxDBAPIError("POST", "/api/v2/write", 400, "unable to parse 'invalid'")
+        writes.append(lines)
+
+    write_buffer, registry = create_buffer(tmp_path, writer)
+    write_buffer.append(KEY, ["invalid", "cpu value=1 1"])
+    write_buffer.append(KEY, ["cpu value=2 2"])
+    write_buffer.append(KEY, ["cpu value=3 3"])
+    # The batch of all records is rejected, so the records are replayed one by one and only the first is dropped
+    assert write_buffer.replay_segment(write_buffer.take_oldest_segment())
+    assert writes == [["cpu value=2 2"], ["cpu value=3 3"]]
+    assert write_buffer.is_empty()
+    assert registry.counter("influxdb_buffer_points_rejected_total", "").get() == 2
+    assert registry.counter("influxdb_buffer_points_replayed_total", "").get() == 2
+    write_buffer.stop()
+
+
+def test_invalid_sizes(tmp_path):
+    with pytest.raises(ValueError, match="at least the segment size"):
+        create_buffer(tmp_path, FakeWriter(), max_bytes=10, segment_bytes=100)
+    with pytest.raises(ValueError, match="must be positive"):
+        create_buffer(tmp_path, FakeWriter(), replay_rate=0)
@@ -0,0 +1,128 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import threading
+from unittest import mock
+import pytest
+
+sys.path.append("src/")
+
+
+class FakeConnect:
+    """
+    Stands in for awsiot.greengrasscoreipc.connect, keeping the lifecycle handler of every connection.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.clients = []
+        self.lifecycle_handlers = []
+        self.subscribed = threading.Event()
+
+    def __call__(self, lifecycle_handler=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionRefusedError("test")
+        ipc_client = mock.MagicMock()
+        ipc_client.new_subscribe_to_topic.side_effect = self.subscribe
+        self.clients.append(ipc_client)
+        self.lifecycle_handlers.append(lifecycle_handler)
+        return ipc_client
+
+    def subscribe(self, stream_handler):
+        self.subscribed.set()
+        return mock.MagicMock()
+
+
+def create_manager(mocker, failures=0):
+    from src.influxDBMetrics import MetricsRegistry
+    import src.ipcConnectionManager as ipcConnectionManager
+
+    fake_connect = FakeConnect(failures)
+    mocker.patch("awsiot.greengrasscoreipc.connect", side_effect=fake_connect)
+    registry = MetricsRegistry()
+    manager = ipcConnectionManager.IPCConnectionManager(initial_backoff=0.01, metrics_registry=registry)
+    return manager, fake_connect, registry
+
+
+def test_channels_are_shared(mocker):
+    import src.ipcConnectionManager as ipcConnectionManager
+
+    manager, fake_connect, registry = create_manager(mocker)
+    assert manager.get_client() is manager.get_client(ipcConnectionManager.DEFAULT_CHANNEL)
+    assert manager.get_client(ipcConnectionManager.PUBLISH_CHANNEL) is not manager.get_client()
+    assert len(fake_connect.clients) == 2
+    assert registry.gauge("influxdb_ipc_connected", "", ["channel"]).get(channel="publish") == 1
+
+    manager.close()
+    assert all(ipc_client.close.called for ipc_client in fake_connect.clients)
+
+
+def test_resubscribe_after_disconnect(mocker):
+    manager, fake_connect, registry = create_manager(mocker)
+    stream_handler = mock.MagicMock()
+    manager.subscribe("test/topic", stream_handler)
+    fake_connect.subscribed.clear()
+
+    fake_connect.lifecycle_handlers[0].on_disconnect(Exception("test"))
+    assert registry.gauge("influxdb_ipc_connected", "", ["channel"]).get(channel="default") == 0
+    with pytest.raises(ConnectionError):
+        manager.get_client()
+
+    assert fake_connect.subscribed.wait(5)
+    manager.close()
+    assert len(fake_connect.clients) == 2
+    assert fake_connect.clients[1].new_subscribe_to_topic.call_count == 1
+    assert registry.counter("influxdb_ipc_reconnects_total", "", ["channel"]).get(channel="default") == 1
+    assert registry.counter("influxdb_ipc_resubscribes_total", "", ["topic"]).get(topic="test/topic") == 1
+
+    # Events of the new stream reach the original handler
+    active_handler = fake_connect.clients[1].new_subscribe_to_topic.call_args[0][0]
+    active_handler.on_stream_event("test_event")
+    stream_handler.on_stream_event.assert_called_once_with("test_event")
+
+
+def test_resubscribe_after_stream_closed(mocker):
+    manager, fake_connect, registry = create_manager(mocker)
+    manager.subscribe("test/topic", mock.MagicMock())
+    first_handler = fake_connect.clients[0].new_subscribe_to_topic.call_args[0][0]
+    fake_connect.subscribed.clear()
+
+    first_handler.on_stream_closed()
+    assert fake_connect.subscribed.wait(5)
+    # A late closure of the first stream must not subscribe a third time
+    first_handler.on_stream_closed()
+    manager.close()
+    assert len(fake_connect.clients) == 1
+    assert fake_connect.clients[0].new_subscribe_to_topic.call_count == 2
+
+
+def test_reconnect_with_backoff(mocker):
+    manager, fake_connect, registry = create_manager(mocker)
+    manager.subscribe("test/topic", mock.MagicMock())
+    fake_connect.subscribed.clear()
+    fake_connect.failures = 2
+
+    fake_connect.lifecycle_handlers[0].on_disconnect(Exception("test"))
+    assert fake_connect.subscribed.wait(5)
+    manager.close()
+    assert registry.counter("influxdb_ipc_reconnect_failures_total", "").get() == 2
+    assert registry.counter("influxdb_ipc_reconnects_total", "", ["channel"]).get(channel="default") == 1
+
+
+def test_ignore_disconnect_after_close(mocker):
+    manager, fake_connect, registry = create_manager(mocker)
+    manager.subscribe("test/topic", mock.MagicMock())
+    manager.close()
+    fake_connect.lifecycle_handlers[0].on_disconnect(None)
+    assert len(fake_connect.clients) == 1
+
+
+def test_invalid_backoff(mocker):
+    import src.ipcConnectionManager as ipcConnectionManager
+
+    with pytest.raises(ValueError, match="must be positive"):
+        ipcConnectionManager.IPCConnectionManager(initial_backoff=0)
+    with pytest.raises(ValueError, match="must be at least 1"):
+        ipcConnectionManager.IPCConnectionManager(backoff_factor=0.5)
@@ -0,0 +1,70 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import pytest
+
+sys.path.append("src/")
+
+
+def test_point_to_line():
+    import src.lineProtocol as lineProtocol
+
+    point = {
+        "measurement": "cpu load",
+        "tags": {"host": "gateway,1", "empty": "", "core": "a=b"},
+        "fields": {"value": 0.5, "count": 3, "ok": True, "state": 'say "hi"'},
+        "time": 1600000000
+    }
+    assert lineProtocol.point_to_line(point) == \
+        'cpu\\ load,core=a\\=b,host=gateway\\,1 value=0.5,count=3i,ok=true,state="say \\"hi\\"" 1600000000'
+    assert lineProtocol.point_to_line({"measurement": "cpu", "fields": {"value": 1.0}}) == "cpu value=1.0"
+    assert lineProtocol.point_to_line({"measurement": "cpu", "fields": {"value": 1.0}}, 5) == "cpu value=1.0 5"
+    assert lineProtocol.point_to_line(point, 5).endswith(" 1600000000")
+
+
+def test_invalid_points():
+    import src.lineProtocol as lineProtocol
+
+    with pytest.raises(ValueError, match="no measurement"):
+        lineProtocol.point_to_line({"fields": {"value": 1}})
+    with pytest.raises(ValueError, match="no fields"):
+        lineProtocol.point_to_line({"measurement": "cpu", "fields": {}})
+    with pytest.raises(ValueError, match="finite"):
+        lineProtocol.point_to_line({"measurement": "cpu", "fields": {"value": float("nan")}})
+    with pytest.raises(ValueError, match="Unsupported"):
+        lineProtocol.point_to_line({"measurement": "cpu", "fields": {"value": [1]}})
+    with pytest.raises(ValueError, match="non-integer time"):
+        lineProtocol.point_to_line({"measurement": "cpu", "fields": {"value": 1}, "time": "now"})
+
+
+def test_split_lines():
+    import src.lineProtocol as lineProtocol
+
+    assert lineProtocol.split_lines("cpu value=1\n\n# comment\n mem value=2 \n") == ["cpu value=1", "mem value=2"]
+    assert lineProtocol.split_lines("cpu value=1\nmem value=2 3", 5) == ["cpu value=1 5", "mem value=2 3"]
+    with pytest.raises(ValueError, match="no field set"):
+        lineProtocol.split_lines("cpu")
+
+
+def test_time_ns():
+    import time
+    import src.lineProtocol as lineProtocol
+
+    before = int(time.time()) * 10 ** 9
+    assert before <= lineProtocol.time_ns() < before + 2 * 10 ** 9
+
+
+def test_parse_line():
+    import src.lineProtocol as lineProtocol
+
+    line = 'cpu\\ load,host=a\\,b value=0.5,count=3i,ok=t,state="say \\"hi, there\\"" 1600000000'
+    assert lineProtocol.parse_line(line) == (
+        "cpu\\ load,host=a\\,b", {"value": 0.5, "count": 3, "ok": True, "state": 'say "hi, there"'}, 1600000000)
+    assert lineProtocol.parse_line("cpu a\\=b=1") == ("cpu", {"a\\=b": 1.0}, None)
+    with pytest.raises(ValueError, match="no field set"):
+        lineProtocol.parse_line("cpu")
+    with pytest.raises(ValueError, match="Invalid field"):
+        lineProtocol.parse_line("cpu value")
+    with pytest.raises(ValueError):
+        lineProtocol.parse_line('cpu value="open')
@@ -0,0 +1,217 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import argparse
+import json
+import sys
+import pytest
+
+from test.fakeInfluxDBServer import FakeInfluxDBServer
+
+sys.path.append("src/")
+
+TEST_PASSWORD = "TestPassword123!@#"
+
+
+def get_test_args(server, additional_buckets="", bucket_retention="0", downsampled_buckets=""):
+    return argparse.Namespace(
+        influxdb_org="greengrass",
+        influxdb_bucket="greengrass-telemetry",
+        influxdb_port=str(server.port),
+        influxdb_interface="127.0.0.1",
+        server_protocol="http",
+        skip_tls_verify="false",
+        secret_arn="arn:test:object",
+        influxdb_additional_buckets=additional_buckets,
+        influxdb_bucket_retention=bucket_retention,
+        influxdb_downsampled_buckets=downsampled_buckets
+    )
+
+
+def get_test_client(server):
+    import src.influxDBClient as influxDBClient
+    return influxDBClient.InfluxDBClient("127.0.0.1", server.port, server_protocol="http")
+
+
+def test_parse_no_args(mocker):
+    import src.provisionInfluxDB as provision
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        provision.parse_arguments()
+    assert pytest_wrapped_e.type == SystemExit
+
+
+def test_validate_password():
+    import src.provisionInfluxDB as provision
+
+    assert provision.validate_password(TEST_PASSWORD)
+    assert not provision.validate_password("Short123!")
+    assert not provision.validate_password("testpassword123!@#")
+    assert not provision.validate_password("TESTPASSWORD123!@#")
+    assert not provision.validate_password("TestPasswordabc!@#")
+    assert not provision.validate_password("TestPassword123456")
+
+
+def test_provision_new_influxdb(mocker):
+    import src.provisionInfluxDB as provision
+    mock_credentials = mocker.patch.object(provision.SECRET_PROVIDER, "get_credentials",
+                                           return_value=("test_username", TEST_PASSWORD))
+
+    with FakeInfluxDBServer() as server:
+        timer = provision.PhaseTimer()
+        assert provision.provision_influxdb(get_test_args(server), get_test_client(server), timer)
+
+        assert server.state["org"]["name"] == "greengrass"
+        assert [bucket["name"] for bucket in server.state["buckets"]] == ["greengrass-telemetry"]
+        bucket_id = server.state["buckets"][0]["id"]
+        tokens = {auth["description"]: auth for auth in server.state["authorizations"]}
+        assert set(tokens.keys()) == {"test_username's Token", "greengrass_read", "greengrass_readwrite"}
+        assert [p["action"] for p in tokens["greengrass_read"]["permissions"]] == ["read"]
+        assert [p["action"] for p in tokens["greengrass_readwrite"]["permissions"]] == ["read", "write"]
+        assert all(p["resource"]["id"] == bucket_id for p in tokens["greengrass_readwrite"]["permissions"])
+        # The bucket comes from the setup response, so it is never looked up
+        assert not [request for request in server.requests if request[1] == "/api/v2/buckets"]
+
+    mock_credentials.assert_called_once_with("arn:test:object")
+    assert set(timer.timings.keys()) == {"check_setup", "retrieve_secret", "setup", "create_tokens"}
+
+
+def test_phase_timer_trace(tmp_path):
+    import src.provisionInfluxDB as provision
+    import src.startupTrace as startupTrace
+
+    path = tmp_path / "trace.jsonl"
+    timer = provision.PhaseTimer(startupTrace.StartupTrace("provisionInfluxDB", path=str(path), run_id="run1"))
+    with timer.phase("check_setup"):
+        pass
+    with pytest.raises(ValueError):
+        with timer.phase("setup"):
+            raise ValueError("setup failed")
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(span["phase"], span["status"]) for span in spans] == [("check_setup", "ok"), ("setup", "error")]
+    assert set(timer.timings.keys()) == {"check_setup", "setup"}
+
+
+def test_provision_reuses_existing_setup(mocker):
+    import src.provisionInfluxDB as provision
+    mocker.patch.object(provision.SECRET_PROVIDER, "get_credentials", return_value=("test_username", "test_password"))
+
+    with FakeInfluxDBServer() as server:
+        org = server.add_org("greengrass")
+        server.add_bucket("greengrass-telemetry", org=org, retention_seconds=30 * 24 * 60 * 60)
+        timer = provision.PhaseTimer()
+        assert not provision.provision_influxdb(get_test_args(server), get_test_client(server), timer)
+        assert server.state["authorizations"] == []
+        # A retention period set back to 0 is applied as well
+        assert provision.get_retention_seconds(server.state["buckets"][0]) == 0
+
+    assert list(timer.timings.keys()) == ["check_setup", "retrieve_secret", "update_retention"]
+
+
+def test_parse_bucket_list():
+    import src.provisionInfluxDB as provision
+
+    assert provision.parse_bucket_list("", "greengrass") == []
+    assert provision.parse_bucket_list("app1, other/app2,app1,,", "greengrass") == [
+        ("greengrass", "app1"), ("other", "app2")]
+    with pytest.raises(ValueError, match="Invalid bucket"):
+        provision.parse_bucket_list("other/", "greengrass")
+
+
+def test_provision_additional_buckets(mocker):
+    import src.provisionInfluxDB as provision
+    mocker.patch.object(provision.SECRET_PROVIDER, "get_credentials", return_value=("test_username", TEST_PASSWORD))
+
+    with FakeInfluxDBServer() as server:
+        args = get_test_args(server, "app1,other/app2,greengrass-telemetry")
+        timer = provision.PhaseTimer()
+        assert provision.provision_influxdb(args, get_test_client(server), timer)
+
+        assert [org["name"] for org in server.state["orgs"]] == ["greengrass", "other"]
+        buckets = {bucket["name"]: bucket for bucket in server.state["buckets"]}
+        assert set(buckets.keys()) == {"greengrass-telemetry", "app1", "app2"}
+        assert buckets["app2"]["orgID"] == server.state["orgs"][1]["id"]
+        tokens = {auth["description"]: auth for auth in server.state["authorizations"]}
+        assert set(tokens.keys()) == {
+            "test_username's Token", "greengrass_read", "greengrass_readwrite",
+            "greengrass_read:greengrass/app1", "greengrass_readwrite:greengrass/app1",
+            "greengrass_read:other/app2", "greengrass_readwrite:other/app2"
+        }
+        assert all(p["resource"]["id"] == buckets["app2"]["id"]
+                   for p in tokens["greengrass_readwrite:other/app2"]["permissions"])
+        assert "create_buckets" in timer.timings
+
+        # Buckets added to the configuration later are provisioned on the next start, without duplicating tokens
+        args = get_test_args(server, "app1,app3")
+        assert not provision.provision_influxdb(args, get_test_client(server), provision.PhaseTimer())
+        assert len(server.state["buckets"]) == 4
+        descriptions = [auth["description"] for auth in server.state["authorizations"]]
+        assert len(descriptions) == 9
+        assert "greengrass_readwrite:greengrass/app3" in descriptions
+
+
+def test_parse_downsampled_buckets():
+    import src.provisionInfluxDB as provision
+
+    assert provision.parse_duration("0") == 0
+    assert provision.parse_duration("2w") == 14 * 24 * 60 * 60
+    assert provision.parse_downsampled_buckets(" telemetry-1h:1h:mean:365d, telemetry-1m:1m:max ") == [
+        {"bucket": "telemetry-1h", "window": "1h", "function": "mean", "retention_seconds": 365 * 24 * 60 * 60},
+        {"bucket": "telemetry-1m", "window": "1m", "function": "max", "retention_seconds": 0}]
+    with pytest.raises(ValueError, match="Invalid downsampled bucket"):
+        provision.parse_downsampled_buckets("telemetry-1h:1h")
+    with pytest.raises(ValueError, match="Invalid window"):
+        provision.parse_downsampled_buckets("telemetry-1h:0:mean")
+    with pytest.raises(ValueError, match="Unknown function"):
+        provision.parse_downsampled_buckets("telemetry-1h:1h:average")
+    with pytest.raises(ValueError, match="at least 1h"):
+        provision.parse_retention("30m")
+    with pytest.raises(ValueError, match="Invalid duration"):
+        provision.parse_retention("30 days")
+
+
+def test_provision_retention_and_downsampling(mocker):
+    import src.provisionInfluxDB as provision
+    mocker.patch.object(provision.SECRET_PROVIDER, "get_credentials", return_value=("test_username", TEST_PASSWORD))
+
+    with FakeInfluxDBServer() as server:
+        args = get_test_args(server, bucket_retention="30d", downsampled_buckets="telemetry-1h:1h:mean:365d")
+        timer = provision.PhaseTimer()
+        assert provision.provision_influxdb(args, get_test_client(server), timer)
+
+        buckets = {bucket["name"]: bucket for bucket in server.state["buckets"]}
+        assert provision.get_retention_seconds(buckets["greengrass-telemetry"]) == 30 * 24 * 60 * 60
+        assert provision.get_retention_seconds(buckets["telemetry-1h"]) == 365 * 24 * 60 * 60
+        descriptions = [auth["description"] for auth in server.state["authorizations"]]
+        assert "greengrass_read:greengrass/telemetry-1h" in descriptions
+        assert [task["name"] for task in server.state["tasks"]] == ["greengrass_downsample_telemetry-1h"]
+        flux = server.state["tasks"][0]["flux"]
+        assert 'from(bucket: "greengrass-telemetry")' in flux
+        assert "aggregateWindow(every: 1h, fn: mean, createEmpty: false)" in flux
+        assert 'to(bucket: "telemetry-1h", org: "greengrass")' in flux
+        assert "create_tasks" in timer.timings
+
+        # Provisioning again only applies what has changed in the configuration
+        request_count = len(server.requests)
+        assert not provision.provision_influxdb(args, get_test_client(server), provision.PhaseTimer())
+        assert not [request for request in server.requests[request_count:] if request[0] != "GET"
+                    and request[1] != "/api/v2/signin"]
+
+        args = get_test_args(server, bucket_retention="7d", downsampled_buckets="telemetry-1h:1h:max")
+        assert not provision.provision_influxdb(args, get_test_client(server), provision.PhaseTimer())
+        buckets = {bucket["name"]: bucket for bucket in server.state["buckets"]}
+        assert provision.get_retention_seconds(buckets["greengrass-telemetry"]) == 7 * 24 * 60 * 60
+        assert provision.get_retention_seconds(buckets["telemetry-1h"]) == 0
+        assert len(server.state["tasks"]) == 1
+        assert "fn: max" in server.state["tasks"][0]["flux"]
+        assert len(server.state["authorizations"]) == 5
+
+
+def test_provision_invalid_password(mocker):
+    import src.provisionInfluxDB as provision
+    mocker.patch.object(provision.SECRET_PROVIDER, "get_credentials", return_value=("test_username", "weak"))
+
+    with FakeInfluxDBServer() as server:
+        with pytest.raises(SystemExit):
+            provision.provision_influxdb(get_test_args(server), get_test_client(server), provision.PhaseTimer())
+        assert server.state["org"] is None
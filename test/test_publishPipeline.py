@@ -0,0 +1,90 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import threading
+import pytest
+
+sys.path.append("src/")
+
+
+def test_pipeline_publishes_on_workers():
+    import src.publishPipeline as publishPipeline
+
+    published = []
+    pipeline = publishPipeline.PublishPipeline(lambda message: published.append(message), 10, 2)
+    for i in range(5):
+        assert pipeline.submit({"id": i})
+    pipeline.join()
+    pipeline.stop()
+    assert sorted(message["id"] for message in published) == [0, 1, 2, 3, 4]
+
+
+def test_pipeline_keeps_working_after_publish_error():
+    import src.publishPipeline as publishPipeline
+
+    published = []
+
+    def publish(message):
+        if message == "bad":
+            raise ValueError("test")
+        published.append(message)
+
+    pipeline = publishPipeline.PublishPipeline(publish, 10, 1)
+    pipeline.submit("bad")
+    pipeline.submit("good")
+    pipeline.join()
+    pipeline.stop()
+    assert published == ["good"]
+
+
+def blocked_pipeline(overflow_policy):
+    import src.publishPipeline as publishPipeline
+
+    release = threading.Event()
+    started = threading.Event()
+    published = []
+
+    def publish(message):
+        started.set()
+        release.wait()
+        published.append(message)
+
+    pipeline = publishPipeline.PublishPipeline(publish, 2, 1, overflow_policy)
+    # The first message occupies the only worker, the next two fill the queue
+    pipeline.submit(0)
+    started.wait()
+    pipeline.submit(1)
+    pipeline.submit(2)
+    return pipeline, release, published
+
+
+def test_pipeline_drop_oldest():
+    pipeline, release, published = blocked_pipeline("drop_oldest")
+    assert pipeline.submit(3)
+    assert pipeline.dropped_count == 1
+    release.set()
+    pipeline.join()
+    pipeline.stop()
+    assert published == [0, 2, 3]
+
+
+def test_pipeline_reject():
+    pipeline, release, published = blocked_pipeline("reject")
+    assert not pipeline.submit(3)
+    assert pipeline.rejected_count == 1
+    release.set()
+    pipeline.join()
+    pipeline.stop()
+    assert published == [0, 1, 2]
+
+
+def test_pipeline_invalid_configuration():
+    import src.publishPipeline as publishPipeline
+
+    with pytest.raises(ValueError, match='queue size'):
+        publishPipeline.PublishPipeline(print, 0, 1)
+    with pytest.raises(ValueError, match='worker count'):
+        publishPipeline.PublishPipeline(print, 1, 0)
+    with pytest.raises(ValueError, match='overflow policy'):
+        publishPipeline.PublishPipeline(print, 1, 1, "invalid")
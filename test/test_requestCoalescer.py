@@ -0,0 +1,52 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import threading
+import pytest
+
+sys.path.append("src/")
+
+
+def test_coalesce_duplicate_requests():
+    import src.requestCoalescer as requestCoalescer
+
+    flushed = []
+    coalescer = requestCoalescer.RequestCoalescer(60, lambda response, served: flushed.append((response, served)))
+    assert coalescer.submit("RW", "rw response")
+    assert not coalescer.submit("RW", "rw response")
+    assert not coalescer.submit("RW", "rw response")
+    assert coalescer.submit("RO", "ro response")
+    assert flushed == []
+
+    coalescer.flush_all()
+    assert sorted(flushed) == [("ro response", 1), ("rw response", 3)]
+
+    # A new request after the window closed opens a new window
+    assert coalescer.submit("RW", "rw response")
+    coalescer.flush_all()
+    assert flushed[-1] == ("rw response", 1)
+
+
+def test_coalesce_window_closes():
+    import src.requestCoalescer as requestCoalescer
+
+    flushed = threading.Event()
+    served_counts = []
+
+    def flush(response, served):
+        served_counts.append(served)
+        flushed.set()
+
+    coalescer = requestCoalescer.RequestCoalescer(0.01, flush)
+    coalescer.submit("RW", "rw response")
+    coalescer.submit("RW", "rw response")
+    assert flushed.wait(5)
+    assert served_counts == [2]
+
+
+def test_coalesce_invalid_window():
+    import src.requestCoalescer as requestCoalescer
+
+    with pytest.raises(ValueError, match='Coalescing window'):
+        requestCoalescer.RequestCoalescer(0, print)
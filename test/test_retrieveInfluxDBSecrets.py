@@ -2,11 +2,16 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import argparse
+import concurrent.futures
 import sys
+import threading
+import time
 import pytest
 import json
 from awsiot.greengrasscoreipc.model import UnauthorizedError
 
+from test.fakeClock import FakeClock
+
 sys.path.append("src/retrieveInfluxDBSecrets.py")
 
 
@@ -84,3 +89,64 @@ def test_no_ipc_connection(mocker):
     with pytest.raises(Exception, match='test'):
         ris.get_secret_over_ipc("arn:test:object")
         assert mock_ipc_call.call_count == 1
+
+
+def test_secret_provider_caches_secret(mocker):
+    testArn = {
+        "influxdb_username": "test_username",
+        "influxdb_password": "test_password"
+    }
+    mock_connect = mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_ipc_call = mocker.patch("src.retrieveInfluxDBSecrets.get_secret_over_ipc", return_value=json.dumps(testArn))
+    import src.retrieveInfluxDBSecrets as ris
+    from src.ipcConnectionManager import IPCConnectionManager
+
+    clock = FakeClock()
+    provider = ris.SecretProvider(ttl=60, clock=clock, connection_manager=IPCConnectionManager())
+    assert provider.get_credentials("arn:test:object") == ("test_username", "test_password")
+    assert provider.get_credentials("arn:test:object") == ("test_username", "test_password")
+    assert mock_ipc_call.call_count == 1
+
+    clock.now = 61
+    provider.get_credentials("arn:test:object")
+    provider.invalidate("arn:test:object")
+    provider.get_credentials("arn:test:object")
+    assert mock_ipc_call.call_count == 3
+    assert mock_connect.call_count == 1
+    mock_ipc_call.assert_called_with("arn:test:object", mock_connect.return_value)
+
+
+def test_secret_provider_single_flight(mocker):
+    mocker.patch("awsiot.greengrasscoreipc.connect")
+    release = threading.Event()
+
+    def get_secret(secret_arn, ipc_client):
+        release.wait(5)
+        return "test_secret"
+
+    mock_ipc_call = mocker.patch("src.retrieveInfluxDBSecrets.get_secret_over_ipc", side_effect=get_secret)
+    import src.retrieveInfluxDBSecrets as ris
+    from src.ipcConnectionManager import IPCConnectionManager
+
+    provider = ris.SecretProvider(connection_manager=IPCConnectionManager())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(provider.get_secret_string, "arn:test:object") for _ in range(8)]
+        time.sleep(0.1)
+        release.set()
+        assert [future.result() for future in futures] == ["test_secret"] * 8
+    assert mock_ipc_call.call_count == 1
+
+
+def test_secret_provider_retries_after_error(mocker):
+    mock_connect = mocker.patch("awsiot.greengrasscoreipc.connect")
+    mock_ipc_call = mocker.patch("src.retrieveInfluxDBSecrets.get_secret_over_ipc",
+                                 side_effect=[TimeoutError("test"), "test_secret"])
+    import src.retrieveInfluxDBSecrets as ris
+    from src.ipcConnectionManager import IPCConnectionManager
+
+    provider = ris.SecretProvider(connection_manager=IPCConnectionManager())
+    with pytest.raises(TimeoutError, match='test'):
+        provider.get_secret_string("arn:test:object")
+    assert provider.get_secret_string("arn:test:object") == "test_secret"
+    assert mock_ipc_call.call_count == 2
+    assert mock_connect.call_count == 1
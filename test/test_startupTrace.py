@@ -0,0 +1,89 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import sys
+
+import pytest
+
+from test.fakeClock import FakeClock
+
+sys.path.append("src/")
+
+
+def read_spans(path):
+    with open(path) as trace_file:
+        return [json.loads(line) for line in trace_file]
+
+
+def get_span(run, source, phase, start, end, status="ok"):
+    return json.dumps({"run": run, "source": source, "phase": phase, "start": start, "end": end, "status": status})
+
+
+def test_record_spans(tmp_path):
+    import src.startupTrace as startupTrace
+
+    path = str(tmp_path / "trace.jsonl")
+    clock = FakeClock(100.0)
+    trace = startupTrace.StartupTrace("publisher", environ={startupTrace.TRACE_PATH_VARIABLE: path,
+                                                            startupTrace.RUN_ID_VARIABLE: "run1"}, clock=clock)
+    with trace.span("retrieve_tokens"):
+        clock.now = 100.5
+    with pytest.raises(RuntimeError):
+        with trace.span("subscribe"):
+            raise RuntimeError("IPC failed")
+    trace.finish()
+    # Nothing is recorded once the process has started
+    trace.mark("refresh")
+
+    assert read_spans(path) == [
+        {"run": "run1", "source": "publisher", "phase": "retrieve_tokens", "start": 100.0, "end": 100.5,
+         "status": "ok"},
+        {"run": "run1", "source": "publisher", "phase": "subscribe", "start": 100.5, "end": 100.5, "status": "error"},
+        {"run": "run1", "source": "publisher", "phase": "started", "start": 100.5, "end": 100.5, "status": "ok"}]
+
+
+def test_record_process_start(tmp_path):
+    import src.startupTrace as startupTrace
+
+    path = str(tmp_path / "trace.jsonl")
+    environ = {startupTrace.TRACE_PATH_VARIABLE: path, startupTrace.LAUNCHED_VARIABLE: "1.5"}
+    startupTrace.StartupTrace("provision", environ=environ).record_process_start()
+    spans = read_spans(path)
+    assert [span["phase"] for span in spans] == ["interpreter", "imports"]
+    assert spans[0]["start"] == 1.5
+    assert spans[0]["end"] == spans[1]["start"] == round(startupTrace.IMPORTED_AT, 6)
+
+
+def test_disabled_trace(tmp_path):
+    import src.startupTrace as startupTrace
+
+    # Without a trace file, and with a trace file that cannot be written, the spans are dropped
+    startupTrace.StartupTrace("publisher", environ={}).mark("listening")
+    startupTrace.StartupTrace("publisher", path=str(tmp_path / "missing" / "trace.jsonl")).mark("listening")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_report():
+    import src.startupTrace as startupTrace
+
+    lines = [get_span("cold", "shell", "start_container", 0, 4),
+             get_span("cold", "publisher", "retrieve_tokens", 5, 6),
+             get_span("warm", "shell", "start_container", 10, 10.5),
+             "{\"run\": \"warm\", \"source\"",
+             get_span("warm", "publisher", "retrieve_tokens", 11, 11.5, "error"),
+             get_span("warm", "publisher", "listening", 12, 12)]
+    runs = startupTrace.load_runs(lines)
+    assert list(runs) == ["cold", "warm"]
+    assert startupTrace.get_phase_durations(runs["warm"]) == {
+        "shell/start_container": 0.5, "publisher/retrieve_tokens": 0.5, "publisher/listening": 0}
+
+    report = startupTrace.report(lines, 2)
+    assert report[0] == "Run cold: 6.000s"
+    assert "     1.000s    0.500s  error    publisher/retrieve_tokens" in report
+    comparison = report[report.index("Comparison of the last 2 runs:") + 1:]
+    assert comparison[1].split() == ["shell/start_container", "4.000s", "0.500s", "-3.500s"]
+    assert comparison[3].split() == ["publisher/listening", "-", "0.000s"]
+
+    assert startupTrace.report(lines, 1)[0] == "Run warm: 2.000s"
+    assert startupTrace.report([], 2) == ["The trace has no spans"]
@@ -0,0 +1,62 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import threading
+import pytest
+
+sys.path.append("src/")
+
+
+def test_refresh(mocker):
+    import src.tokenRefresher as tokenRefresher
+
+    handler = mocker.Mock()
+    handler.update_tokens.side_effect = [True, False]
+    refresher = tokenRefresher.TokenRefresher(lambda: "[]", handler, 0)
+    assert refresher.refresh()
+    assert not refresher.refresh()
+    handler.update_tokens.assert_called_with("[]")
+
+
+def test_refresh_error_keeps_cached_tokens(mocker):
+    import src.tokenRefresher as tokenRefresher
+
+    handler = mocker.Mock()
+    fetch = mocker.Mock(side_effect=ConnectionRefusedError("test"))
+    refresher = tokenRefresher.TokenRefresher(fetch, handler, 0)
+    assert not refresher.refresh()
+    assert not handler.update_tokens.called
+
+
+def test_refresh_on_request(mocker):
+    import src.tokenRefresher as tokenRefresher
+
+    refreshed = threading.Event()
+    handler = mocker.Mock()
+    handler.update_tokens.side_effect = lambda token_json: refreshed.set()
+    refresher = tokenRefresher.TokenRefresher(lambda: "[]", handler, 0)
+    refresher.start()
+    assert not refreshed.wait(0.05)
+    refresher.request_refresh()
+    assert refreshed.wait(5)
+    refresher.stop()
+
+
+def test_refresh_on_interval(mocker):
+    import src.tokenRefresher as tokenRefresher
+
+    refreshed = threading.Event()
+    handler = mocker.Mock()
+    handler.update_tokens.side_effect = lambda token_json: refreshed.set()
+    refresher = tokenRefresher.TokenRefresher(lambda: "[]", handler, 0.01)
+    refresher.start()
+    assert refreshed.wait(5)
+    refresher.stop()
+
+
+def test_invalid_interval(mocker):
+    import src.tokenRefresher as tokenRefresher
+
+    with pytest.raises(ValueError, match='must not be negative'):
+        tokenRefresher.TokenRefresher(lambda: "[]", mocker.Mock(), -1)